@@ -29,17 +29,17 @@ class ArduinoHandler:
             self.connected = False
             print(f"Arduino not found on {self.port}. Running in keyboard/mouse mode.")
 
-    def read_input(self):
+    def read_events(self):
         """
         Reads and parses input from the Arduino.
-        Returns a list of lane indices that have just been pressed.
+        Returns a list of (lane, pressed) transitions in the order they were received.
         """
         if not self.connected:
             return []
 
-        pressed_lanes = []
+        events = []
         try:
-            # Read all available data and process the last complete line
+            # Read all available data and process every complete line
             if self.ser.in_waiting > 0:
                 # Read all data and append to our internal buffer
                 data = self.ser.read(self.ser.in_waiting).decode('utf-8', errors='ignore')
@@ -53,15 +53,11 @@ class ArduinoHandler:
 
                     # Only process valid lines
                     if len(line) == 4 and all(c in '01' for c in line):
-                        # This line represents the most recent state from the Arduino
                         current_state = [c == '1' for c in line]
-                        # Check for newly pressed lanes (transition from False to True)
-                        newly_pressed = [i for i, (prev, curr) in enumerate(zip(self.last_state, current_state)) if
-                                         not prev and curr]
-
-                        if newly_pressed:
-                            # Add any newly pressed lanes to our return list
-                            pressed_lanes.extend(newly_pressed)
+                        # Record every lane whose state flipped since the previous line
+                        for i, (prev, curr) in enumerate(zip(self.last_state, current_state)):
+                            if prev != curr:
+                                events.append((i, curr))
 
                         # Update the last state for the next iteration
                         self.last_state = current_state
@@ -72,17 +68,26 @@ class ArduinoHandler:
             if self.ser:
                 self.ser.close()
             self.ser = None
+            # Anything still held is released with the connection
+            events.extend((i, False) for i, state in enumerate(self.last_state) if state)
+            self.last_state = [False, False, False, False]
         except Exception as e:
             print(f"An error occurred while reading from Arduino: {e}")
 
+        return events
+
+    def read_input(self):
+        """
+        Reads and parses input from the Arduino.
+        Returns a list of lane indices that have just been pressed.
+        """
         # Return a unique list of lanes pressed during this frame
-        return list(set(pressed_lanes))
+        return list({lane for lane, pressed in self.read_events() if pressed})
 
     def get_held_lanes(self):
         """Returns a list of lanes currently being held down."""
         if not self.connected:
             return []
-        # No change needed here, it relies on self.last_state which is now correctly updated
         return [i for i, state in enumerate(self.last_state) if state]
 
     def close(self):
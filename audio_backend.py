@@ -0,0 +1,231 @@
+# audio_backend.py
+import heapq
+import threading
+
+import numpy as np
+import pygame
+import config
+from audio_mixdown import SampleBank, mixer_format
+from voice_manager import ChordCache, VoiceAllocator, victim_key
+
+
+class MixerBackend:
+    """
+    Plays notes through pygame.mixer channels. Notes scheduled ahead are held back and fired
+    on the first frame at or after their time, so timing is quantized to the frame.
+    A chord (list of notes) is played as one premixed sound on a single channel, and the
+    number of channels in use is kept within the voice budget.
+    """
+
+    def __init__(self, sounds, max_voices=config.MAX_VOICES, steal_policy=config.VOICE_STEAL_POLICY):
+        self.sounds = sounds
+        frequency, channels = mixer_format()
+        self.chords = ChordCache(SampleBank(sounds=sounds), frequency, channels)
+        self.voices = VoiceAllocator(max_voices, steal_policy)
+        self._scheduled = []
+        self._seq = 0
+        self._song_time = 0.0
+        self.stats = {'played': 0, 'missing': 0}
+
+    def prepare(self, note_groups):
+        """Premixes the recurring chords of a song before it starts."""
+        self.chords.prepare(note_groups)
+
+    def play(self, notes, priority=0):
+        """Plays a note name, or a list of note names as one chord."""
+        entry = self.chords.get(notes)
+        if entry is None:
+            self.stats['missing'] += 1
+            return
+        if self.voices.play(entry, priority):
+            self.stats['played'] += 1
+
+    def schedule(self, notes, song_time, priority=0):
+        """Plays a note (or chord) at a song time; notes that are already due play immediately."""
+        if song_time <= self._song_time:
+            self.play(notes, priority)
+        else:
+            heapq.heappush(self._scheduled, (song_time, self._seq, notes, priority))
+            self._seq += 1
+
+    def sync(self, song_time):
+        """Called once per frame with the current song time."""
+        self._song_time = song_time
+        while self._scheduled and self._scheduled[0][0] <= song_time:
+            _, _, notes, priority = heapq.heappop(self._scheduled)
+            self.play(notes, priority)
+
+    def set_rate(self, rate):
+        """Song time runs at `rate` times real time. Notes fire on song time, so nothing to adjust."""
+
+    def pressure(self):
+        """Channel-pressure and chord-cache statistics."""
+        return dict(self.stats, **self.voices.pressure(), chords=dict(self.chords.stats, cached=len(self.chords)))
+
+    def stop_all(self):
+        self._scheduled = []
+        self.voices.stop_all()
+        pygame.mixer.stop()
+
+    def close(self):
+        self.stop_all()
+
+
+class SoftwareMixerBackend:
+    """
+    Mixes notes itself in an SDL audio callback. Every note is placed at an exact sample
+    position derived from its song time, so notes scheduled ahead land on their musical
+    time regardless of frame jitter. Chords are premixed into one voice. Polyphony is capped
+    at `max_voices`: when full, the lowest-priority voice is stolen, choosing the oldest or
+    quietest one by `steal_policy` (or the new note is dropped if it ranks lower).
+    """
+
+    # Re-anchor the song clock to the audio clock only when they drift further than this
+    MAX_DRIFT_SECONDS = 0.03
+
+    def __init__(self, sample_bank, sample_rate=44100, channels=2, buffer_size=512, max_voices=config.MAX_VOICES,
+                 steal_policy=config.VOICE_STEAL_POLICY):
+        from pygame._sdl2 import audio as sdl_audio, sdl2
+
+        self.sample_bank = sample_bank
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.buffer_size = buffer_size
+        self.max_voices = max_voices
+        self.steal_policy = steal_policy
+        self.chords = ChordCache(sample_bank, sample_rate, channels, make_sounds=False)
+        self._lock = threading.Lock()
+        self._pending = []  # Heap of (start sample, seq, priority, samples, peak)
+        self._voices = []  # Lists of [start sample, seq, priority, samples, peak]
+        self._seq = 0
+        self._position = 0  # Samples handed to the device so far
+        self._anchor = None  # (sample position, song time)
+        self._rate = 1.0  # Song seconds per real second
+        self.stats = {'played': 0, 'stolen': 0, 'dropped': 0, 'missing': 0, 'late': 0, 'peak_voices': 0}
+        self._pressure_total = 0
+
+        sdl2.init_subsystem(sdl2.INIT_AUDIO)
+        self.device = sdl_audio.AudioDevice(
+            devicename=None, iscapture=False, frequency=sample_rate, audioformat=sdl_audio.AUDIO_S16,
+            numchannels=channels, chunksize=buffer_size, allowed_changes=0, callback=self._callback)
+        self.device.pause(0)
+
+    def _song_time_to_sample(self, song_time):
+        anchor_sample, anchor_time = self._anchor
+        return anchor_sample + int(round((song_time - anchor_time) / self._rate * self.sample_rate))
+
+    def set_rate(self, rate):
+        """
+        Song time runs at `rate` times real time (practice mode). Note onsets are spread out
+        accordingly while each sample plays unchanged, so pitch is preserved.
+        """
+        self._rate = rate
+        self._anchor = None
+
+    def sync(self, song_time):
+        """
+        Called once per frame with the current song time. Keeps the mapping between song time
+        and the audio clock, correcting it only when the two drift apart noticeably.
+        """
+        # Anything scheduled now is at least one buffer away from being heard
+        playhead = self._position + self.buffer_size
+        if self._anchor is None or \
+                abs(self._song_time_to_sample(song_time) - playhead) > self.MAX_DRIFT_SECONDS * self.sample_rate:
+            self._anchor = (playhead, song_time)
+
+    def prepare(self, note_groups):
+        """Premixes the recurring chords of a song before it starts."""
+        self.chords.prepare(note_groups)
+
+    def play(self, notes, priority=0):
+        """Plays a note name, or a list of note names as one chord."""
+        self._enqueue(notes, self._position + self.buffer_size, priority)
+
+    def schedule(self, notes, song_time, priority=0):
+        """Plays a note (or chord) at an exact song time. Notes already in the past play as soon as possible."""
+        if self._anchor is None:
+            self.play(notes, priority)
+            return
+        start = self._song_time_to_sample(song_time)
+        if start < self._position:
+            self.stats['late'] += 1
+            start = self._position
+        self._enqueue(notes, start, priority)
+
+    def _enqueue(self, notes, start, priority):
+        entry = self.chords.get(notes)
+        if entry is None:
+            self.stats['missing'] += 1
+            return
+        with self._lock:
+            heapq.heappush(self._pending, (start, self._seq, priority, entry.samples[:, :self.channels], entry.peak))
+            self._seq += 1
+
+    def _start_voice(self, voice):
+        if len(self._voices) >= self.max_voices:
+            start, _, priority, samples, peak = voice
+            victim = min(self._voices, key=lambda v: victim_key(v[2], v[0], len(v[3]), v[4], start,
+                                                              self.steal_policy))
+            if victim_key(victim[2], victim[0], len(victim[3]), victim[4], start, self.steal_policy) > \
+                    victim_key(priority, start, len(samples), peak, start, self.steal_policy):
+                self.stats['dropped'] += 1
+                return
+            self._voices.remove(victim)
+            self.stats['stolen'] += 1
+        self._voices.append(voice)
+        self.stats['played'] += 1
+        self.stats['peak_voices'] = max(self.stats['peak_voices'], len(self._voices))
+        self._pressure_total += len(self._voices)
+
+    def _callback(self, device, stream):
+        frames = len(stream) // (2 * self.channels)
+        start, end = self._position, self._position + frames
+        out = np.zeros((frames, self.channels), dtype=np.int32)
+        with self._lock:
+            while self._pending and self._pending[0][0] < end:
+                self._start_voice(list(heapq.heappop(self._pending)))
+            remaining = []
+            for voice in self._voices:
+                voice_start, _, _, samples, _ = voice
+                src = max(0, start - voice_start)
+                dst = max(0, voice_start - start)
+                count = min(len(samples) - src, frames - dst)
+                if count > 0:
+                    out[dst:dst + count] += samples[src:src + count]
+                if voice_start + len(samples) > end:
+                    remaining.append(voice)
+            self._voices = remaining
+        np.clip(out, -32768, 32767, out=out)
+        stream[:] = out.astype(np.int16).tobytes()
+        self._position = end
+
+    def pressure(self):
+        """Voice-pressure and chord-cache statistics."""
+        played = self.stats['played']
+        average = self._pressure_total / played if played else 0.0
+        return dict(self.stats, active=len(self._voices), average_voices=average, budget=self.max_voices,
+                    average_load=average / self.max_voices if self.max_voices else 0.0,
+                    chords=dict(self.chords.stats, cached=len(self.chords)))
+
+    def stop_all(self):
+        with self._lock:
+            self._pending = []
+            self._voices = []
+
+    def close(self):
+        self.stop_all()
+        self.device.close()
+
+
+def create_backend(sounds, sample_bank=None):
+    """
+    Builds the audio backend selected by config.AUDIO_BACKEND, falling back to the
+    pygame.mixer backend if the software mixer cannot open an audio device.
+    """
+    if config.AUDIO_BACKEND == 'software':
+        try:
+            frequency, _, channels = pygame.mixer.get_init() or (44100, -16, 2)
+            return SoftwareMixerBackend(sample_bank if sample_bank else SampleBank(sounds=sounds), frequency, channels)
+        except (RuntimeError, ImportError) as e:
+            print(f"Software mixer unavailable ({e}). Using pygame.mixer.")
+    return MixerBackend(sounds)
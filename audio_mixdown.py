@@ -0,0 +1,106 @@
+# audio_mixdown.py
+import os
+import threading
+import wave
+
+import numpy as np
+import pygame
+import config
+
+
+class SampleBank:
+    """
+    Decodes note samples from the sounds directory into int16 NumPy arrays on first use.
+    Safe to share between threads; each note is decoded at most once. Notes found in
+    `sounds` (a dict or SoundProvider) are viewed from those Sounds on every call instead,
+    so the owner of the Sounds decides how long they stay in memory.
+    """
+
+    def __init__(self, sounds_dir=config.SOUNDS_DIR, sounds=None):
+        self.sounds_dir = sounds_dir
+        # Already loaded pygame Sounds to copy samples from instead of decoding the file again
+        self.sounds = sounds if sounds is not None else {}
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def get(self, note_name):
+        """Returns the decoded samples for a note, or None if there is no such sound."""
+        sound = self.sounds.get(note_name) if note_name in self.sounds else None
+        if sound is not None:
+            # A view onto the Sound's own buffer: no copy for int16 mixers
+            return to_int16(pygame.sndarray.samples(sound))
+        with self._lock:
+            if note_name in self._samples:
+                return self._samples[note_name]
+        sound_path = os.path.join(self.sounds_dir, f"{note_name}.mp3")
+        samples = None
+        if os.path.exists(sound_path):
+            try:
+                samples = to_int16(pygame.sndarray.array(pygame.mixer.Sound(sound_path)))
+            except pygame.error as e:
+                print(f"Could not decode sound {note_name}: {e}")
+        with self._lock:
+            self._samples[note_name] = samples
+        return samples
+
+
+def to_int16(samples):
+    """Converts a sndarray buffer in the mixer's format to int16 frames of shape (n, channels)."""
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    if samples.dtype == np.int16:
+        return samples
+    if samples.dtype == np.float32:
+        return np.clip(samples * 32767, -32768, 32767).astype(np.int16)
+    if samples.dtype == np.uint8:
+        return ((samples.astype(np.int16) - 128) << 8).astype(np.int16)
+    if samples.dtype == np.uint16:
+        return (samples.astype(np.int32) - 32768).astype(np.int16)
+    return (samples >> (8 * (samples.dtype.itemsize - 2))).astype(np.int16)
+
+
+def mixer_format():
+    """Returns (sample rate, channels) of the initialized mixer."""
+    frequency, _, channels = pygame.mixer.get_init()
+    return frequency, channels
+
+
+def mix_notes(notes, sample_bank, sample_rate, channels, length=None):
+    """
+    Sums note samples into one buffer at sample-accurate offsets. `notes` is an iterable of
+    (time in seconds, note name). The result is int16 frames of shape (n, channels); it is
+    scaled down if the summed peak would clip. If `length` (seconds) is given the buffer is
+    cut to it, otherwise it runs until the last sample has decayed.
+    """
+    placed = []
+    end = 0
+    for note_time, note_name in notes:
+        samples = sample_bank.get(note_name)
+        if samples is None or note_time < 0:
+            continue
+        offset = int(round(note_time * sample_rate))
+        placed.append((offset, samples))
+        end = max(end, offset + len(samples))
+
+    total = int(round(length * sample_rate)) if length is not None else end
+    buffer = np.zeros((total, channels), dtype=np.int32)
+    for offset, samples in placed:
+        if offset >= total:
+            continue
+        count = min(len(samples), total - offset)
+        buffer[offset:offset + count] += samples[:count, :channels]
+
+    peak = int(np.abs(buffer).max()) if total else 0
+    if peak > 32767:
+        buffer = buffer * (32767 / peak)
+    return buffer.astype(np.int16)
+
+
+def write_wav(path, frames, sample_rate):
+    """Writes int16 frames of shape (n, channels) to a WAV file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(frames.shape[1])
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(np.ascontiguousarray(frames).tobytes())
@@ -1,25 +1,17 @@
 import sys
 import os
-import json
-import re
-import time
-import glob
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QPushButton, QLabel, QFileDialog, QComboBox, QProgressBar, QGridLayout
 )
 from PyQt6.QtCore import QThread, pyqtSignal, Qt
 import pygame
+from scheduled_player import ScheduledPlayer
+from sound_provider import SoundProvider
+from song_parser import parse_note_tracks
+from song_stream import open_song
 
 # --- Constants ---
-BEAT_MAP = {
-    'H': 8, 'I': 4, 'J': 2, 'K': 1, 'L': 0.5, 'M': 0.25,
-    'N': 0.125, 'O': 0.0625, 'P': 0.03125
-}
-SPACE_MAP = {
-    'Q': 8, 'R': 4, 'S': 2, 'T': 1, 'U': 0.5, 'V': 0.25,
-    'W': 0.125, 'X': 0.0625, 'Y': 0.03125
-}
 SOUNDS_DIR = os.path.join("assets", "snd")
 
 
@@ -28,45 +20,30 @@ class PlaybackThread(QThread):
     update_time_signal = pyqtSignal(float, float)
     finished_signal = pyqtSignal()
 
+    PROGRESS_RATE = 30  # Progress bar updates per second
+
     def __init__(self, scheduled_notes, sounds):
         super().__init__()
-        self.scheduled_notes = sorted(scheduled_notes, key=lambda x: x[0])
         self.sounds = sounds
-        self._is_running = True
-        self.total_duration = 0
-        if self.scheduled_notes:
-            self.total_duration = self.scheduled_notes[-1][0]
+        self.player = ScheduledPlayer(scheduled_notes, self.play_notes,
+                                      on_progress=self.update_time_signal.emit,
+                                      is_busy=pygame.mixer.get_busy,
+                                      progress_rate=self.PROGRESS_RATE)
+        self.scheduled_notes = self.player.scheduled_notes
+        self.total_duration = self.player.total_duration
+
+    def play_notes(self, note_names):
+        for note_name in note_names:
+            sound = self.sounds.get(note_name)
+            if sound:
+                sound.play()
 
     def run(self):
-        if not self.scheduled_notes:
-            self.finished_signal.emit()
-            return
-
-        start_time = time.time()
-        note_index = 0
-
-        while note_index < len(self.scheduled_notes) and self._is_running:
-            current_time = time.time() - start_time
-
-            while note_index < len(self.scheduled_notes) and self.scheduled_notes[note_index][0] <= current_time:
-                _, note_name = self.scheduled_notes[note_index]
-                if note_name in self.sounds:
-                    self.sounds[note_name].play()
-                note_index += 1
-
-            self.update_time_signal.emit(current_time, self.total_duration)
-            self.msleep(1)
-
-        while pygame.mixer.get_busy() and self._is_running:
-            current_time = time.time() - start_time
-            self.update_time_signal.emit(current_time, self.total_duration)
-            self.msleep(10)
-
-        if self._is_running:
+        if self.player.run():
             self.finished_signal.emit()
 
     def stop(self):
-        self._is_running = False
+        self.player.stop()
         pygame.mixer.stop()
 
 
@@ -77,7 +54,7 @@ class JsonPlayer(QMainWindow):
         self.setWindowTitle("Piano Tiles 2 JSON Player")
         self.setGeometry(100, 100, 500, 280)
 
-        self.sounds = {}
+        self.sounds = None
         self.parsed_song_data = {}
         self.playback_thread = None
 
@@ -92,19 +69,11 @@ class JsonPlayer(QMainWindow):
         print("Pygame Mixer Initialized.")
 
     def load_sounds(self):
-        print(f"Loading sounds from: {os.path.abspath(SOUNDS_DIR)}")
+        # Sounds are decoded on demand; parse_file queues the notes of each opened song
         if not os.path.isdir(SOUNDS_DIR):
             print("Error: Sound directory not found!")
-            return
-
-        sound_files = glob.glob(os.path.join(SOUNDS_DIR, "*.mp3"))
-        for f in sound_files:
-            note_name = os.path.splitext(os.path.basename(f))[0]
-            try:
-                self.sounds[note_name] = pygame.mixer.Sound(f)
-            except pygame.error as e:
-                print(f"Could not load sound {note_name}: {e}")
-        print(f"Loaded {len(self.sounds)} sounds.")
+        self.sounds = SoundProvider(SOUNDS_DIR)
+        print(f"Found {len(self.sounds.available)} sounds in: {os.path.abspath(SOUNDS_DIR)}")
 
     def init_ui(self):
         central_widget = QWidget()
@@ -158,20 +127,12 @@ class JsonPlayer(QMainWindow):
             self.file_label.setText(os.path.basename(file_path))
             self.parse_file(file_path)
 
-    def parse_duration(self, duration_str, bpm):
-        total_beats = sum(BEAT_MAP.get(char, 0) for char in duration_str)
-        return total_beats * (60.0 / bpm) if bpm > 0 else 0
-
-    def parse_space(self, space_str, bpm):
-        total_beats = sum(SPACE_MAP.get(char, 0) for char in space_str)
-        return total_beats * (60.0 / bpm) if bpm > 0 else 0
-
     def parse_file(self, file_path):
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            self.parsed_song_data = self.parse_json_data(data)
+            with open_song(file_path) as data:
+                self.parsed_song_data = self.parse_json_data(data)
+            self.sounds.preload({note for part in self.parsed_song_data.values()
+                                 for track in part['tracks'].values() for _, note in track})
             self.id_combo.clear()
             self.track_combo.clear()
 
@@ -216,62 +177,12 @@ class JsonPlayer(QMainWindow):
         self.play_button.setEnabled(True)
 
     def parse_json_data(self, song_data):
-        event_pattern = re.compile(
-            r"^\s*(\d<[^>]+>)|^\s*(\(([^)]+)\)\[([A-P]+)\])|^\s*([a-zA-Z#\-1-5\.]+\s*\[[A-P]+\])|^\s*([Q-Y]+)")
-        note_pattern = re.compile(r"([a-zA-Z#\-1-5\.]+)\s*\[([A-P]+)\]")
-
+        # Scores are tokenized in place in the song buffer, so this must run inside open_song
         parsed_song = {}
-
-        for part in song_data.get('musics', []):
-            part_id = part.get('id')
-            bpm = float(part.get('bpm', song_data.get('baseBpm')))
-
-            part_data = {'bpm': bpm, 'tracks': {}}
-
-            for track_idx, scores_str in enumerate(part.get('scores', [])):
-                if not scores_str: continue
-
-                track_notes = []
-                current_time = 0.0
-                remaining_str = scores_str.strip()
-
-                while remaining_str:
-                    match = event_pattern.match(remaining_str)
-                    if not match:
-                        next_sep = re.search(r'[,;]', remaining_str);
-                        remaining_str = remaining_str[next_sep.end():].lstrip() if next_sep else ""
-                        continue
-
-                    full_event_str, notes_to_add, duration = match.group(0), [], 0
-
-                    if match.group(1):  # Special
-                        inner, sub_time = match.group(1)[2:-1], 0
-                        for sub_event in inner.split(','):
-                            if sub_match := note_pattern.match(sub_event.strip()):
-                                sub_dur = self.parse_duration(sub_match.group(2), bpm)
-                                for note in sub_match.group(1).split('.'): track_notes.append(
-                                    (current_time + sub_time, note))
-                                sub_time += sub_dur
-                        duration = sub_time
-                    elif match.group(2):  # Chord
-                        duration = self.parse_duration(match.group(4), bpm)
-                        for note in match.group(3).split('.'): track_notes.append((current_time, note))
-                    elif match.group(5):  # Note
-                        if note_match := note_pattern.match(match.group(5).strip()):
-                            duration = self.parse_duration(note_match.group(2), bpm)
-                            for note in note_match.group(1).split('.'): track_notes.append((current_time, note))
-                    elif match.group(6):  # Space
-                        duration = self.parse_space(match.group(6), bpm)
-
-                    current_time += duration
-                    remaining_str = remaining_str[len(full_event_str):].lstrip(' ,;')
-
-                if track_notes:
-                    part_data['tracks'][track_idx] = track_notes
-
-            if part_data['tracks']:
-                parsed_song[part_id] = part_data
-
+        for part in parse_note_tracks(song_data):
+            tracks = {track_idx: notes for track_idx, notes in enumerate(part['tracks']) if notes}
+            if tracks:
+                parsed_song[part['id']] = {'bpm': part['bpm'], 'tracks': tracks}
         return parsed_song
 
     def play_music(self):
@@ -322,6 +233,7 @@ class JsonPlayer(QMainWindow):
 
     def closeEvent(self, event):
         self.stop_music();
+        self.sounds.close()
         pygame.quit();
         event.accept()
 
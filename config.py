@@ -32,6 +32,8 @@ BEATS_AHEAD = 4
 # Paths
 ASSETS_DIR = resource_path('assets')
 SONGS_DIR = os.path.join(ASSETS_DIR, "songs")
+# Built by song_pack.py; used instead of SONGS_DIR while it is up to date
+SONG_PACK = os.path.join(ASSETS_DIR, "songs.pack")
 SOUNDS_DIR = os.path.join(ASSETS_DIR, "snd")
 FONTS_DIR = os.path.join(ASSETS_DIR, "fonts")
 IMAGES_DIR = os.path.join(ASSETS_DIR, "img")
@@ -44,10 +46,45 @@ CIRCLE_LIGHT_IMG = os.path.join(IMAGES_DIR, "circle_light.png")
 CRAZY_CIRCLE_IMG = os.path.join(IMAGES_DIR, "crazy_circle.png")
 DOT_LIGHT_IMG = os.path.join(IMAGES_DIR, "dot_light.png")
 
+# Generated files (rendered previews, ...) that can be deleted at any time
+CACHE_DIR = resource_path('cache')
+PREVIEW_CACHE_DIR = os.path.join(CACHE_DIR, "previews")
+PREVIEW_CACHE_MAX_MB = 256
+PREVIEW_MAX_SECONDS = 30
+PROFILE_DIR = os.path.join(CACHE_DIR, "profiles")
+
+# Every play session is recorded as a replay (see replay.py); delete old ones by hand
+RECORD_REPLAYS = True
+REPLAY_DIR = resource_path('replays')
+
+# Benchmark results (perf_suite.py); the baseline runs are compared against is kept outside the cache
+BENCHMARK_DIR = os.path.join(CACHE_DIR, "benchmarks")
+BENCHMARK_BASELINE = resource_path(os.path.join('benchmarks', 'baseline.json'))
+# Generated stress-test charts (stress_chart.py); rewritten by every benchmark run that uses them
+STRESS_DIR = os.path.join(CACHE_DIR, "stress")
+
+# Audio settings
+# 'mixer' plays notes on pygame.mixer channels (timing snaps to frames).
+# 'software' mixes notes in an audio callback at sample accuracy with voice limiting.
+AUDIO_BACKEND = 'mixer'
+# Polyphony budget shared by both backends. When it is used up a playing voice is stolen:
+# 'oldest' takes the one that started first, 'quietest' the one that has faded the most.
+MAX_VOICES = 64
+VOICE_STEAL_POLICY = 'oldest'
+# Premixed chord buffers kept in memory (about 0.8 MB each)
+CHORD_CACHE_SIZE = 96
+# Decoded note sounds kept in memory across songs (the current song's notes always stay)
+SOUND_CACHE_SIZE = 48
+
 # Arduino settings
 SERIAL_PORT = "COM4"  # Default, can be changed in settings
 BAUD_RATE = 9600
 
+# Extra controllers for versus cabinets. Each entry opens its own serial pad, e.g.
+# {'port': 'COM5', 'lanes': [0, 1, 2, 3], 'player': 1, 'name': 'pad2'}
+# `lanes` maps the pad's buttons (in order) onto game lanes.
+CONTROLLERS = []
+
 # Keybinds (default, can be changed in settings)
 KEYBINDS = {
     pygame.K_d: 0,  # Lane 0
@@ -66,10 +103,33 @@ SPACE_MAP = {
     'Q': 8, 'R': 4, 'S': 2, 'T': 1, 'U': 0.5, 'V': 0.25,
     'W': 0.125, 'X': 0.0625, 'Y': 0.03125
 }
+# Lane layouts kept per song and first lane (at most four per song), reused on restarts and replays
+LANE_LAYOUT_CACHE_SIZE = 16
+
+# Objects reused across frames and songs (see object_pool.py): most kept free per kind
+TILE_POOL_SIZE = 20000
+EFFECT_POOL_SIZE = 512  # Particles and floating texts
+
+# Garbage collection during play (gc_policy.py). 'freeze' keeps everything loaded before play
+# out of the collector's reach, 'off' also stops it until the song ends and 'default' leaves
+# Python's collector alone. The song's garbage is collected before the next one loads.
+GC_MODE = 'freeze'
+GC_THRESHOLD = None  # Generation 0 threshold during play; None keeps Python's
 
 # Scoring
 PERFECT_TIMING = 0.1
 GREAT_TIMING = 0.15
 GOOD_TIMING = 0.2
 HOLD_POINTS_PER_BEAT = 10
-COMBO_MULTIPLIER = 1.1
\ No newline at end of file
+COMBO_MULTIPLIER = 1.1
+
+# Practice mode: playback rate range ('-' / '=' keys) and the run-up before a loop restarts
+PRACTICE_MIN_RATE = 0.5
+PRACTICE_MAX_RATE = 1.5
+PRACTICE_RATE_STEP = 0.1
+PRACTICE_LOOP_LEAD_IN = 2.0
+
+# Frame profiler: F3 shows per-section frame timings in game, F4 exports them to PROFILE_DIR.
+# With PROFILER_ENABLED the timers run from the start (without the overlay).
+PROFILER_ENABLED = False
+PROFILER_HISTORY = 600  # Frames in the overlay's rolling percentiles
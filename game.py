@@ -1,17 +1,36 @@
 import pygame
 import os
 import random
+import time
+from bisect import bisect_left
 from enum import Enum, auto
 import song_parser
 import config
 from tile import Tile, Particle, TileState, TileType
+from tile_field import TileField
+from tile_timers import TileTimers, FLASH_END, HOLD_STEP
+from judgement import JudgementIndex
+from object_pool import ObjectPool, release_expired
+from gc_policy import GameplayGC
+from frame_profiler import FrameProfiler
 from arduino_handler import ArduinoHandler
+from lane_tracker import LaneTracker
+from input_manager import InputDeviceManager
+from sound_provider import SoundProvider
+from song_pack import song_source
+import audio_backend
+import replay
 import utils
-from collections import deque
 
 
 class FloatingText:
+    __slots__ = ('x', 'y', 'text', 'font', 'color', 'alpha', 'vy')
+
     def __init__(self, text, x, y, font, color=config.WHITE):
+        self.setup(text, x, y, font, color)
+
+    def setup(self, text, x, y, font, color=config.WHITE):
+        """(Re)starts the text at x, y; pooled texts are set up again through this."""
         self.x, self.y = x, y
         self.text = text
         self.font = font
@@ -23,6 +42,9 @@ class FloatingText:
         self.y += self.vy
         self.alpha = max(0, self.alpha - 5)
 
+    def expired(self):
+        return self.alpha <= 0
+
     def draw(self, surface):
         utils.draw_text(surface, self.text, 24, self.x, self.y, (*self.color, self.alpha), self.font, shadow=False)
 
@@ -34,18 +56,48 @@ class GameState(Enum):
 
 
 class GameScreen:
-    def __init__(self, surface, arduino_handler=None):
+    def __init__(self, surface, arduino_handler=None, input_manager=None):
         self.surface = surface
         self.assets = self.load_assets()
         self.sounds = self.load_sounds()
-        self.pitch_map = self._create_pitch_map()
+        self.audio = audio_backend.create_backend(self.sounds)
         self.arduino = arduino_handler if arduino_handler else ArduinoHandler()  # Use provided handler or create new
+        self.input_manager = input_manager if input_manager else InputDeviceManager.from_config()
+        self.lanes = LaneTracker()
+        self.profiler = self._create_profiler()
+        self.sounds_ready = None
+        self.playback_rate = 1.0  # Practice speed; kept across songs
+        self.seed = None  # Lays out the lanes, so a replay gets the same ones
+        self.lane_layouts = {}  # (song, signature, first lane) -> lanes of the song's playable tiles
+        self.tile_pool = ObjectPool(Tile, config.TILE_POOL_SIZE)
+        self.particle_pool = ObjectPool(Particle, config.EFFECT_POOL_SIZE)
+        self.text_pool = ObjectPool(FloatingText, config.EFFECT_POOL_SIZE)
+        self.gc = GameplayGC()
+        self.song_file_name = None
         self.reset_game_state()
 
+    def _create_profiler(self):
+        """The frame profiler with the game's hot paths registered as sections (timed only while enabled)."""
+        profiler = FrameProfiler()
+        for name in ('handle_events', 'update', '_process_input_events', '_update_tiles', '_run_timers',
+                     '_process_tap', '_play_sound', 'draw'):
+            profiler.register(GameScreen, name)
+        for owner, name in ((Tile, 'animate'), (Tile, 'draw'), (TileField, 'layout'), (Particle, 'update'), (Particle, 'draw'),
+                            (FloatingText, 'draw'), (utils, 'draw_text'), (ArduinoHandler, 'read_events'),
+                            (InputDeviceManager, 'poll')):
+            profiler.register(owner, name)
+        for name in ('play', 'schedule', 'sync'):
+            profiler.register(type(self.audio), name, f"audio.{name}")
+        profiler.register(pygame.display, 'flip', 'display.flip')
+        if config.PROFILER_ENABLED:
+            profiler.enable()
+        return profiler
+
     def update_arduino_handler(self, arduino_handler):
         """Update the ArduinoHandler instance."""
         if self.arduino:
             self.arduino.close()  # Close the existing connection
+        self.lanes.release_source('arduino', self.game_time)
         self.arduino = arduino_handler
         print("GameScreen ArduinoHandler updated.")
 
@@ -57,8 +109,15 @@ class GameScreen:
     def reset_game_state(self):
         self.game_state = GameState.COUNTDOWN
         self.parsed_song = None
-        self.active_tiles = []
-        self.upcoming_tiles = deque()
+        self.visible_tiles = []  # The tiles reaching onto the screen, positioned when drawn
+        self.next_tile = 0  # Tiles before this one are in play
+        self.active_start = 0  # ... and the ones before this one are finished (PASSED or HIT)
+        self.pass_cursor = 0  # Tiles before this one are past their judgement window
+        self.draw_start = 0  # Tiles before this one are off the screen for good
+        self.tile_field = TileField([])
+        self.judgement = JudgementIndex([])
+        self.timers = TileTimers()
+        self.held_tiles = {}
         self.particles = []
         self.floating_texts = []
         self.tps = 4.0
@@ -69,11 +128,16 @@ class GameScreen:
         self.time_offset = 0.0
         self.countdown_timer = 3.99
         self.last_hit_musical_time = 0.0
-        self.last_pitch = 60
-        self.last_lane = -1
         self.autoplay = False
         self.star_end_times = []
         self.num_stars = 0
+        self.all_tiles = []
+        self.loop = None
+        self.loop_mark = None
+        self.loop_pass = 0  # Times the practice loop has restarted; orders replay events
+        self.recorder = None
+        self.replay_player = None
+        self.lanes.reset()
 
     def load_assets(self):
         assets = {'background': pygame.transform.scale(utils.load_image(config.BACKGROUND_IMG),
@@ -81,28 +145,63 @@ class GameScreen:
         return assets
 
     def load_sounds(self):
-        sounds = {}
-        print(f"Loading sounds from: {os.path.abspath(config.SOUNDS_DIR)}")
-        for filename in os.listdir(config.SOUNDS_DIR):
-            if filename.endswith(".mp3"):
-                note_name = os.path.splitext(filename)[0]
-                try:
-                    sounds[note_name] = pygame.mixer.Sound(os.path.join(config.SOUNDS_DIR, filename))
-                except pygame.error as e:
-                    print(f"Could not load sound {note_name}: {e}")
+        """Sounds are decoded on demand; load_song queues the notes each chart uses."""
+        sounds = SoundProvider()
         pygame.mixer.set_num_channels(128)
-        print(f"Loaded {len(sounds)} sounds.")
+        print(f"Found {len(sounds.available)} sounds in: {os.path.abspath(config.SOUNDS_DIR)}")
         return sounds
 
-    def _play_sound(self, note_name):
-        if note_name in self.sounds:
-            channel = pygame.mixer.find_channel(True)
-            if channel: channel.play(self.sounds[note_name])
-
-    def load_song(self, song_file_name):
+    def _play_sound(self, notes, at_time=None, priority=0):
+        """
+        Plays a note or a chord (list of notes, mixed into one voice) now, or at song time
+        `at_time` (exact with the software mixer backend).
+        """
+        if not notes:
+            return
+        if at_time is None:
+            self.audio.play(notes, priority)
+        else:
+            self.audio.schedule(notes, at_time, priority)
+
+    def _report_memory(self):
+        print(self.gc.report())
+        print("Pools: " + ", ".join(f"{name} {pool.stats['created']} created, {pool.stats['reused']} reused"
+                                    for name, pool in (('tiles', self.tile_pool), ('particles', self.particle_pool),
+                                                       ('texts', self.text_pool))))
+
+    def _report_audio_pressure(self):
+        stats = self.audio.pressure()
+        print(f"Audio: {stats['played']} voices (peak {stats['peak_voices']}/{stats['budget']}, "
+              f"average load {stats['average_load']:.0%}), {stats['stolen']} stolen, {stats['dropped']} dropped, "
+              f"{stats['chords']['premixed']} chords premixed")
+
+    def _chord_shapes(self, tiles):
+        """Every group of notes the song will play together, for premixing recurring chords."""
+        groups = [tile.notes for tile in tiles if tile.notes]
+        for tile in tiles:
+            groups.extend(sub_note['notes'] for sub_note in tile.sub_notes if sub_note['notes'])
+        by_time = {}
+        for track in self.accompaniment_tracks:
+            for note in track:
+                by_time.setdefault(note['time'], []).append(note['note'])
+        groups.extend(by_time.values())
+        return groups
+
+    def load_song(self, song_file_name, seed=None, songs=None):
+        """Loads a song from `songs` (a song_pack source; the shared library by default)."""
+        # The last song's tiles and effects are reused for this one
+        self.tile_pool.release_all(self.all_tiles)
+        self.particle_pool.release_all(self.particles)
+        self.text_pool.release_all(self.floating_texts)
         self.reset_game_state()
-        song_path = os.path.join(config.SONGS_DIR, song_file_name)
-        self.parsed_song = song_parser.parse_song(song_path)
+        self.gc.between_songs()
+        self.song_file_name = song_file_name
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        songs = songs or song_source()
+        with songs.open(song_file_name) as song_data:
+            self.parsed_song = song_parser.parse_song_data(song_data, self.tile_pool)
+        lanes = self._lane_layout(song_file_name, songs)
+        lane_index = 0
 
         cumulative_time = 0.0
         self.star_end_times = []
@@ -118,14 +217,13 @@ class GameScreen:
 
             if first:
                 self.tps = (metadata['bpm'] / metadata['baseBeats']) / 60.0
-
-            tiles_to_add = part_data['playable_tiles']
-
-            self._assign_lanes(tiles_to_add, is_first_part=first)
             first = False
 
-            for tile in tiles_to_add:
+            tiles_to_add = part_data['playable_tiles']
+            for tile, lane in zip(tiles_to_add, lanes[lane_index:lane_index + len(tiles_to_add)]):
                 tile.time += cumulative_time
+                tile.lane = (lane, lane + 1) if tile.sub_type == TileType.Dual else lane
+            lane_index += len(tiles_to_add)
 
             temp_active_tiles.extend(tiles_to_add)
 
@@ -144,97 +242,174 @@ class GameScreen:
             cumulative_time += part_duration
             self.star_end_times.append(cumulative_time)
 
-        self.upcoming_tiles = deque(sorted(temp_active_tiles, key=lambda t: t.time))
-        self.active_tiles = []
+        self.all_tiles = sorted(temp_active_tiles, key=lambda t: t.time)
+        for index, tile in enumerate(self.all_tiles):
+            tile.index = index
+        self.tile_field = TileField(self.all_tiles)
+        self.judgement = JudgementIndex(self.all_tiles)
+        self.accompaniment_times = [[n['time'] for n in track] for track in self.accompaniment_tracks]
+        # Decode the song's notes and premix its chords on the sound worker during the countdown
+        chord_shapes = self._chord_shapes(temp_active_tiles)
+        self.sounds_ready = self.sounds.preload({note for group in chord_shapes for note in group},
+                                                on_loaded=lambda: self.audio.prepare(chord_shapes))
 
         self.accompaniment_indices = [0] * len(self.accompaniment_tracks)
         self.game_state = GameState.COUNTDOWN
 
-    def _get_pitch_value(self, note_name):
-        return self.pitch_map.get(note_name.replace('.', ''), self.pitch_map['c1'])
-
-    def _assign_lanes(self, tiles, is_first_part=False):
-        if not tiles: return
-
-        note_name_map = {}
-        for tile in tiles:
-            if tile.notes: note_name_map[tile] = tile.notes[0]
-
-        tiles.sort(key=lambda t: t.time)
-
-        for i, tile in enumerate(tiles):
-            current_pitch = self._get_pitch_value(note_name_map.get(tile, 'c1'))
-            potential_lane = self.last_lane
-
-            if is_first_part and i == 0:
-                potential_lane = random.randint(0, 3)
-            elif self.last_lane != -1:
-                if current_pitch > self.last_pitch:
-                    potential_lane = min(self.last_lane + 1, 3)
-                elif current_pitch < self.last_pitch:
-                    potential_lane = max(self.last_lane - 1, 0)
-
-                if potential_lane == self.last_lane:
-                    potential_lane = (self.last_lane + 1) % 4
-
-            num_lanes = 2 if tile.sub_type == TileType.Dual else 1
-            if potential_lane + num_lanes > 4:
-                potential_lane = 4 - num_lanes
-
-            if tile.sub_type == TileType.Dual:
-                tile.lane = (potential_lane, potential_lane + 1)
-            else:
-                tile.lane = potential_lane
-
-            self.last_lane = potential_lane
-            self.last_pitch = current_pitch
-
-    def run(self, clock):
+    def _lane_layout(self, song_file_name, songs):
+        """
+        The song's lanes for the current seed. The seed only picks the first tile's lane, so
+        a song has four layouts, each laid out once per song version.
+        """
+        start_lane = song_parser.first_lane(self.seed)
+        key = (song_file_name, songs.signature(song_file_name), start_lane)
+        lanes = self.lane_layouts.get(key)
+        if lanes is None:
+            lanes = song_parser.layout_lanes(self.parsed_song, start_lane)
+            if len(self.lane_layouts) >= config.LANE_LAYOUT_CACHE_SIZE:
+                del self.lane_layouts[next(iter(self.lane_layouts))]
+            self.lane_layouts[key] = lanes
+        return lanes
+
+    def load_replay(self, recording):
+        """
+        Loads a replay's song with its seed. Until the next load_song, input and practice
+        controls come from the replay instead of the devices.
+        """
+        header = recording.header
+        self.load_song(header['song'], seed=header['seed'])
+        self.set_playback_rate(header['rate'])
+        self.autoplay = header['autoplay']
+        self.replay_player = replay.ReplayPlayer(recording)
+
+    def run(self, clock, speed=1.0):
         self.game_loop = True
         while self.game_loop:
             self.real_time_clock = clock.tick(config.FPS) / 1000.0
+            self.profiler.begin_frame()
             self.handle_events()
-            self.update(self.real_time_clock)
+            self.update(self.real_time_clock * speed)
             self.draw()
+            self.profiler.end_frame(self.real_time_clock)
+        self.save_replay()
+        self.gc.between_songs()
 
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT: self.game_loop = False
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE: self.game_loop = False
-                if event.key == pygame.K_a: self.autoplay = not self.autoplay; print(
-                    f"Autoplay {'ON' if self.autoplay else 'OFF'}")
-                if self.game_state == GameState.PLAYING: self._handle_input(event)
-
-    def _handle_input(self, event, arduino_taps=None):
-        if self.autoplay: return
-        taps = []
-        if arduino_taps:
-            taps.extend(arduino_taps)
-        if event is not None and event.type == pygame.KEYDOWN and event.key in config.KEYBINDS:
-            taps.append(config.KEYBINDS[event.key])
-
-        for lane_idx in set(taps):
-            self._process_tap(lane_idx, self.game_time)
+                if event.key == pygame.K_F3: self.profiler.toggle_overlay()
+                if event.key == pygame.K_F4: self.profiler.export(label=self.song_file_name or 'session')
+                if self.replay_player:
+                    continue  # A replay supplies its own controls
+                if event.key == pygame.K_a: self.toggle_autoplay()
+                if event.key == pygame.K_MINUS: self.set_playback_rate(self.playback_rate - config.PRACTICE_RATE_STEP)
+                if event.key == pygame.K_EQUALS: self.set_playback_rate(self.playback_rate + config.PRACTICE_RATE_STEP)
+                if event.key == pygame.K_l: self.toggle_part_loop()
+                if event.key == pygame.K_LEFTBRACKET: self.loop_mark = self.game_time; print(
+                    f"Loop start marked at {self.game_time:.2f}s")
+                if event.key == pygame.K_RIGHTBRACKET and self.loop_mark is not None:
+                    self.set_loop(self.loop_mark, self.game_time)
+            if event.type in (pygame.KEYDOWN, pygame.KEYUP) and self.input_manager.keyboard:
+                self.input_manager.keyboard.handle_event(event)
+
+    def _process_input_events(self, frame_start_time):
+        """
+        Applies every press/release that arrived since the last frame, in time order. Device
+        events carry their own timestamps, which are mapped back into song time within this
+        frame.
+        """
+        if self.replay_player:
+            # The replay supplies the input; drop whatever the devices sent meanwhile
+            self.arduino.read_events()
+            self.input_manager.poll()
+            return
+        events = [(self.game_time, lane_idx, pressed, 'arduino') for lane_idx, pressed in self.arduino.read_events()]
+        now = time.perf_counter()
+        for event in self.input_manager.poll():
+            event_time = max(frame_start_time,
+                             self.game_time - max(0.0, now - event.timestamp) * self.playback_rate)
+            events.append((event_time, event.lane, event.pressed, event.device))
+        events.sort(key=lambda e: e[0])
+        for event_time, lane_idx, pressed, source in events:
+            self._apply_lane_event(lane_idx, pressed, event_time, source)
+
+    def _apply_replay_events(self):
+        """Feeds the replay's events up to the current song time through the live input paths."""
+        for _, event_time, code, lane, value in self.replay_player.due(self.loop_pass, self.game_time):
+            if code in (replay.PRESS, replay.RELEASE):
+                self._apply_lane_event(lane, code == replay.PRESS, event_time, self.replay_player.sources[int(value)])
+            elif code == replay.RATE:
+                self.set_playback_rate(value)
+            elif code == replay.AUTOPLAY:
+                self.autoplay = bool(value)
+            elif code == replay.LOOP_START:
+                self.loop_mark = value
+            elif code == replay.LOOP_END:
+                self.set_loop(self.loop_mark, value)
+            elif code == replay.LOOP_OFF:
+                self.set_loop(None)
+
+    def _apply_lane_event(self, lane_idx, pressed, event_time, source):
+        if self.game_state == GameState.PLAYING:
+            self._catch_up(event_time)
+            if self.recorder:
+                self._record(replay.PRESS if pressed else replay.RELEASE, lane_idx,
+                             self.recorder.source_index(source), event_time)
+        if pressed:
+            self.lanes.press(lane_idx, event_time, source)
+            if self.game_state == GameState.PLAYING and not self.autoplay:
+                self._process_tap(lane_idx, event_time)
+        else:
+            self._handle_release(lane_idx, event_time, source)
+
+    @property
+    def active_tiles(self):
+        """Tiles in play, in time order, from the first one that is not finished yet."""
+        return self.all_tiles[self.active_start:self.next_tile]
+
+    def _handle_release(self, lane_idx, release_time, source):
+        """Ends the hold on a lane the moment its last input source lets go."""
+        if not self.lanes.release(lane_idx, release_time, source) or self.autoplay:
+            return
+        tile = self.held_tiles.get(lane_idx)
+        if tile is None or tile.state != TileState.HELD or self.lanes.any_held(tile.lane):
+            return
+        self._advance_hold(tile, release_time)
+        tile.release_hold(release_time)
+        self._forget_held_tile(tile)
+
+    def _fetch_tiles(self, until_time):
+        """Brings the tiles due within BEATS_AHEAD of until_time into play."""
+        self.next_tile = max(self.next_tile, self.tile_field.count_until(until_time + config.BEATS_AHEAD / self.tps))
 
     def update(self, dt):
-        lookahead_time = config.BEATS_AHEAD / self.tps
-        while self.upcoming_tiles and self.upcoming_tiles[0].time <= self.game_time + lookahead_time:
-            self.active_tiles.append(self.upcoming_tiles.popleft())
+        self._fetch_tiles(self.game_time)
 
         if self.game_state == GameState.COUNTDOWN:
             self.countdown_timer -= dt
 
             if self.countdown_timer <= 0:
+                if self.sounds_ready:
+                    self.sounds_ready.result()
                 self.game_state = GameState.PLAYING
                 self.game_time = -2.0
+                self._start_recording()
+                self.gc.start_play()
+            self._process_input_events(self.game_time)
 
         elif self.game_state == GameState.PLAYING:
-            self.game_time += dt
+            frame_start_time = self.game_time
+            self.game_time += dt * self.playback_rate
+            if self.replay_player:
+                self._apply_replay_events()
+            if self.loop and self.game_time >= self.loop[1]:
+                self._restart_loop()
+                frame_start_time = self.game_time
+            self.audio.sync(self.game_time)
 
-            arduino_taps = self.arduino.read_input()
-            if arduino_taps:
-                self._handle_input(None, arduino_taps=arduino_taps)
+            self._process_input_events(frame_start_time)
 
             if self.autoplay:
                 self._handle_autoplay()
@@ -246,47 +421,58 @@ class GameScreen:
 
             if self.stars_earned == self.num_stars and self.is_level_finished():
                 self.game_state = GameState.FINISHED
+                self.gc.end_play()
+                self._report_audio_pressure()
+                self._report_memory()
+                self.save_replay()
 
         elif self.game_state == GameState.FINISHED:
             pass
 
         for p in self.particles:
             p.update()
-        self.particles = [p for p in self.particles if p.lifetime > 0]
+        release_expired(self.particle_pool, self.particles, Particle.expired)
 
     def _handle_autoplay(self):
-        for tile in self.active_tiles:
+        # Only tiles that have reached the strike line need anything from autoplay
+        due = min(self.next_tile, self.tile_field.count_until(self.game_time))
+        for tile in self.all_tiles[self.active_start:due]:
             if tile.state in [TileState.ACTIVE, TileState.MISSED] and tile.time <= self.game_time:
                 lane_to_tap = tile.lane if isinstance(tile.lane, int) else tile.lane[0]
                 self._process_tap(lane_to_tap, tile.time)
 
             if tile.state == TileState.HELD and tile.time + tile.duration <= self.game_time:
-                tile.release_hold()
+                tile.release_hold(self.game_time)
+                self._forget_held_tile(tile)
                 self.score += int(config.HOLD_POINTS_PER_BEAT * self.combo * tile.duration * self.tps / 2)
 
     def _process_tap(self, lane_idx, hit_time):
-        hittable_tiles = [
-            t for t in self.active_tiles if t.state in [TileState.ACTIVE, TileState.MISSED] and
-                                            (t.lane == lane_idx or (isinstance(t.lane, tuple) and lane_idx in t.lane))
-        ]
-        if not hittable_tiles: return
+        # The tile in play on the lane closest in time to the tap is the one judged
+        best_tile = self.judgement.nearest(lane_idx, hit_time, self.next_tile)
+        if best_tile is None: return
 
-        best_tile = min(hittable_tiles, key=lambda t: abs(t.time - hit_time))
-        quality, color = best_tile.check_hit(hit_time)
+        quality, color = best_tile.check_hit(hit_time, self.playback_rate)
 
         if quality in ['perfect', 'great', 'good']:
             best_tile.on_hit(quality, color, hit_time)
+            if best_tile.state == TileState.HELD:
+                for ln in ([best_tile.lane] if isinstance(best_tile.lane, int) else best_tile.lane):
+                    self.held_tiles[ln] = best_tile
+                self.timers.schedule(best_tile.next_hold_time(), HOLD_STEP, best_tile)
 
+            accompaniment = []
             for i, track in enumerate(self.accompaniment_tracks):
                 while self.accompaniment_indices[i] < len(track) and \
                         track[self.accompaniment_indices[i]]['time'] + self.time_offset <= best_tile.time:
                     note_time = track[self.accompaniment_indices[i]]['time'] + self.time_offset
                     if note_time > self.last_hit_musical_time:
-                        self._play_sound(track[self.accompaniment_indices[i]]['note'])
+                        accompaniment.append(track[self.accompaniment_indices[i]]['note'])
                     self.accompaniment_indices[i] += 1
             self.last_hit_musical_time = best_tile.time
 
-            for note in best_tile.notes: self._play_sound(note)
+            # Everything caught up by this tap sounds at once, so each group is one premixed voice
+            self._play_sound(accompaniment, hit_time)
+            self._play_sound(best_tile.notes, hit_time, priority=1)
 
             if quality == 'perfect':
                 self.score += int(10 * self.combo)
@@ -299,59 +485,237 @@ class GameScreen:
             lanes = [best_tile.lane] if isinstance(best_tile.lane, int) else best_tile.lane
             for ln in lanes: self._create_particles(ln)
         else:
+            if best_tile.state != TileState.MISSED:
+                self.timers.schedule(hit_time + best_tile.FLASH_DURATION, FLASH_END, best_tile)
             best_tile.miss(hit_time)
             self.combo = 0
 
-    def _update_tiles(self):
-        arduino_held_lanes = self.arduino.get_held_lanes()
-        keys_held = pygame.key.get_pressed()
-        remaining_tiles = []
-        is_level_done = True
-
-        for tile in self.active_tiles:
-            tile.update(self.game_time, self.tps)
-
-            if tile.state == TileState.HELD:
-                is_held = self.autoplay
-                lanes = [tile.lane] if isinstance(tile.lane, int) else tile.lane
-                for l in lanes:
-                    if l in arduino_held_lanes or any(keys_held[key] and lane == l for key, lane in config.KEYBINDS.items()):
-                        is_held = True
-
-                if is_held:
-                    score_multiplier, new_notes_info = tile.update_hold(self.game_time)
-                    if score_multiplier > 0:
-                        bonus = int(score_multiplier * config.HOLD_POINTS_PER_BEAT * self.combo)
-                        self.score += bonus
-                        self.floating_texts.append(
-                            FloatingText(f"+{bonus}", tile.rect.centerx, tile.rect.top, config.FONT_PATH))
-                    for note_info in new_notes_info:
-                        for note in note_info['notes']: self._play_sound(note)
-                        self._create_particles(tile.rect.centerx / config.TILE_WIDTH, hit_y=note_info['y'], count=3)
-                else:
-                    tile.release_hold()
-
-            if tile.state == TileState.ACTIVE and tile.time < self.game_time - config.GOOD_TIMING:
-                self.combo = 0
-                tile.pass_by()
-
-            if tile.state == TileState.HIT and tile.fade_alpha <= 0:
-                continue
-
-            if tile.rect.top < self.surface.get_height() + 100:
-                remaining_tiles.append(tile)
-                if tile.state in [TileState.ACTIVE, TileState.HELD, TileState.MISSED]:
-                    is_level_done = False
+    def _catch_up(self, until_time):
+        """
+        Brings tiles up to `until_time` before an input event at that time is applied: tiles
+        whose window has closed pass, missed tiles finish flashing and held tiles advance. The
+        frame update does the same at the end of each frame, so judging an event never
+        depends on where frame boundaries fall (which lets replays re-simulate exactly).
+        """
+        if self.autoplay:
+            return
+        self._fetch_tiles(until_time)
+        self._run_timers(until_time)
+
+    def _run_timers(self, until_time):
+        """
+        Applies the tile state changes due up to `until_time`, in time order: tiles passing
+        their judgement window (read off the time-sorted tiles, as the window follows the
+        playback rate) and the scheduled timers.
+        """
+        tiles, timers = self.all_tiles, self.timers
+        window = config.GOOD_TIMING * self.playback_rate
+        while True:
+            cursor = self.pass_cursor
+            pass_time = tiles[cursor].time + window if cursor < self.next_tile else float('inf')
+            due_time = timers.next_due()
+            if pass_time < until_time and pass_time <= due_time:
+                self.pass_cursor += 1
+                tile = tiles[cursor]
+                if tile.state == TileState.ACTIVE:
+                    self.combo = 0
+                    tile.pass_by()
+            elif due_time <= until_time:
+                due_time, kind, tile = timers.pop()
+                if kind == FLASH_END:
+                    tile.update_flash(due_time)
+                elif kind == HOLD_STEP and tile.state == TileState.HELD:
+                    if self.autoplay or self.lanes.any_held(tile.lane):
+                        self._advance_hold(tile, due_time)
+                        if tile.state == TileState.HELD:
+                            timers.schedule(tile.next_hold_time(), HOLD_STEP, tile)
+                    else:
+                        # The release event was missed (e.g. focus lost), so let go now
+                        tile.release_hold(due_time)
+                        self._forget_held_tile(tile)
+            else:
+                return
+
+    def _place_tile(self, tile, current_time):
+        """Moves a tile's rect to where it is at current_time."""
+        index = tile.index
+        field = self.tile_field
+        top = field.layout(index, index + 1, current_time, self.tps)[0]
+        tile.rect.update(field.x[index], top, field.widths[index], field.heights[index])
+
+    def _advance_hold(self, tile, current_time):
+        """Advances a held tile to current_time, awarding hold points and playing sub-notes."""
+        self._place_tile(tile, current_time)
+        score_multiplier, new_notes_info = tile.update_hold(current_time)
+        if score_multiplier > 0:
+            bonus = int(score_multiplier * config.HOLD_POINTS_PER_BEAT * self.combo)
+            self.score += bonus
+            self.floating_texts.append(
+                self.text_pool.acquire(f"+{bonus}", tile.rect.centerx, tile.rect.top, config.FONT_PATH))
+        for note_info in new_notes_info:
+            self._play_sound(note_info['notes'], note_info['time'], priority=1)
+            self._create_particles(tile.rect.centerx / config.TILE_WIDTH, hit_y=note_info['y'], count=3)
+        if tile.state != TileState.HELD:
+            self._forget_held_tile(tile)
+
+    def _forget_held_tile(self, tile):
+        for ln in ([tile.lane] if isinstance(tile.lane, int) else tile.lane):
+            if self.held_tiles.get(ln) is tile:
+                del self.held_tiles[ln]
 
-        self.active_tiles = remaining_tiles
-        self.level_is_finished = is_level_done
+    def _update_tiles(self):
+        """
+        Applies the tile state changes due by the end of the frame and retires finished tiles.
+        Only tiles whose state changes are touched; positions and animations are left to draw().
+        """
+        self._run_timers(self.game_time)
+
+        if not self.autoplay:
+            for tile in list(self.held_tiles.values()):
+                if tile.state == TileState.HELD and not self.lanes.any_held(tile.lane):
+                    # The release event was missed (e.g. focus lost), so let go now
+                    tile.release_hold(self.game_time)
+                    self._forget_held_tile(tile)
+
+        tiles, start = self.all_tiles, self.active_start
+        while start < self.next_tile and tiles[start].state in (TileState.PASSED, TileState.HIT):
+            start += 1
+        self.active_start = start
+        self.level_is_finished = start == self.next_tile
+
+    def set_playback_rate(self, rate):
+        """
+        Sets the practice speed. Song time advances `rate` times as fast, which scales scroll
+        speed with it; judgement windows are scaled so they stay the same in real time.
+        """
+        rate = round(min(config.PRACTICE_MAX_RATE, max(config.PRACTICE_MIN_RATE, rate)), 2)
+        if rate != self.playback_rate:
+            self.playback_rate = rate
+            self.audio.set_rate(rate)
+            self._record(replay.RATE, value=rate)
+            print(f"Playback rate {rate:.0%}")
+
+    def toggle_autoplay(self):
+        self.autoplay = not self.autoplay
+        self._record(replay.AUTOPLAY, value=float(self.autoplay))
+        print(f"Autoplay {'ON' if self.autoplay else 'OFF'}")
+
+    def toggle_part_loop(self):
+        """Loops the part (star) being played, or turns looping off."""
+        if self.loop or not self.star_end_times:
+            self.set_loop(None)
+            return
+        part = min(bisect_left(self.star_end_times, self.game_time), self.num_stars - 1)
+        self.set_loop(self.star_end_times[part - 1] if part > 0 else 0.0, self.star_end_times[part])
+
+    def set_loop(self, start, end=None):
+        """Repeats song time [start, end) until cleared with set_loop(None)."""
+        if start is None or end is None or end <= start:
+            self.loop = None
+            self._record(replay.LOOP_OFF)
+            print("Loop off")
+            return
+        self._record(replay.LOOP_START, value=start)
+        self._record(replay.LOOP_END, value=end)
+        first, last = self.tile_field.count_before(start), self.tile_field.count_before(end)
+        # Let the last tile's hold finish before jumping back
+        end = max([end] + [t.time + t.duration for t in self.all_tiles[first:last]])
+        self.loop = (start, end, first, last)
+        print(f"Looping {start:.2f}s - {end:.2f}s ({last - first} tiles)")
+
+    def _restart_loop(self):
+        """Rewinds to the loop start, resetting the already built tiles instead of reloading the song."""
+        start, end, first, _ = self.loop
+        # Settle everything up to the loop end first, whichever frame happened to cross it
+        self._catch_up(end)
+        self.audio.stop_all()
+        # Every tile from the loop start on, including ones past the end that were hit just
+        # before the jump and have already left active_tiles
+        for tile in self.all_tiles[first:]:
+            tile.reset()
+        # Tiles after the loop stay queued so the song carries on once the loop is cleared
+        self.next_tile = self.active_start = self.pass_cursor = self.draw_start = first
+        self.judgement.rewind(first)
+        self.timers.clear()
+        self.visible_tiles = []
+        self.held_tiles = {}
+        self.accompaniment_indices = [bisect_left(times, start) for times in self.accompaniment_times]
+        self.last_hit_musical_time = float('-inf')
+        self.stars_earned = bisect_left(self.star_end_times, start + 1e-9)
+        self.game_time = start - config.PRACTICE_LOOP_LEAD_IN
+        self.loop_pass += 1
+
+    def _start_recording(self):
+        """Starts a replay of the session, including lanes already held when play begins."""
+        if not config.RECORD_REPLAYS or self.replay_player:
+            return
+        self.recorder = replay.ReplayRecorder(self.song_file_name, self.seed, self.playback_rate, self.autoplay)
+        for source, lanes in self.lanes.held_by_source().items():
+            for lane in lanes:
+                self._record(replay.PRESS, lane, self.recorder.source_index(source))
+        if self.loop:
+            self._record(replay.LOOP_START, value=self.loop[0])
+            self._record(replay.LOOP_END, value=self.loop[1])
+
+    def _record(self, code, lane=0, value=0.0, at_time=None):
+        if self.recorder and self.game_state == GameState.PLAYING:
+            self.recorder.record(self.loop_pass, self.game_time if at_time is None else at_time, code, lane, value)
+
+    def session_result(self):
+        """The outcome of the session so far, as stored in (and checked against) replays."""
+        return {'score': self.score, 'combo': self.combo, 'stars': self.stars_earned,
+                'finished': self.game_state == GameState.FINISHED, 'ended_at': [self.loop_pass, self.game_time]}
+
+    def save_replay(self):
+        """Writes the session being recorded to config.REPLAY_DIR. Returns the path, or None."""
+        if not self.recorder:
+            return None
+        recorder, self.recorder = self.recorder, None
+        path = recorder.default_path()
+        try:
+            recorder.finish(self.session_result()).save(path)
+        except OSError as e:
+            print(f"Could not save replay: {e}")
+            return None
+        print(f"Replay saved to {path}")
+        return path
 
     def is_level_finished(self):
         return self.level_is_finished
 
     def _create_particles(self, lane, count=8, hit_y=config.STRIKE_LINE_Y):
         x = (lane * config.TILE_WIDTH) + (config.TILE_WIDTH / 2)
-        for _ in range(count): self.particles.append(Particle(x, hit_y, Tile.dot_light_img))
+        for _ in range(count): self.particles.append(self.particle_pool.acquire(x, hit_y, Tile.dot_light_img))
+
+    def _layout_visible_tiles(self):
+        """
+        Positions and animates the tiles that reach onto the screen. Tiles that have left it
+        (off the bottom, or hit and faded out) do not come back, so draw_start moves past them.
+        """
+        field, tiles, current_time = self.tile_field, self.all_tiles, self.game_time
+        start = self.draw_start
+        end = max(min(field.first_above_screen(current_time, self.tps), self.next_tile), start)
+        tops = field.layout(start, end, current_time, self.tps)
+        bottom_limit = self.surface.get_height() + 100
+        x, widths, heights = field.x, field.widths, field.heights
+
+        visible = []
+        gone_before = start  # Every tile before this one has left the screen
+        for tile in tiles[start:end]:
+            index = tile.index
+            if tile.state != TileState.HIT:
+                tile.rect.update(x[index], tops[index - start], widths[index], heights[index])
+                gone = tile.rect.top >= bottom_limit
+            else:
+                gone = tile.fade_end_time() <= current_time or tile.rect.top >= bottom_limit
+            if gone:
+                if gone_before == index:
+                    gone_before += 1
+                continue
+            tile.animate(current_time)
+            visible.append(tile)
+        self.draw_start = gone_before
+        self.visible_tiles = visible
 
     def draw(self):
         self.surface.blit(self.assets['background'], (0, 0))
@@ -362,11 +726,12 @@ class GameScreen:
 
         for p in self.particles: p.draw(self.surface)
         if self.game_state != GameState.COUNTDOWN:
-            for t in self.active_tiles: t.draw(self.surface)
+            self._layout_visible_tiles()
+            for t in self.visible_tiles: t.draw(self.surface)
         for ft in self.floating_texts:
             ft.update()
             ft.draw(self.surface)
-        self.floating_texts = [ft for ft in self.floating_texts if ft.alpha > 0]
+        release_expired(self.text_pool, self.floating_texts, FloatingText.expired)
 
         utils.draw_text(self.surface, f"Score: {self.score}", 30, config.SCREEN_WIDTH - 10, 25, config.WHITE,
                         config.FONT_PATH, "topright", shadow=True)
@@ -374,6 +739,10 @@ class GameScreen:
                         shadow=True)
         utils.draw_text(self.surface, "".join(["★" * self.stars_earned]), 40, config.SCREEN_WIDTH / 2, 25, "yellow",
                         config.SYMBOL_FONT_PATH, "center", shadow=True)
+        if self.playback_rate != 1.0 or self.loop:
+            practice = f"{self.playback_rate:.0%}" + (" LOOP" if self.loop else "")
+            utils.draw_text(self.surface, practice, 24, config.SCREEN_WIDTH / 2, 60, "cyan", config.FONT_PATH,
+                            "center", shadow=True)
 
         if self.game_state == GameState.COUNTDOWN and self.countdown_timer < 3:
             utils.draw_text(self.surface, str(int(self.countdown_timer) + 1), 100, config.SCREEN_WIDTH // 2,
@@ -384,24 +753,9 @@ class GameScreen:
             utils.draw_text(self.surface, f"Final Score: {self.score}", 40, config.SCREEN_WIDTH // 2,
                             config.SCREEN_HEIGHT // 2 + 50, config.WHITE, config.FONT_PATH, "center", True)
 
+        self.profiler.draw_overlay(self.surface)
         pygame.display.flip()
 
-    def _create_pitch_map(self):
-        notes, note_map, val = "a,#a,b,c,#c,d,#d,e,f,#f,g,#g".split(','), {}, 21
-        for oct in range(-3, 6):
-            for note in notes:
-                if oct < 0 and note in "c,#c,d,#d,e,f,#f,g,#g": continue
-                if oct == 5 and note not in "c": continue
-                name = note[0].upper() + note[1:] if oct < 0 else note
-                oct_str = str(abs(oct)) if oct != 0 else ""
-                if oct < 0:
-                    name += "-" + oct_str
-                elif oct > 0:
-                    name += oct_str
-                note_map[name] = val
-                val += 1
-        return note_map
-
 
 if __name__ == '__main__':
     pygame.init()
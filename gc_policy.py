@@ -0,0 +1,77 @@
+# gc_policy.py
+"""
+Keeps Python's cyclic garbage collector from pausing a song. Before play starts everything
+loaded so far is collected and, depending on config.GC_MODE, frozen out of the collector's
+reach or the collector is switched off; the collector is put back, and the song's garbage
+collected, between songs. Collections that still happen during play are counted and timed.
+"""
+import gc
+import time
+
+import config
+
+MODES = ('default', 'freeze', 'off')
+
+
+class GameplayGC:
+    def __init__(self, mode=config.GC_MODE, threshold=config.GC_THRESHOLD):
+        if mode not in MODES:
+            raise ValueError(f"Unknown GC mode {mode!r} (expected one of {', '.join(MODES)})")
+        self.mode = mode
+        self.threshold = threshold
+        self.playing = False
+        self._saved_threshold = None
+        self._was_enabled = True
+        self._pause_start = None
+        self.stats = {'collections': 0, 'pause_seconds': 0.0, 'longest_pause': 0.0}
+
+    def start_play(self):
+        """Collects what loading left behind, then applies the play-time policy."""
+        if self.playing:
+            return
+        gc.collect()
+        self.stats = {'collections': 0, 'pause_seconds': 0.0, 'longest_pause': 0.0}
+        if self.mode in ('freeze', 'off'):
+            gc.freeze()
+        if self.mode == 'off':
+            self._was_enabled = gc.isenabled()
+            gc.disable()
+        if self.threshold is not None:
+            self._saved_threshold = gc.get_threshold()
+            gc.set_threshold(self.threshold, *self._saved_threshold[1:])
+        gc.callbacks.append(self._on_collection)
+        self.playing = True
+
+    def end_play(self):
+        """Puts the collector back as it was before start_play (without collecting yet)."""
+        if not self.playing:
+            return
+        gc.callbacks.remove(self._on_collection)
+        if self._saved_threshold is not None:
+            gc.set_threshold(*self._saved_threshold)
+            self._saved_threshold = None
+        if self.mode == 'off' and self._was_enabled:
+            gc.enable()
+        if self.mode in ('freeze', 'off'):
+            gc.unfreeze()
+        self.playing = False
+
+    def between_songs(self):
+        """Ends play and collects the garbage of the song that was played."""
+        self.end_play()
+        gc.collect()
+
+    def _on_collection(self, phase, info):
+        if phase == 'start':
+            self._pause_start = time.perf_counter()
+        elif self._pause_start is not None:
+            pause = time.perf_counter() - self._pause_start
+            self._pause_start = None
+            self.stats['collections'] += 1
+            self.stats['pause_seconds'] += pause
+            self.stats['longest_pause'] = max(self.stats['longest_pause'], pause)
+
+    def report(self):
+        stats = self.stats
+        return (f"GC ({self.mode}): {stats['collections']} collections during play, "
+                f"{stats['pause_seconds'] * 1000:.1f} ms in total, longest {stats['longest_pause'] * 1000:.2f} ms")
@@ -0,0 +1,255 @@
+# input_manager.py
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import pygame
+import serial
+import config
+
+# A single lane transition. `timestamp` is time.perf_counter() when the event was read,
+# `lane` is already mapped into the game's lane space.
+InputEvent = namedtuple('InputEvent', ['timestamp', 'lane', 'pressed', 'device', 'player'])
+
+
+class DeviceStats:
+    """Throughput and error counters for one input device."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.bytes_read = 0
+        self.lines = 0
+        self.malformed = 0
+        self.events = 0
+        self.dropped = 0
+
+    def as_dict(self):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        return {
+            'bytes_read': self.bytes_read,
+            'lines': self.lines,
+            'malformed': self.malformed,
+            'events': self.events,
+            'dropped': self.dropped,
+            'lines_per_sec': self.lines / elapsed,
+            'events_per_sec': self.events / elapsed,
+        }
+
+
+class InputDevice:
+    """Base class for anything that feeds lane presses into the InputDeviceManager."""
+
+    def __init__(self, name, lanes, player=0):
+        self.name = name
+        self.lanes = list(lanes)  # Local lane index -> game lane
+        self.player = player
+        self.stats = DeviceStats()
+        self._queue = None
+
+    def attach(self, event_queue):
+        self._queue = event_queue
+
+    def emit(self, local_lane, pressed, timestamp=None):
+        """Maps a local lane to the game lane and pushes the event to the shared queue."""
+        if not 0 <= local_lane < len(self.lanes) or self._queue is None:
+            return
+        event = InputEvent(timestamp if timestamp is not None else time.perf_counter(),
+                           self.lanes[local_lane], pressed, self.name, self.player)
+        try:
+            self._queue.put_nowait(event)
+            self.stats.events += 1
+        except queue.Full:
+            self.stats.dropped += 1
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class KeyboardDevice(InputDevice):
+    """A keyboard as an input device. Key events are fed in from the pygame event loop."""
+
+    def __init__(self, name='keyboard', keybinds=None, player=0):
+        super().__init__(name, range(config.SCREEN_WIDTH // config.TILE_WIDTH), player)
+        # None means "follow config.KEYBINDS", so keybind changes from the settings screen apply
+        self.keybinds = keybinds
+
+    def handle_event(self, event):
+        """Returns True if the event was a bound key and has been queued."""
+        keybinds = self.keybinds if self.keybinds is not None else config.KEYBINDS
+        if event.type not in (pygame.KEYDOWN, pygame.KEYUP) or event.key not in keybinds:
+            return False
+        self.stats.lines += 1
+        self.emit(keybinds[event.key], event.type == pygame.KEYDOWN)
+        return True
+
+
+class SerialController(InputDevice):
+    """
+    An Arduino pad on a serial port. A background thread reads state lines such as "0100"
+    (one character per lane) and queues a timestamped event for every lane that flips.
+    """
+
+    def __init__(self, port, baud_rate=config.BAUD_RATE, lanes=(0, 1, 2, 3), player=0, name=None):
+        super().__init__(name or port, lanes, player)
+        self.port = port
+        self.baud_rate = baud_rate
+        self.ser = None
+        self.connected = False
+        self.last_state = [False] * len(self.lanes)
+        self._read_buffer = ""
+        self._running = False
+        self._thread = None
+
+    def connect(self):
+        try:
+            self.ser = serial.Serial(self.port, self.baud_rate, timeout=0.01)
+            self.ser.reset_input_buffer()
+            self.connected = True
+            print(f"Controller '{self.name}' connected on {self.port}")
+        except serial.SerialException:
+            self.connected = False
+            print(f"Controller '{self.name}' not found on {self.port}.")
+        return self.connected
+
+    def start(self):
+        if not self.connected and not self.connect():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._read_loop, name=f"serial-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _read_loop(self):
+        while self._running:
+            try:
+                # Block briefly for the first byte, then take everything already waiting
+                data = self.ser.read(max(1, self.ser.in_waiting))
+            except (serial.SerialException, OSError, TypeError, AttributeError):
+                if self._running:
+                    print(f"Controller '{self.name}' disconnected.")
+                self.connected = False
+                # Anything still held is released with the connection
+                for lane, state in enumerate(self.last_state):
+                    if state:
+                        self.emit(lane, False)
+                self.last_state = [False] * len(self.lanes)
+                break
+            if not data:
+                continue
+            timestamp = time.perf_counter()
+            self.stats.bytes_read += len(data)
+            self._read_buffer += data.decode('utf-8', errors='ignore')
+            while '\n' in self._read_buffer:
+                line, self._read_buffer = self._read_buffer.split('\n', 1)
+                self._process_line(line.strip(), timestamp)
+
+    def _process_line(self, line, timestamp):
+        self.stats.lines += 1
+        if len(line) != len(self.lanes) or not all(c in '01' for c in line):
+            self.stats.malformed += 1
+            return
+        current_state = [c == '1' for c in line]
+        for lane, (prev, curr) in enumerate(zip(self.last_state, current_state)):
+            if prev != curr:
+                self.emit(lane, curr, timestamp)
+        self.last_state = current_state
+
+    def close(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=0.5)
+            self._thread = None
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+        self.connected = False
+
+
+class InputDeviceManager:
+    """
+    Owns every input device (keyboards and any number of serial pads) and merges their
+    events into a single timestamp-ordered stream.
+    """
+
+    def __init__(self, max_queued_events=4096):
+        self._queue = queue.Queue(maxsize=max_queued_events)
+        self.devices = {}
+        self.keyboard = None
+
+    @classmethod
+    def from_config(cls):
+        """Builds a manager with the default keyboard plus the pads listed in config.CONTROLLERS."""
+        manager = cls()
+        manager.keyboard = manager.add_device(KeyboardDevice())
+        for entry in config.CONTROLLERS:
+            manager.add_device(SerialController(entry['port'], entry.get('baud_rate', config.BAUD_RATE),
+                                                lanes=entry.get('lanes', (0, 1, 2, 3)),
+                                                player=entry.get('player', 0), name=entry.get('name')))
+        manager.start()
+        return manager
+
+    def add_device(self, device):
+        if device.name in self.devices:
+            raise ValueError(f"Duplicate input device name: {device.name}")
+        device.attach(self._queue)
+        self.devices[device.name] = device
+        return device
+
+    def remove_device(self, name):
+        device = self.devices.pop(name, None)
+        if device:
+            device.close()
+
+    def start(self):
+        for device in self.devices.values():
+            device.start()
+
+    def poll(self):
+        """Drains all queued events from every device, oldest first."""
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        events.sort(key=lambda e: e.timestamp)
+        return events
+
+    def stats(self):
+        """Per-device counters, keyed by device name."""
+        return {name: device.stats.as_dict() for name, device in self.devices.items()}
+
+    def close(self):
+        for device in self.devices.values():
+            device.close()
+
+
+if __name__ == '__main__':
+    # Self-test with two virtual pads on pseudo-terminals (Linux/macOS only).
+    import os
+
+    print("--- Input Device Manager Test ---")
+    manager = InputDeviceManager()
+    masters = []
+    for player, lanes in enumerate([(0, 1, 2, 3), (3, 2, 1, 0)]):
+        master, slave = os.openpty()
+        masters.append(master)
+        manager.add_device(SerialController(os.ttyname(slave), lanes=lanes, player=player, name=f"pad{player}"))
+    manager.start()
+
+    for line in ["0000", "1000", "1100", "0100", "bad!", "0000"]:
+        for master in masters:
+            os.write(master, f"{line}\n".encode())
+        time.sleep(0.02)
+    time.sleep(0.1)
+
+    for event in manager.poll():
+        print(f"{event.timestamp:.4f} {event.device} (player {event.player}) lane {event.lane} "
+              f"{'down' if event.pressed else 'up'}")
+    for name, stats in manager.stats().items():
+        print(name, stats)
+    manager.close()
+    for master in masters:
+        os.close(master)
@@ -0,0 +1,63 @@
+# judgement.py
+"""
+Per-lane index of a song's tiles for judging taps. Each lane keeps the times and song
+indices of the tiles on it (a dual tile is on both of its lanes) in time order, and a
+cursor past the tiles that can no longer be tapped. The tile a tap judges is found by
+bisecting the lane's times, so a tap costs O(log n) however many tiles are in play.
+"""
+from bisect import bisect_left
+
+from tile import TileState
+
+_TAPPABLE = (TileState.ACTIVE, TileState.MISSED)
+
+
+class JudgementIndex:
+    """Tiles of a song (sorted by time, with .index set) split into lanes."""
+
+    def __init__(self, tiles):
+        lane_count = 1 + max((max(t.lane) if isinstance(t.lane, tuple) else t.lane for t in tiles), default=3)
+        self.lane_tiles = [[] for _ in range(lane_count)]
+        for tile in tiles:
+            for lane in (tile.lane if isinstance(tile.lane, tuple) else (tile.lane,)):
+                self.lane_tiles[lane].append(tile)
+        self.lane_times = [[t.time for t in lane_tiles] for lane_tiles in self.lane_tiles]
+        self.lane_indices = [[t.index for t in lane_tiles] for lane_tiles in self.lane_tiles]
+        self.cursors = [0] * lane_count  # Per lane: tiles before it are hit, held or passed
+
+    def rewind(self, first_index):
+        """Starts every lane at the song's tile `first_index` (a practice loop restarting)."""
+        self.cursors = [bisect_left(indices, first_index) for indices in self.lane_indices]
+
+    def nearest(self, lane, hit_time, end_index):
+        """
+        The tappable (ACTIVE or MISSED) tile on `lane` closest in time to hit_time among the
+        song's tiles before `end_index`, or None. On a tie the earlier tile wins.
+        """
+        if not 0 <= lane < len(self.lane_tiles):
+            return None
+        tiles, times = self.lane_tiles[lane], self.lane_times[lane]
+        cursor = self.cursors[lane]
+        end = bisect_left(self.lane_indices[lane], end_index, cursor)
+        # Hit, held and passed tiles never become tappable again, so the cursor skips them for good
+        while cursor < end and tiles[cursor].state not in _TAPPABLE:
+            cursor += 1
+        self.cursors[lane] = cursor
+
+        pos = bisect_left(times, hit_time, cursor, end)
+        after = pos
+        while after < end and tiles[after].state not in _TAPPABLE:
+            after += 1
+        before = pos - 1
+        while before >= cursor and tiles[before].state not in _TAPPABLE:
+            before -= 1
+        if before >= cursor:
+            # Of tiles at the same time, the earliest one
+            same = before - 1
+            while same >= cursor and times[same] == times[before]:
+                if tiles[same].state in _TAPPABLE:
+                    before = same
+                same -= 1
+            if after >= end or hit_time - times[before] <= times[after] - hit_time:
+                return tiles[before]
+        return tiles[after] if after < end else None
@@ -0,0 +1,90 @@
+# lane_tracker.py
+class LaneTracker:
+    """
+    Tracks which lanes are currently held down. Every input source (keyboard, Arduino, ...)
+    reports press/release events as they arrive and the tracker keeps a per-lane bitmask
+    so hold checks are a single bit test instead of a scan over all keybinds.
+    """
+
+    def __init__(self, num_lanes=4):
+        self.num_lanes = num_lanes
+        self.reset()
+
+    def reset(self):
+        """Forget all held lanes and timestamps."""
+        self.held_mask = 0
+        # Each source keeps its own mask so a lane held on two devices stays held
+        # until the last one lets go.
+        self._source_masks = {}
+        self.press_times = [-1.0] * self.num_lanes
+        self.release_times = [-1.0] * self.num_lanes
+
+    def press(self, lane, time, source='keyboard'):
+        """
+        Registers a press on a lane. Returns True if the lane went from released to held.
+        """
+        if not 0 <= lane < self.num_lanes:
+            return False
+        bit = 1 << lane
+        was_held = self.held_mask & bit
+        self._source_masks[source] = self._source_masks.get(source, 0) | bit
+        self.held_mask |= bit
+        if not was_held:
+            self.press_times[lane] = time
+            return True
+        return False
+
+    def release(self, lane, time, source='keyboard'):
+        """
+        Registers a release on a lane. Returns True if no source is holding the lane anymore.
+        """
+        if not 0 <= lane < self.num_lanes:
+            return False
+        bit = 1 << lane
+        self._source_masks[source] = self._source_masks.get(source, 0) & ~bit
+        if not self.held_mask & bit:
+            return False
+        for mask in self._source_masks.values():
+            if mask & bit:
+                return False
+        self.held_mask &= ~bit
+        self.release_times[lane] = time
+        return True
+
+    def release_source(self, source, time):
+        """Releases every lane held by a source (e.g. when a device disconnects)."""
+        released = []
+        mask = self._source_masks.get(source, 0)
+        for lane in range(self.num_lanes):
+            if mask & (1 << lane) and self.release(lane, time, source):
+                released.append(lane)
+        return released
+
+    def is_held(self, lane):
+        return bool(self.held_mask & (1 << lane))
+
+    def any_held(self, lanes):
+        """Returns True if any of the given lanes (int or tuple) is held."""
+        if isinstance(lanes, int):
+            return bool(self.held_mask & (1 << lanes))
+        return any(self.held_mask & (1 << lane) for lane in lanes)
+
+    def held_by_source(self):
+        """Returns {source: [held lanes]} for every source holding at least one lane."""
+        return {source: [lane for lane in range(self.num_lanes) if mask & (1 << lane)]
+                for source, mask in self._source_masks.items() if mask}
+
+    def held_lanes(self):
+        return [lane for lane in range(self.num_lanes) if self.held_mask & (1 << lane)]
+
+
+if __name__ == '__main__':
+    tracker = LaneTracker()
+    tracker.press(0, 0.10)
+    tracker.press(0, 0.12, source='arduino')
+    tracker.press(2, 0.15)
+    print(f"Held: {tracker.held_lanes()} (mask {tracker.held_mask:04b})")
+    print(f"Keyboard release of lane 0 frees it: {tracker.release(0, 0.20)}")
+    print(f"Arduino release of lane 0 frees it: {tracker.release(0, 0.25, source='arduino')}")
+    print(f"Held: {tracker.held_lanes()}, lane 0 pressed at {tracker.press_times[0]}, "
+          f"released at {tracker.release_times[0]}")
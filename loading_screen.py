@@ -1,8 +1,8 @@
 import pygame
 import config
 import utils
-import os
 from main_menu import MainMenuScreen
+from song_pack import song_source
 
 class LoadingScreen:
     def __init__(self, surface):
@@ -13,7 +13,7 @@ class LoadingScreen:
             (config.SCREEN_WIDTH, config.SCREEN_HEIGHT)
         )
         self.loading_progress = 0
-        self.total_files = len([f for f in os.listdir(config.SONGS_DIR) if f.endswith('.json')])
+        self.total_files = len(song_source().names())
         self.menu_screen = None
 
     def load_songs(self):
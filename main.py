@@ -7,6 +7,7 @@ from main_menu import MainMenuScreen
 from settings_screen import SettingsScreen
 from loading_screen import LoadingScreen
 from arduino_handler import ArduinoHandler
+from input_manager import InputDeviceManager
 
 class GameApp:
     def __init__(self):
@@ -15,11 +16,12 @@ class GameApp:
         pygame.display.set_caption(config.GAME_NAME)
         self.clock = pygame.time.Clock()
         self.arduino = ArduinoHandler()
+        self.input_manager = InputDeviceManager.from_config()
         self.state = 'loading'
         self.loading_screen = LoadingScreen(self.screen)
         self.title_screen = TitleScreen(self.screen)
         self.menu_screen = None
-        self.game_screen = GameScreen(self.screen, self.arduino)  # Pass initial ArduinoHandler
+        self.game_screen = GameScreen(self.screen, self.arduino, self.input_manager)  # Pass initial ArduinoHandler
         self.settings_screen = SettingsScreen(self.screen, self.arduino)
 
     def run(self):
@@ -69,6 +71,11 @@ class GameApp:
                         self.state = 'title'
 
         self.arduino.close()
+        self.input_manager.close()
+        self.game_screen.audio.close()
+        self.game_screen.sounds.close()
+        if self.menu_screen is not None:
+            self.menu_screen.preview_engine.shutdown()
         pygame.quit()
 
 if __name__ == '__main__':
@@ -0,0 +1,51 @@
+# object_pool.py
+"""
+Free lists for the objects the game makes by the thousand: tiles for every song, particles
+and floating texts for every hit. Released objects are set up again through their setup()
+method instead of being rebuilt, so steady play allocates next to nothing.
+"""
+
+
+class ObjectPool:
+    """
+    Objects of one class. acquire(*args) returns a released object passed through
+    setup(*args), or a new cls(*args) when none is free; release() takes objects back.
+    """
+
+    def __init__(self, cls, limit=None):
+        self.cls = cls
+        self.limit = limit  # Most objects kept free; the rest are left to the garbage collector
+        self._free = []
+        self.stats = {'created': 0, 'reused': 0}
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, *args, **kwargs):
+        if self._free:
+            obj = self._free.pop()
+            obj.setup(*args, **kwargs)
+            self.stats['reused'] += 1
+            return obj
+        self.stats['created'] += 1
+        return self.cls(*args, **kwargs)
+
+    def release(self, obj):
+        if self.limit is None or len(self._free) < self.limit:
+            self._free.append(obj)
+
+    def release_all(self, objects):
+        for obj in objects:
+            self.release(obj)
+
+
+def release_expired(pool, items, expired):
+    """Moves the items for which expired(item) is true from the list `items` back to pool, in place."""
+    kept = 0
+    for item in items:
+        if expired(item):
+            pool.release(item)
+        else:
+            items[kept] = item
+            kept += 1
+    del items[kept:]
@@ -0,0 +1,378 @@
+# perf_suite.py
+"""
+Headless benchmarks (SDL dummy drivers) over the bundled song library: library scans,
+chart parsing and difficulty rating, song loading, an autoplayed full-song simulation and a
+fixed dense-screen render, plus parsing, simulation and drawing of the generated worst-case
+charts of stress_chart.py. Results are written as JSON so runs can be compared over time,
+and checked against a stored baseline.
+
+    python perf_suite.py                           # every scenario
+    python perf_suite.py --only parse_largest,simulate_autoplay --repeat 5
+    python perf_suite.py --save-baseline           # store this run as the baseline
+    python perf_suite.py --quick                   # library scans on 200 songs only
+
+Exits with status 1 if a scenario's median time per item is slower than the baseline by more than
+--threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+import config
+import song_parser
+import song_pack
+import song_metadata
+from song_stream import open_song
+
+SCENARIOS = {}
+
+
+def scenario(name, unit):
+    """Registers a benchmark. The function gets the Bench and returns (seconds, items) for one run."""
+    def register(function):
+        SCENARIOS[name] = (function, unit)
+        return function
+    return register
+
+
+class Bench:
+    """Shared state for scenarios: the song list and a headless GameScreen, created on first use."""
+
+    def __init__(self, library_limit=None, largest=10):
+        self.songs_dir = config.SONGS_DIR
+        names = sorted(f for f in os.listdir(self.songs_dir) if f.endswith('.json'))
+        self.library = names[:library_limit] if library_limit else names
+        self.largest = sorted(names, key=lambda f: os.path.getsize(os.path.join(self.songs_dir, f)),
+                              reverse=True)[:largest]
+        self._game = None
+        self._stress = None
+
+    def path(self, name):
+        return os.path.join(self.songs_dir, name)
+
+    @property
+    def stress(self):
+        """Source of the stress_chart presets, written to config.STRESS_DIR on first use."""
+        if self._stress is None:
+            import stress_chart
+            stress_chart.write_presets(config.STRESS_DIR)
+            self._stress = song_pack.LooseSongs(config.STRESS_DIR)
+        return self._stress
+
+    @property
+    def game(self):
+        if self._game is None:
+            from game import GameScreen
+            from input_manager import InputDeviceManager
+            self._game = GameScreen(pygame.display.get_surface(), input_manager=InputDeviceManager())
+        return self._game
+
+    def close(self):
+        if self._game is not None:
+            self._game.audio.close()
+            self._game.sounds.close()
+
+
+def _scan(bench, songs):
+    start = time.perf_counter()
+    for name in bench.library:
+        with songs.open(name) as song_data:
+            song_metadata.song_entry(name, song_data)
+    return time.perf_counter() - start, len(bench.library)
+
+
+@scenario('library_scan_cold', 'song')
+def library_scan_cold(bench):
+    """Menu entries (parse, duration, difficulty) for every song with in-process caches cleared."""
+    song_parser._beat_values.clear()
+    re.purge()
+    return _scan(bench, song_pack.LooseSongs(bench.songs_dir))
+
+
+@scenario('library_scan_warm', 'song')
+def library_scan_warm(bench):
+    """The same scan again; only the OS file cache and parser caches differ from cold."""
+    return _scan(bench, song_pack.LooseSongs(bench.songs_dir))
+
+
+@scenario('library_scan_pack', 'song')
+def library_scan_pack(bench):
+    """Menu entries from the song pack's precomputed index (skipped without a pack)."""
+    if not os.path.exists(config.SONG_PACK):
+        return None
+    start = time.perf_counter()
+    pack = song_pack.SongPack(config.SONG_PACK)
+    for name in pack.names():
+        pack.metadata(name)
+    pack.close()
+    return time.perf_counter() - start, len(pack.names())
+
+
+@scenario('parse_largest', 'chart')
+def parse_largest(bench):
+    """Tiles and accompaniment for the largest charts."""
+    start = time.perf_counter()
+    for name in bench.largest:
+        song_parser.parse_song(bench.path(name))
+    return time.perf_counter() - start, len(bench.largest)
+
+
+@scenario('difficulty_largest', 'chart')
+def difficulty_largest(bench):
+    elapsed = 0.0
+    for name in bench.largest:
+        with open_song(bench.path(name)) as song_data:
+            start = time.perf_counter()
+            song_metadata.calculate_difficulty(song_data)
+            elapsed += time.perf_counter() - start
+    return elapsed, len(bench.largest)
+
+
+@scenario('load_song', 'song')
+def load_song(bench):
+    """GameScreen.load_song on the largest charts, not counting the background sound decode."""
+    game, elapsed, names = bench.game, 0.0, bench.largest[:5]
+    for name in names:
+        start = time.perf_counter()
+        game.load_song(name)
+        elapsed += time.perf_counter() - start
+        game.sounds_ready.result()
+    return elapsed, len(names)
+
+
+def simulate_song(game, song, step=1.0 / config.FPS, max_frames=None, songs=None):
+    """
+    Autoplays a freshly loaded song (from `songs`, a song_pack source, or the library) to the
+    end (or `max_frames`) with fixed steps and no drawing. Returns (seconds spent in update, frames).
+    """
+    from game import GameState
+    game.load_song(song, songs=songs)
+    game.autoplay = True
+    game.sounds_ready.result()
+    frames, start = 0, time.perf_counter()
+    while game.game_state != GameState.FINISHED and (max_frames is None or frames < max_frames):
+        game.update(step)
+        frames += 1
+    return time.perf_counter() - start, frames
+
+
+@scenario('simulate_autoplay', 'frame')
+def simulate_autoplay(bench):
+    """The update loop over all of Bad Apple and the first five minutes of the largest chart."""
+    elapsed, frames = 0.0, 0
+    for song, max_frames in (("Bad Apple.json", None), (bench.largest[0], config.FPS * 300)):
+        seconds, count = simulate_song(bench.game, song, max_frames=max_frames)
+        elapsed, frames = elapsed + seconds, frames + count
+    return elapsed, frames
+
+
+@scenario('parse_stress', 'chart')
+def parse_stress(bench):
+    """Tiles and accompaniment for every stress_chart preset."""
+    names = sorted(bench.stress.names())
+    start = time.perf_counter()
+    for name in names:
+        song_parser.parse_song(os.path.join(config.STRESS_DIR, name))
+    return time.perf_counter() - start, len(names)
+
+
+@scenario('simulate_stress', 'frame')
+def simulate_stress(bench):
+    """The update loop over the first minute of every stress_chart preset."""
+    elapsed, frames = 0.0, 0
+    for name in sorted(bench.stress.names()):
+        seconds, count = simulate_song(bench.game, name, max_frames=config.FPS * 60, songs=bench.stress)
+        elapsed, frames = elapsed + seconds, frames + count
+    return elapsed, frames
+
+
+@scenario('render_stress', 'frame')
+def render_stress(bench, frames=300):
+    """draw() while autoplaying the held, dual and mixed presets, not counting update()."""
+    from game import GameState
+    game, step, elapsed, drawn = bench.game, 1.0 / config.FPS, 0.0, 0
+    for name in ('holds.json', 'duals.json', 'mixed.json'):
+        game.load_song(name, seed=0, songs=bench.stress)
+        game.autoplay = True
+        game.sounds_ready.result()
+        while game.game_state == GameState.COUNTDOWN:
+            game.update(step)
+        for _ in range(frames):
+            game.update(step)
+            start = time.perf_counter()
+            game.draw()
+            elapsed += time.perf_counter() - start
+        drawn += frames
+    return elapsed, drawn
+
+
+def dense_screen(game, tiles_per_lane=12):
+    """
+    Fills the screen with a fixed mix of tiles (normal, long, held, dual, missed), particles and
+    floating texts so draw() has a known, heavy workload independent of any chart.
+    """
+    from game import GameState, FloatingText
+    from tile import Tile, Particle, TileType
+    from tile_field import TileField
+    from judgement import JudgementIndex
+
+    game.reset_game_state()
+    game.game_state = GameState.PLAYING
+    game.game_time, game.tps = 10.0, 8.0
+    spacing = 1.0 / game.tps
+    tiles = []
+    for row in range(tiles_per_lane * 4):
+        # Rows 63 px apart from just above the bottom edge, so every tile is on screen
+        lane, tile_time = row % 4, game.game_time + (row // 4 - 3) * spacing * 0.35
+        kind = row % 6
+        if kind == 1:
+            tile = Tile(lane, tile_time, spacing * 3, ['c1'], TileType.LongNote, TileType.Normal)
+        elif kind == 2:
+            sub_notes = [{'notes': ['c1'], 'duration': spacing / 2, 'beat_value': 0.125, 'offset': i * spacing / 2}
+                         for i in range(6)]
+            tile = Tile(lane, tile_time, spacing * 3, ['c1'], TileType.LongNote, TileType.SpecialHold,
+                        sub_notes=sub_notes)
+            tile.on_hit('perfect', config.PERFECT_COLOR, tile_time)
+            tile.update(game.game_time, game.tps)
+            tile.update_hold(tile_time + spacing)
+        elif kind == 3 and lane < 3:
+            tile = Tile((lane, lane + 1), tile_time, spacing, ['c1', 'e1'], TileType.Normal, TileType.Dual)
+        else:
+            tile = Tile(lane, tile_time, spacing, ['c1'], TileType.Normal, TileType.Normal)
+            if kind == 4:
+                tile.miss(game.game_time - 0.1)
+        tile.update(game.game_time, game.tps)
+        tiles.append(tile)
+    for index, tile in enumerate(tiles):
+        tile.index = index
+    game.all_tiles, game.tile_field, game.next_tile = tiles, TileField(tiles), len(tiles)
+    game.judgement = JudgementIndex(tiles)
+    game.particles = [Particle(40 + (i * 37) % 400, config.STRIKE_LINE_Y - (i * 13) % 200, Tile.dot_light_img)
+                      for i in range(120)]
+    for particle in game.particles:
+        particle.lifetime = 10 ** 6  # Keep them alive however many frames are drawn
+    game.floating_texts = [FloatingText("+100", 60 + 90 * (i % 4), 300 + 20 * i, config.FONT_PATH) for i in range(8)]
+    for text in game.floating_texts:
+        text.vy, text.alpha = 0, 255
+    return tiles
+
+
+@scenario('render_dense', 'frame')
+def render_dense(bench, frames=300):
+    """draw() of a fixed dense screen (48 tiles of every type, 120 particles, 8 floating texts)."""
+    game = bench.game
+    dense_screen(game)
+    start = time.perf_counter()
+    for _ in range(frames):
+        for text in game.floating_texts:
+            text.alpha = 255
+        game.draw()
+    return time.perf_counter() - start, frames
+
+
+def run(names, repeat, bench):
+    results = {}
+    for name in names:
+        function, unit = SCENARIOS[name]
+        runs, items = [], 0
+        for _ in range(repeat):
+            outcome = function(bench)
+            if outcome is None:
+                break
+            seconds, items = outcome
+            runs.append(seconds)
+        if not runs:
+            results[name] = {'skipped': True}
+            print(f"{name:<20} skipped")
+            continue
+        median = statistics.median(runs)
+        results[name] = {'unit': unit, 'items': items, 'runs': runs, 'median': median, 'min': min(runs),
+                         'per_item_ms': median / items * 1000 if items else 0.0}
+        print(f"{name:<20} median {median * 1000:9.1f} ms  min {min(runs) * 1000:9.1f} ms  "
+              f"{results[name]['per_item_ms']:8.3f} ms/{unit} ({items} {unit}s)")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns the scenarios whose time per item is more than `threshold` slower than the baseline's."""
+    regressions = []
+    print(f"Against baseline from {baseline['meta'].get('timestamp', '?')} (commit {baseline['meta'].get('commit')}):")
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if 'median' not in result or not base or 'per_item_ms' not in base:
+            continue
+        # Per item, so runs over different song counts (--quick) still compare
+        ratio = result['per_item_ms'] / base['per_item_ms'] if base['per_item_ms'] else 1.0
+        flag = "REGRESSION" if ratio > 1 + threshold else ("faster" if ratio < 1 - threshold else "")
+        print(f"  {name:<20} {ratio:6.2f}x {flag}")
+        if ratio > 1 + threshold:
+            regressions.append(name)
+    return regressions
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'pygame': pygame.version.ver, 'platform': platform.platform(), 'processor': platform.processor()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the headless benchmarks.")
+    parser.add_argument('--only', help=f"Comma-separated scenarios (of: {', '.join(SCENARIOS)})")
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario; the median is reported")
+    parser.add_argument('--quick', action='store_true', help="Library scans on the first 200 songs only")
+    parser.add_argument('-o', '--output', help="Results file (default: a timestamped file in cache/benchmarks)")
+    parser.add_argument('--baseline', default=config.BENCHMARK_BASELINE, help="Baseline results to compare with")
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--threshold', type=float, default=0.15, help="Allowed slowdown before flagging (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    config.RECORD_REPLAYS = False
+    pygame.init()
+    pygame.display.set_mode((config.SCREEN_WIDTH, config.SCREEN_HEIGHT))
+    bench = Bench(library_limit=200 if args.quick else None)
+    try:
+        results = run(names, args.repeat, bench)
+    finally:
+        bench.close()
+
+    report = {'meta': dict(metadata(), repeat=args.repeat, quick=args.quick), 'results': results}
+    output = args.output or os.path.join(config.BENCHMARK_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    for path in [output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        print(f"Results written to {path}")
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"Slower than the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,209 @@
+# replay.py
+"""
+Replays: the lane presses and releases of a play session (and any practice controls used)
+stamped with song time, plus the seed that laid out the lanes. GameScreen records one for
+every session; loading it back re-simulates the session exactly, in a window at any speed
+or headless as fast as the update loop runs.
+
+Layout (little endian):
+    8 bytes   magic b'PTSRPLY1'
+    u32       header length in bytes
+    header    UTF-8 JSON: {'song', 'seed', 'rate', 'autoplay', 'sources', 'recorded', 'result'}
+    events    zlib-compressed records of u16 loop pass, f64 song time, u8 code, u8 lane, f64 value
+
+    python replay.py replays/Bad_Apple-20261019-201500.replay           # verify headless
+    python replay.py replays/Bad_Apple-20261019-201500.replay --watch --speed 4
+    python replay.py replays/Bad_Apple-20261019-201500.replay --step 0.1 --repeat 5 --profile
+"""
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+
+import pygame
+import config
+
+MAGIC = b'PTSRPLY1'
+_HEADER = struct.Struct('<8sI')
+_RECORD = struct.Struct('<HdBBd')
+
+# Event codes. Lane events carry the index of their input source in 'sources' as value.
+PRESS, RELEASE, RATE, AUTOPLAY, LOOP_START, LOOP_END, LOOP_OFF = range(1, 8)
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Replay:
+    """A recorded session: header dict plus (loop pass, song time, code, lane, value) events."""
+
+    def __init__(self, header, events):
+        self.header = header
+        self.events = events
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        header = json.dumps(self.header, separators=(',', ':')).encode('utf-8')
+        records = b''.join(_RECORD.pack(*event) for event in self.events)
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            f.write(zlib.compress(records, 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < _HEADER.size:
+            raise ReplayError(f"{path}: truncated header")
+        magic, header_length = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ReplayError(f"{path}: not a replay")
+        try:
+            header = json.loads(data[_HEADER.size:_HEADER.size + header_length])
+            records = zlib.decompress(data[_HEADER.size + header_length:])
+        except (ValueError, zlib.error) as e:
+            raise ReplayError(f"{path}: {e}") from e
+        return cls(header, [event for event in _RECORD.iter_unpack(records)])
+
+
+class ReplayRecorder:
+    """Collects the events of a session as GameScreen applies them."""
+
+    def __init__(self, song, seed, rate, autoplay):
+        self.header = {'song': song, 'seed': seed, 'rate': rate, 'autoplay': autoplay, 'sources': [],
+                       'recorded': time.strftime('%Y-%m-%d %H:%M:%S')}
+        self.events = []
+
+    def record(self, loop_pass, song_time, code, lane=0, value=0.0):
+        self.events.append((loop_pass, song_time, code, lane, value))
+
+    def source_index(self, source):
+        sources = self.header['sources']
+        if source not in sources:
+            sources.append(source)
+        return sources.index(source)
+
+    def finish(self, result):
+        """The Replay so far, with the session's `result` (score, combo, ...) to check against."""
+        return Replay(dict(self.header, result=result), list(self.events))
+
+    def default_path(self):
+        stem = os.path.splitext(self.header['song'])[0].replace(' ', '_')
+        return os.path.join(config.REPLAY_DIR, f"{stem}-{time.strftime('%Y%m%d-%H%M%S')}.replay")
+
+
+class ReplayPlayer:
+    """Hands a replay's events back to GameScreen as song time reaches them."""
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.sources = replay.header['sources']
+        self._next = 0
+
+    def due(self, loop_pass, song_time):
+        """Events up to `song_time` in the given loop pass (and any left over from earlier passes)."""
+        events = self.replay.events
+        while self._next < len(events):
+            event = events[self._next]
+            if event[0] > loop_pass or (event[0] == loop_pass and event[1] > song_time):
+                break
+            self._next += 1
+            yield event
+
+    def done(self):
+        return self._next >= len(self.replay.events)
+
+
+def simulate(replay, step=1.0 / config.FPS, game=None):
+    """
+    Re-simulates a replay headless with fixed steps of `step` seconds, without drawing.
+    Returns the outcome and timings; pass `game` to reuse a GameScreen between runs.
+    """
+    from game import GameScreen, GameState
+    from input_manager import InputDeviceManager
+
+    if game is None:
+        game = GameScreen(pygame.display.get_surface(), input_manager=InputDeviceManager())
+    start = time.perf_counter()
+    game.load_replay(replay)
+    load_seconds = time.perf_counter() - start
+
+    # A session left early stops where it was left, so no tile passes that never did
+    ended_at = None if replay.header['result'].get('finished') else replay.header['result'].get('ended_at')
+    frames, start = 0, time.perf_counter()
+    while game.game_state != GameState.FINISHED:
+        dt = step
+        if ended_at and game.game_state == GameState.PLAYING and game.loop_pass == ended_at[0]:
+            remaining = (ended_at[1] - game.game_time) / game.playback_rate
+            if remaining <= 1e-9:
+                break
+            dt = min(step, remaining)
+        game.profiler.begin_frame()
+        game.update(dt)
+        game.profiler.end_frame(dt)
+        frames += 1
+    update_seconds = time.perf_counter() - start
+    return {'result': game.session_result(), 'frames': frames, 'load_seconds': load_seconds,
+            'update_seconds': update_seconds,
+            'frames_per_second': frames / update_seconds if update_seconds > 0 else 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-simulate a recorded play session.")
+    parser.add_argument('replay', help="Replay file to load")
+    parser.add_argument('--watch', action='store_true', help="Show the replay in a window instead of running headless")
+    parser.add_argument('--speed', type=float, default=1.0, help="Playback speed when watching")
+    parser.add_argument('--step', type=float, default=1.0 / config.FPS, help="Simulation step in seconds (headless)")
+    parser.add_argument('--repeat', type=int, default=1, help="Headless runs, for benchmarking the update loop")
+    parser.add_argument('--profile', action='store_true', help="Time the update loop's sections and export them")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    header = replay.header
+    print(f"{header['song']}: {len(replay.events)} events recorded {header['recorded']}, "
+          f"seed {header['seed']}, rate {header['rate']:.0%}")
+
+    if args.watch:
+        pygame.init()
+        screen = pygame.display.set_mode((config.SCREEN_WIDTH, config.SCREEN_HEIGHT))
+        pygame.display.set_caption(f"Replay: {header['song']}")
+        from game import GameScreen
+        game = GameScreen(screen)
+        game.load_replay(replay)
+        game.run(pygame.time.Clock(), speed=args.speed)
+        print(f"Replayed: {game.session_result()}")
+        pygame.quit()
+        return 0
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    pygame.init()
+    screen = pygame.display.set_mode((config.SCREEN_WIDTH, config.SCREEN_HEIGHT))
+    from game import GameScreen
+    from input_manager import InputDeviceManager
+    game, outcome = GameScreen(screen, input_manager=InputDeviceManager()), None
+    if args.profile:
+        game.profiler.enable()
+    for run in range(args.repeat):
+        outcome = simulate(replay, args.step, game)
+        print(f"Run {run + 1}: {outcome['frames']} frames in {outcome['update_seconds']:.2f}s "
+              f"({outcome['frames_per_second']:.0f} updates/s), song loaded in {outcome['load_seconds']:.2f}s")
+    if args.profile:
+        game.profiler.disable()
+        game.profiler.export(label=f"replay-{header['song']}")
+    recorded = {key: header['result'].get(key) for key in ('score', 'combo', 'stars')}
+    replayed = {key: outcome['result'].get(key) for key in recorded}
+    print(f"Recorded: {recorded}")
+    print(f"Replayed: {replayed}")
+    if replayed != recorded:
+        print("MISMATCH: the re-simulation does not reproduce the recorded result")
+        return 1
+    print("Replay reproduces the recorded result")
+    return 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
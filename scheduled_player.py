@@ -0,0 +1,98 @@
+# scheduled_player.py
+import threading
+import time
+
+
+class ScheduledPlayer:
+    """
+    Plays a list of (time, note) events without busy-polling. Between events the player
+    sleeps until whichever comes first: the next due note or the next progress update.
+    Notes due within `batch_window` of each other are played together, and progress is
+    reported at most `progress_rate` times per second.
+
+    It has no GUI or audio dependencies: `play_notes` receives each batch of note names,
+    `on_progress` gets (current time, total duration), and `is_busy` (optional) keeps the
+    player alive after the last note until the sound has finished ringing.
+    The clock and wait functions can be replaced to drive it deterministically in tests.
+    """
+
+    def __init__(self, scheduled_notes, play_notes, on_progress=None, is_busy=None,
+                 progress_rate=30, batch_window=0.001, clock=time.monotonic, wait=None):
+        self.scheduled_notes = sorted(scheduled_notes, key=lambda x: x[0])
+        self.play_notes = play_notes
+        self.on_progress = on_progress
+        self.is_busy = is_busy
+        self.progress_interval = 1.0 / progress_rate
+        self.batch_window = batch_window
+        self.clock = clock
+        self._stop_event = threading.Event()
+        self.wait = wait if wait else self._stop_event.wait
+        self.total_duration = self.scheduled_notes[-1][0] if self.scheduled_notes else 0
+        self.wakeups = 0
+
+    @property
+    def stopped(self):
+        return self._stop_event.is_set()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        """Blocks until every note has played (and stopped ringing) or stop() is called."""
+        notes = self.scheduled_notes
+        start_time = self.clock()
+        note_index = 0
+        next_progress = 0.0
+
+        while note_index < len(notes) and not self.stopped:
+            current_time = self.clock() - start_time
+
+            if notes[note_index][0] <= current_time + self.batch_window:
+                batch = []
+                while note_index < len(notes) and notes[note_index][0] <= current_time + self.batch_window:
+                    batch.append(notes[note_index][1])
+                    note_index += 1
+                self.play_notes(batch)
+
+            if self.on_progress and current_time >= next_progress:
+                self.on_progress(current_time, self.total_duration)
+                next_progress = current_time + self.progress_interval
+
+            if note_index < len(notes):
+                wake_at = notes[note_index][0]
+                if self.on_progress:
+                    wake_at = min(wake_at, next_progress)
+                delay = wake_at - (self.clock() - start_time)
+                if delay > 0:
+                    self.wakeups += 1
+                    self.wait(delay)
+
+        while self.is_busy and self.is_busy() and not self.stopped:
+            if self.on_progress:
+                self.on_progress(self.clock() - start_time, self.total_duration)
+            self.wakeups += 1
+            self.wait(self.progress_interval)
+
+        return not self.stopped
+
+
+if __name__ == '__main__':
+    # Headless run with a simulated clock: no sleeping, no audio.
+    class FakeClock:
+        def __init__(self):
+            self.now = 0.0
+
+        def __call__(self):
+            return self.now
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    clock = FakeClock()
+    played, progress = [], []
+    notes = [(0.0, 'c1'), (0.0, 'e1'), (0.5, 'g1'), (0.5004, 'c2'), (2.0, 'e2')]
+    player = ScheduledPlayer(notes, lambda batch: played.append((clock.now, batch)),
+                             on_progress=lambda t, total: progress.append(t), clock=clock, wait=clock.advance)
+    player.run()
+    print(f"Played batches: {played}")
+    print(f"{len(progress)} progress updates, {player.wakeups} wakeups for {player.total_duration}s of notes")
@@ -0,0 +1,51 @@
+# song_library.py
+from song_search import SongSearchIndex
+
+# Sortable song fields and how to build their sort key
+SORT_KEYS = {
+    'display_name': lambda song: song['display_name'],
+    'difficulty': lambda song: song['difficulty'],
+    'bpm': lambda song: song['bpm'],
+    'duration': lambda song: song['duration'],
+    'parts': lambda song: song['parts'],
+}
+
+
+class SongLibrary:
+    """
+    The loaded song list plus everything needed to present it: a search index and a
+    precomputed permutation for every sortable key in both directions. Changing the sort
+    order is a lookup, and a search result is read off the precomputed order as the
+    list is scrolled instead of being re-sorted.
+    """
+
+    def __init__(self, songs):
+        self.songs = list(songs)  # Load order; song['id'] indexes into this list
+        for song_id, song in enumerate(self.songs):
+            song['id'] = song_id
+
+        self.orders = {}
+        self._views = {}
+        for key, key_func in SORT_KEYS.items():
+            order = sorted(range(len(self.songs)), key=lambda i: key_func(self.songs[i]))
+            # Descending is the ascending order read backwards, which the search index relies on
+            for reverse, view_order in ((False, order), (True, order[::-1])):
+                self.orders[(key, reverse)] = view_order
+                self._views[(key, reverse)] = [self.songs[i] for i in view_order]
+        self.search_index = SongSearchIndex(self.songs, {key: self.orders[(key, False)] for key in SORT_KEYS})
+
+    def __len__(self):
+        return len(self.songs)
+
+    def sorted_songs(self, sort_key, reverse=False):
+        """All songs in the given order. The returned list is shared; don't modify it."""
+        return self._views[(sort_key, reverse)]
+
+    def query(self, search_text, sort_key, reverse=False):
+        """
+        Songs matching search_text, exact matches in the given order followed by fuzzy ones,
+        as a lazily ordered SearchResults sequence.
+        """
+        if not search_text.strip():
+            return self.sorted_songs(sort_key, reverse)
+        return self.search_index.search(search_text, sort_key, reverse, self.songs)
@@ -0,0 +1,211 @@
+# song_metadata.py
+"""
+What the song list shows about a song (tempo, length, difficulty), computed from its data
+without any UI. Shared by the menu, the song pack builder, the validator and the
+benchmarks.
+"""
+from song_parser import iter_track_events
+
+
+def song_entry(filename, song_data):
+    """The song list entry (name, tempo, length, difficulty) for a song's data."""
+    difficulty, duration = _rate_song(song_data)
+    return {
+        'filename': filename,
+        'display_name': filename[:-5].replace('_', ' '),
+        'bpm': float(song_data.get('baseBpm', 120)),
+        'duration': duration,
+        'parts': len(song_data.get('musics', [])),
+        'difficulty': difficulty,
+        'difficulty_class': difficulty_class(difficulty),
+        'difficulty_color': difficulty_color(difficulty)
+    }
+
+
+class _TileRating:
+    """Tile values of one part so far, and what the previous tiles were."""
+
+    def __init__(self, base_beats):
+        self.base_beats = base_beats
+        self.values = []
+        self.prev_value = 0
+        self.prev_was_double = False
+        self.prev_was_sliding = False
+
+    def add(self, value, double=False, sliding=False):
+        self.values.append(value)
+        self.prev_was_double = double
+        self.prev_was_sliding = sliding
+
+
+def _rate_double(rating, event):
+    value = 4 if not rating.prev_was_double else rating.prev_value + 0.2
+    if rating.prev_value > 4 and not rating.prev_was_double:
+        value = rating.prev_value + 0.2
+    rating.add(min(value, 8), double=True)
+
+
+def _rate_long(rating, event):
+    for sub_note in event['sub_notes']:
+        beat_value = sub_note['beat_value']
+        value = 1 if beat_value <= rating.base_beats else 1 / ((beat_value - 1) ** 2) if beat_value > 1 else 1
+        if rating.prev_was_double:
+            value *= 3
+        if rating.prev_was_sliding:
+            value *= 2
+        rating.values.append(min(value, 8))
+    rating.prev_was_double = rating.prev_was_sliding = False
+
+
+def _rate_sliding(rating, event):
+    rating.values.append(2.5)  # First sliding tile
+    rating.values.extend(0 for _ in event['sub_notes'][1:])  # Subsequent sliding tiles
+    rating.prev_was_double, rating.prev_was_sliding = False, True
+
+
+# How each special tile kind adds to the rating. Kinds missing here add no tile values
+# (song_validator warns about them).
+SPECIAL_TILE_RATINGS = {
+    5: _rate_double,
+    6: _rate_long,
+    7: _rate_sliding,
+    8: _rate_sliding,
+}
+
+
+def _rate_note(rating, event):
+    beat_value = event['beat_value']
+    value = 1 if beat_value < rating.base_beats else 1 / ((beat_value - 1) ** 2) if beat_value > 1 else 1
+    if rating.prev_was_double:
+        value = rating.prev_value + 0.2
+    if rating.prev_was_sliding:
+        value *= 2
+    rating.add(min(value, 8))
+
+
+def _rate_space(rating, event):
+    beat_value = event['beat_value']
+    if beat_value == 1:
+        rating.add(0.5)
+    elif beat_value == 2:
+        rating.add(0.125)
+    elif beat_value == 3:
+        rating.add(0.055555)
+    else:  # 4 or more
+        rating.add(0.03125)
+
+
+def calculate_difficulty(song_data):
+    """Calculate song difficulty based on tile values and sequences."""
+    total_difficulty, _ = _rate_song(song_data)
+    return {
+        'value': total_difficulty,
+        'class': difficulty_class(total_difficulty),
+        'color': difficulty_color(total_difficulty)
+    }
+
+
+def _rate_song(song_data):
+    """
+    Returns (difficulty, duration in seconds) of a song from one pass over its events. Scores
+    are tokenized in place (see song_parser.iter_track_events), never decoded into strings.
+    A part lasts as long as its longest track.
+    """
+    base_bpm = float(song_data.get('baseBpm', 120))
+    difficulty_values = []
+    total_duration = 0.0
+    for part in song_data.get('musics', []):
+        bpm = float(part.get('bpm', base_bpm))
+        base_beats = float(part.get('baseBeats', 0.25))
+        tps = (bpm / base_beats) / 60.0
+        scores = part.get('scores', [])
+        if not scores:
+            continue
+
+        # Rate tiles
+        rating = _TileRating(base_beats)
+        part_duration = 0.0
+        for track_index in range(len(scores)):
+            track_duration = 0.0
+            for event in iter_track_events(scores, track_index, bpm):
+                track_duration += event['duration']
+                kind = event['kind']
+                if kind == 'special':
+                    rate = SPECIAL_TILE_RATINGS.get(event['tile_kind'])
+                    if rate is not None:
+                        rate(rating, event)
+                    continue
+                if kind in ('note', 'chord'):
+                    _rate_note(rating, event)
+                elif kind == 'space':
+                    _rate_space(rating, event)
+                rating.prev_value = rating.values[-1] if rating.values else 0
+            part_duration = max(part_duration, track_duration)
+        total_duration += part_duration
+        tile_values = rating.values
+
+        # Calculate sequences
+        tps4 = tps ** 4
+        sequence_values = []
+        for i in range(len(tile_values)):
+            sequence_sum = sum(tile_values[i:i + 10])
+            sequence_values.append(sequence_sum * tps4)
+
+        # Calculate difficulty
+        A = sum(value * tps4 for value in tile_values)
+        B = max(sequence_values) if sequence_values else 0
+        difficulty = (A / 20) + B
+
+        difficulty_values.append(difficulty)
+
+    return (max(difficulty_values) if difficulty_values else 0), total_duration
+
+
+def difficulty_class(difficulty):
+    """Return difficulty class based on value."""
+    if difficulty < 4000:
+        return "Baby Level"
+    elif difficulty < 8000:
+        return "Extremely Simple"
+    elif difficulty < 12000:
+        return "Very Simple"
+    elif difficulty < 18000:
+        return "Simple"
+    elif difficulty < 25000:
+        return "Moderately Simple"
+    elif difficulty < 35000:
+        return "Moderate"
+    elif difficulty < 50000:
+        return "Moderately Difficult"
+    elif difficulty < 75000:
+        return "Considerably Difficult"
+    elif difficulty < 100000:
+        return "Difficult"
+    elif difficulty < 150000:
+        return "Very Difficult"
+    elif difficulty < 200000:
+        return "Extremely Difficult"
+    elif difficulty < 300000:
+        return "Insanely Difficult"
+    elif difficulty < 500000:
+        return "Alien Level"
+    else:
+        return "Quite Impossible"
+
+
+def difficulty_color(difficulty):
+    """Return color based on difficulty value."""
+    if difficulty < 4000:
+        return (0, 255, 0)  # Green
+    elif difficulty < 12000:
+        return (0, 200, 200)  # Cyan
+    elif difficulty < 25000:
+        return (0, 0, 255)  # Blue
+    elif difficulty < 50000:
+        return (255, 255, 0)  # Yellow
+    elif difficulty < 100000:
+        return (255, 165, 0)  # Orange
+    elif difficulty < 200000:
+        return (255, 0, 0)  # Red
+    else:
+        return (128, 0, 128)  # Purple
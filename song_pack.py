@@ -0,0 +1,226 @@
+# song_pack.py
+"""
+Song packs: the whole song library in one file, so startup maps a single file instead of
+opening ~1,900 JSON files.
+
+Layout (little endian):
+    8 bytes   magic b'PTSPACK1'
+    u32       flags (bit 0: payloads are zlib-compressed)
+    u32       index length in bytes
+    index     UTF-8 JSON: {'songs': [{'name', 'offset', 'length', 'crc', 'source', 'meta'},
+              ...]} where offsets are relative to the end of the index, 'source' is the
+              LooseSongs.signature of the file the chart was packed from and 'meta' holds
+              the song list entry (tempo, length, difficulty, ...) precomputed
+    payloads  the chart JSON of every song, back to back
+
+The pack is memory-mapped. Uncompressed charts are parsed in place by song_stream;
+compressed ones are inflated on open.
+
+    python song_pack.py [songs_dir] [-o assets/songs.pack] [--compress]
+    python song_pack.py --info assets/songs.pack
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+
+import config
+import song_metadata
+from song_stream import SongReader, open_song
+
+MAGIC = b'PTSPACK1'
+FLAG_COMPRESSED = 1
+_HEADER = struct.Struct('<8sII')
+
+
+class SongPackError(Exception):
+    pass
+
+
+class LooseSongs:
+    """Songs as individual JSON files in a directory."""
+
+    def __init__(self, songs_dir=config.SONGS_DIR):
+        self.songs_dir = songs_dir
+        self._names = None
+
+    def names(self):
+        if self._names is None:
+            self._names = [f for f in os.listdir(self.songs_dir) if f.endswith('.json')]
+        return self._names
+
+    def metadata(self, name):
+        """Loose files carry no precomputed song list entry."""
+        return None
+
+    def open(self, name):
+        """`with source.open(name) as song_data:` reads one song (see song_stream)."""
+        return open_song(os.path.join(self.songs_dir, name))
+
+    def signature(self, name):
+        """Changes whenever the song's contents may have changed."""
+        stat = os.stat(os.path.join(self.songs_dir, name))
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def close(self):
+        pass
+
+
+class SongPack:
+    """Read access to a song pack file over a memory map."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if len(self.buffer) < _HEADER.size:
+                raise SongPackError(f"{path}: truncated header")
+            magic, self.flags, index_length = _HEADER.unpack_from(self.buffer, 0)
+            if magic != MAGIC:
+                raise SongPackError(f"{path}: not a song pack")
+            index = json.loads(self.buffer[_HEADER.size:_HEADER.size + index_length])
+        except (ValueError, OSError) as e:
+            self._file.close()
+            raise SongPackError(f"{path}: {e}") from e
+        except SongPackError:
+            self._file.close()
+            raise
+        self.payload_start = _HEADER.size + index_length
+        self.entries = {entry['name']: entry for entry in index['songs']}
+        self._names = [entry['name'] for entry in index['songs']]
+
+    def names(self):
+        return self._names
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def metadata(self, name):
+        """The precomputed song list entry, as song_metadata.song_entry returns it."""
+        song = dict(self.entries[name]['meta'], filename=name)
+        song['difficulty_color'] = tuple(song['difficulty_color'])
+        return song
+
+    def open(self, name):
+        entry = self.entries[name]
+        start = self.payload_start + entry['offset']
+        end = start + entry['length']
+        if self.flags & FLAG_COMPRESSED:
+            return SongReader(zlib.decompress(self.buffer[start:end]), name=name)
+        return SongReader(self.buffer, start, end, name=name)
+
+    def signature(self, name):
+        entry = self.entries[name]
+        return f"pack:{entry['crc']:08x}:{entry['length']}"
+
+    def is_current(self, loose):
+        """
+        True if the pack holds exactly the songs of `loose` (a LooseSongs), each packed from
+        the file as it is now. Charts edited in place change their signature even though
+        the directory itself does not.
+        """
+        names = loose.names()
+        if len(names) != len(self.entries):
+            return False
+        try:
+            return all(name in self.entries and self.entries[name].get('source') == loose.signature(name)
+                       for name in names)
+        except OSError:
+            return False
+
+    def close(self):
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+
+def build_pack(songs_dir, pack_path, compress=False, progress=None):
+    """Writes a pack of every JSON song in songs_dir. Returns the number of songs packed."""
+    loose = LooseSongs(songs_dir)
+    names = sorted(loose.names())
+    entries, payloads, offset = [], [], 0
+    for i, name in enumerate(names, 1):
+        path = os.path.join(songs_dir, name)
+        source = loose.signature(name)
+        with open(path, 'rb') as f:
+            raw = f.read()
+        with open_song(path) as song_data:
+            meta = song_metadata.song_entry(name, song_data)
+        del meta['filename']
+        payload = zlib.compress(raw, 9) if compress else raw
+        entries.append({'name': name, 'offset': offset, 'length': len(payload), 'crc': zlib.crc32(raw),
+                        'source': source, 'meta': meta})
+        payloads.append(payload)
+        offset += len(payload)
+        if progress:
+            progress(i, len(names), name)
+
+    index = json.dumps({'songs': entries}, separators=(',', ':')).encode('utf-8')
+    temp_path = pack_path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, FLAG_COMPRESSED if compress else 0, len(index)))
+        f.write(index)
+        for payload in payloads:
+            f.write(payload)
+    os.replace(temp_path, pack_path)
+    return len(names)
+
+
+_source = None
+
+
+def song_source(pack_path=config.SONG_PACK, songs_dir=config.SONGS_DIR):
+    """
+    The song library shared by the loading screen, menu and game: the song pack if there
+    is an up-to-date one, otherwise the loose JSON files.
+    """
+    global _source
+    if _source is None:
+        loose = LooseSongs(songs_dir)
+        if os.path.exists(pack_path):
+            try:
+                pack = SongPack(pack_path)
+                if os.path.isdir(songs_dir) and not pack.is_current(loose):
+                    print(f"Song pack is out of date with {songs_dir}; using the JSON files. "
+                          f"Rebuild it with: python song_pack.py")
+                    pack.close()
+                else:
+                    _source = pack
+            except SongPackError as e:
+                print(f"Could not open song pack ({e}). Using the JSON files.")
+        if _source is None:
+            _source = loose
+    return _source
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a song pack from a directory of song JSON files.")
+    parser.add_argument('songs_dir', nargs='?', default=config.SONGS_DIR, help="Directory of song JSON files")
+    parser.add_argument('-o', '--output', default=config.SONG_PACK, help="Pack file to write")
+    parser.add_argument('--compress', action='store_true', help="zlib-compress charts (smaller, no in-place reads)")
+    parser.add_argument('--info', metavar='PACK', help="Describe an existing pack instead of building one")
+    args = parser.parse_args()
+
+    if args.info:
+        pack = SongPack(args.info)
+        payload = sum(entry['length'] for entry in pack.entries.values())
+        print(f"{args.info}: {len(pack.names())} songs, {payload / 1024 / 1024:.1f} MB of charts"
+              f"{' (compressed)' if pack.flags & FLAG_COMPRESSED else ''}, index {pack.payload_start} bytes")
+        pack.close()
+        return
+
+    start = time.perf_counter()
+    count = build_pack(args.songs_dir, args.output, args.compress,
+                       progress=lambda i, total, name: print(f"\r[{i}/{total}]", end='', flush=True))
+    print(f"\nPacked {count} songs into {args.output} ({os.path.getsize(args.output) / 1024 / 1024:.1f} MB) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
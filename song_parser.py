@@ -1,105 +1,240 @@
-import json
+import random
 import re
-import os
+from array import array
 from tile import Tile, TileType
+from song_stream import open_song
 import config
 
 
-def _parse_duration(duration_str, bpm):
-    """Calculates duration in absolute seconds based on beat value and BPM."""
-    total_beats = sum(config.BEAT_MAP.get(char, 0) for char in duration_str)
-    if bpm > 0:
-        return total_beats * (60.0 / bpm)
-    return 0
+EVENT_PATTERN = re.compile(
+    r"\s*(\d<[^>]+>)|"
+    r"\s*(\(([^)]+)\)\[([A-P]+)\])|"
+    r"\s*([a-zA-Z#\-1-5\.]+\s*\[[A-P]+\])|"
+    r"\s*([Q-Y]+)"
+)
+NOTE_PATTERN = re.compile(r"([a-zA-Z#\-1-5\.]+)\s*\[([A-P]+)\]")
+SPACE_PATTERN = re.compile(r"([Q-Y]+)")
+SEPARATOR_PATTERN = re.compile(r"[,;]")
+_WHITESPACE_PATTERN = re.compile(r"\s*")
+_EVENT_GAP_PATTERN = re.compile(r"[ ,;]*")
 
+# The same patterns over bytes, to tokenize scores in place in a song file buffer
+_STR_PATTERNS = (EVENT_PATTERN, NOTE_PATTERN, SPACE_PATTERN, SEPARATOR_PATTERN,
+                 _WHITESPACE_PATTERN, _EVENT_GAP_PATTERN)
+_BYTES_PATTERNS = tuple(re.compile(p.pattern.encode('ascii')) for p in _STR_PATTERNS)
 
-def _parse_space(space_str, bpm):
-    """Calculates space duration in absolute seconds based on beat value and BPM."""
-    total_beats = sum(config.SPACE_MAP.get(char, 0) for char in space_str)
-    if bpm > 0:
-        return total_beats * (60.0 / bpm)
-    return 0
+
+_beat_values = {}  # Duration or space token (str or bytes) -> beats
+
+
+def _beats(token, beat_map):
+    beats = _beat_values.get(token)
+    if beats is None:
+        text = token if isinstance(token, str) else token.decode('ascii')
+        beats = _beat_values[token] = sum(beat_map.get(char, 0) for char in text)
+    return beats
+
+
+def _pitch_map():
+    """Note name -> pitch number, from A-3 (21) up to c5."""
+    notes, note_map, val = "a,#a,b,c,#c,d,#d,e,f,#f,g,#g".split(','), {}, 21
+    for oct in range(-3, 6):
+        for note in notes:
+            if oct < 0 and note in "c,#c,d,#d,e,f,#f,g,#g": continue
+            if oct == 5 and note not in "c": continue
+            name = note[0].upper() + note[1:] if oct < 0 else note
+            oct_str = str(abs(oct)) if oct != 0 else ""
+            if oct < 0:
+                name += "-" + oct_str
+            elif oct > 0:
+                name += oct_str
+            note_map[name] = val
+            val += 1
+    return note_map
+
+
+PITCHES = _pitch_map()
+_pitch_values = {}  # Note name -> pitch number, with '.' dropped and unknown notes as c1
+
+
+def pitch_value(note):
+    pitch = _pitch_values.get(note)
+    if pitch is None:
+        pitch = _pitch_values[note] = PITCHES.get(note.replace('.', ''), PITCHES['c1'])
+    return pitch
+
+
+def iter_score_events(score, bpm, start=0, end=None):
+    """
+    Tokenizes one score string into events, without building any tiles. `score` may also
+    be a bytes-like buffer (e.g. a memory-mapped song file) with the score between `start`
+    and `end`; it is read in place. Yields dicts with 'kind' ('special', 'chord', 'note',
+    'space' or 'unparsed'), 'time' and 'duration' in seconds from the start of the score,
+    'beat_value' for notes and spaces, and 'notes' for note events. Special tiles also carry 'tile_kind',
+    'sub_notes' (dicts with 'notes', 'duration' and 'beat_value', plus 'offset' from the
+    start of the tile) and 'unparsed' (sub-events that were skipped).
+    """
+    is_text = isinstance(score, str)
+    event_pattern, note_pattern, space_pattern, separator_pattern, whitespace, event_gap = \
+        _STR_PATTERNS if is_text else _BYTES_PATTERNS
+    text = (lambda value: value) if is_text else (lambda value: value.decode('utf-8'))
+    seconds_per_beat = 60.0 / bpm if bpm > 0 else 0
+    end = len(score) if end is None else end
+    while end > start and score[end - 1:end].isspace():
+        end -= 1
+    pos = whitespace.match(score, start, end).end()
+
+    current_time = 0.0
+    while pos < end:
+        match = event_pattern.match(score, pos, end)
+        if not match:
+            next_sep = separator_pattern.search(score, pos, end)
+            fragment = score[pos:next_sep.start() if next_sep else end]
+            yield {'kind': 'unparsed', 'time': current_time, 'duration': 0.0, 'text': text(fragment)}
+            pos = whitespace.match(score, next_sep.end(), end).end() if next_sep else end
+            continue
+
+        if match.group(1):  # Special Tile
+            content = match.group(1)
+            sub_notes, unparsed, sub_note_time = [], [], 0.0
+            for sub_event_str in content[2:-1].split(b',' if not is_text else ','):
+                sub_event = sub_event_str.strip()
+                note_match = note_pattern.match(sub_event)
+                space_match = space_pattern.match(sub_event)
+                duration = 0
+                if note_match:
+                    beat_value = _beats(note_match.group(2), config.BEAT_MAP)
+                    duration = beat_value * seconds_per_beat
+                    sub_notes.append({'notes': text(note_match.group(1)).split('.'), 'duration': duration,
+                                      'beat_value': beat_value, 'offset': sub_note_time})
+                elif space_match:
+                    duration = _beats(space_match.group(1), config.SPACE_MAP) * seconds_per_beat
+                elif sub_event:
+                    unparsed.append(text(sub_event))
+                sub_note_time += duration
+            yield {'kind': 'special', 'time': current_time, 'duration': sub_note_time,
+                   'tile_kind': int(content[:1]), 'sub_notes': sub_notes, 'unparsed': unparsed,
+                   'notes': [note for sn in sub_notes for note in sn['notes']]}
+            current_time += sub_note_time
+        else:  # Normal Notes, Chords, Spaces
+            if match.group(2):  # Chord
+                kind, notes, duration_str = 'chord', text(match.group(3)).split('.'), match.group(4)
+            elif match.group(5):  # Note
+                note_match = note_pattern.match(match.group(5).strip())
+                kind, notes, duration_str = 'note', [text(note_match.group(1))], note_match.group(2)
+            else:  # Space
+                beat_value = _beats(match.group(6), config.SPACE_MAP)
+                duration = beat_value * seconds_per_beat
+                yield {'kind': 'space', 'time': current_time, 'duration': duration, 'beat_value': beat_value}
+                current_time += duration
+                pos = event_gap.match(score, match.end(), end).end()
+                continue
+            beat_value = _beats(duration_str, config.BEAT_MAP)
+            duration = beat_value * seconds_per_beat
+            yield {'kind': kind, 'time': current_time, 'duration': duration, 'notes': notes,
+                   'beat_value': beat_value}
+            current_time += duration
+        pos = event_gap.match(score, match.end(), end).end()
+
+
+def iter_track_events(scores, track_index, bpm):
+    """
+    Events of one score of a part. `scores` is a list of strings or a song_stream.ScoreList,
+    whose scores are tokenized straight from the file buffer.
+    """
+    if hasattr(scores, 'source'):
+        buffer, start, end = scores.source(track_index)
+        return iter_score_events(buffer, bpm, start, end)
+    return iter_score_events(scores[track_index], bpm)
+
+
+def parse_note_tracks(song_data):
+    """
+    Flattens loaded song JSON into timed notes per part and track, with no tiles involved.
+    Returns a list of parts in file order, each with 'id', 'bpm', 'baseBeats', 'duration',
+    'tracks' (lists of (time, note) sorted by time, times relative to the part start) and
+    'event_times' (start time of every event in the first track, used by auditions).
+    """
+    base_bpm = float(song_data.get('baseBpm', 120))
+    parts = []
+    for part in song_data.get('musics', []):
+        bpm = float(part.get('bpm', base_bpm))
+        tracks, event_times, part_duration = [], [], 0.0
+        scores = part.get('scores', [])
+        for track_index in range(len(scores)):
+            track_notes, end_time = [], 0.0
+            for event in iter_track_events(scores, track_index, bpm):
+                if track_index == 0 and event['kind'] != 'unparsed':
+                    event_times.append(event['time'])
+                if event['kind'] == 'special':
+                    for sub_note in event['sub_notes']:
+                        track_notes.extend((event['time'] + sub_note['offset'], note) for note in sub_note['notes'])
+                elif event['kind'] in ('chord', 'note'):
+                    track_notes.extend((event['time'], note) for note in event['notes'])
+                end_time = event['time'] + event['duration']
+            track_notes.sort(key=lambda n: n[0])
+            tracks.append(track_notes)
+            part_duration = max(part_duration, end_time)
+        parts.append({'id': part.get('id'), 'bpm': bpm, 'baseBeats': float(part.get('baseBeats', 0.25)),
+                      'duration': part_duration, 'tracks': tracks, 'event_times': event_times})
+    return parts
 
 
 def parse_song(file_path):
     """
     Loads and parses a song's JSON file. It finds the first track with actual notes
     to use for playable tiles and keeps all other non-empty tracks for accompaniment.
+    The file is read incrementally and each score is tokenized in place (see song_stream).
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        song_data = json.load(f)
+    with open_song(file_path) as song_data:
+        return parse_song_data(song_data)
+
 
+def parse_song_data(song_data, tile_pool=None):
+    """
+    Builds tiles and accompaniment from song data (loaded JSON or song_stream data). Each
+    part also carries the pitch and lane width of every playable tile as arrays, so lanes
+    can be laid out without touching the tiles (see layout_lanes). Tiles come from
+    `tile_pool` (an object_pool.ObjectPool of Tile) when one is given.
+    """
     parsed_data = {}
+    make_tile = tile_pool.acquire if tile_pool is not None else Tile
     base_bpm = float(song_data.get('baseBpm', 120))
 
-    event_pattern = re.compile(
-        r"^\s*(\d<[^>]+>)|"
-        r"^\s*(\(([^)]+)\)\[([A-P]+)\])|"
-        r"^\s*([a-zA-Z#\-1-5\.]+\s*\[[A-P]+\])|"
-        r"^\s*([Q-Y]+)"
-    )
-    note_pattern = re.compile(r"([a-zA-Z#\-1-5\.]+)\s*\[([A-P]+)\]")
-    space_pattern = re.compile(r"([Q-Y]+)")
-
     for part in song_data.get('musics', []):
         part_id = part.get('id')
         bpm = float(part.get('bpm', base_bpm))
         base_beats = float(part.get('baseBeats', 0.25))
 
         playable_tiles = []
+        pitches, widths = array('B'), array('B')  # Per playable tile, for layout_lanes
         accompaniment_tracks = []
         playable_track_found = False
 
-        for track_index, score_string in enumerate(part.get('scores', [])):
+        scores = part.get('scores', [])
+        for track_index in range(len(scores)):
             current_track_notes = []  # For accompaniment
             temp_playable_tiles = []  # Temporary list for this track's tiles
+            temp_pitches, temp_widths = array('B'), array('B')
 
             is_potentially_playable = not playable_track_found
-
-            current_time = 0.0
             current_lane = 0
-            remaining_str = score_string.strip()
-
             track_has_notes = False  # Flag to see if we find any real notes
 
-            while remaining_str:
-                match = event_pattern.match(remaining_str)
-                if not match:
-                    next_sep = re.search(r'[,;]', remaining_str)
-                    remaining_str = remaining_str[next_sep.end():].lstrip() if next_sep else ""
+            for event in iter_track_events(scores, track_index, bpm):
+                kind, current_time = event['kind'], event['time']
+                if kind in ('space', 'unparsed'):
                     continue
 
-                full_event_str = match.group(0)
-
-                if match.group(1):  # Special Tile
-                    # ... (Parsing logic for special tiles)
-                    content, tile_kind = match.group(1), int(match.group(1)[0])
-                    inner_content = content[2:-1]
-                    sub_events, sub_note_time, total_duration = inner_content.split(','), 0, 0
-                    all_notes_in_tile, sub_notes_data = [], []
-
+                if kind == 'special':
+                    tile_kind, sub_notes_data = event['tile_kind'], event['sub_notes']
                     has_notes_in_special = False
-
-                    for sub_event_str in sub_events:
-                        sub_event = sub_event_str.strip()
-                        note_match = note_pattern.match(sub_event)
-                        space_match = space_pattern.match(sub_event)
-                        duration = 0
-                        if note_match:
-                            notes, duration_str = note_match.group(1).split('.'), note_match.group(2)
-                            beat_value = sum(config.BEAT_MAP.get(char, 0) for char in duration_str)
-                            duration = _parse_duration(duration_str, bpm)
-                            for note in notes:
-                                if note.lower() not in ['mute', 'empty']:
-                                    has_notes_in_special = True
-                                    track_has_notes = True
-                                current_track_notes.append({'time': current_time + sub_note_time, 'note': note})
-                            all_notes_in_tile.extend(notes)
-                            sub_notes_data.append({'notes': notes, 'duration': duration, 'beat_value': beat_value})
-                        elif space_match:
-                            duration = _parse_space(space_match.group(1), bpm)
-                        sub_note_time += duration
-                    total_duration = sub_note_time
+                    for sub_note in sub_notes_data:
+                        for note in sub_note['notes']:
+                            if note.lower() not in ['mute', 'empty']:
+                                has_notes_in_special = True
+                                track_has_notes = True
+                            current_track_notes.append({'time': current_time + sub_note['offset'], 'note': note})
 
                     if is_potentially_playable and has_notes_in_special:
                         lane = (current_lane, (current_lane + 1) % 4) if tile_kind == 5 else current_lane
@@ -109,51 +244,76 @@ def parse_song(file_path):
                         sub_type = TileType.SpecialHold if tile_kind == 6 else (
                             TileType.Dual if tile_kind == 5 else TileType.Normal)
                         temp_playable_tiles.append(
-                            Tile(lane, current_time, total_duration, all_notes_in_tile, tile_type, sub_type,
-                                 sub_notes=sub_notes_data if tile_kind == 6 else []))
+                            make_tile(lane, current_time, event['duration'], event['notes'], tile_type, sub_type,
+                                      sub_notes=sub_notes_data if tile_kind == 6 else []))
+                        temp_pitches.append(pitch_value(event['notes'][0]) if event['notes'] else PITCHES['c1'])
+                        temp_widths.append(2 if tile_kind == 5 else 1)
                         current_lane = (current_lane + (2 if tile_kind == 5 else 1)) % 4
-                    current_time += total_duration
-                else:  # Normal Notes, Chords, Spaces
-                    duration = 0
-                    if match.group(2):  # Chord
-                        notes, duration_str = match.group(3).split('.'), match.group(4)
-                        beat_value = sum(config.BEAT_MAP.get(char, 0) for char in duration_str)
-                        duration = _parse_duration(duration_str, bpm)
-                        for note in notes:
-                            if note.lower() not in ['mute', 'empty']: track_has_notes = True
-                            current_track_notes.append({'time': current_time, 'note': note})
-                        if is_potentially_playable:
-                            tile_type = TileType.LongNote if beat_value > base_beats else TileType.Normal
-                            temp_playable_tiles.append(
-                                Tile(current_lane, current_time, duration, notes, tile_type, TileType.Normal))
-                            current_lane = (current_lane + 1) % 4
-                    elif match.group(5):  # Note
-                        note_match = note_pattern.match(match.group(5).strip())
-                        notes, duration_str = [note_match.group(1)], note_match.group(2)
-                        beat_value = sum(config.BEAT_MAP.get(char, 0) for char in duration_str)
-                        duration = _parse_duration(duration_str, bpm)
-                        for note in notes:
-                            if note.lower() not in ['mute', 'empty']: track_has_notes = True
-                            current_track_notes.append({'time': current_time, 'note': note})
-                        if is_potentially_playable:
-                            tile_type = TileType.LongNote if beat_value > base_beats else TileType.Normal
-                            temp_playable_tiles.append(
-                                Tile(current_lane, current_time, duration, notes, tile_type, TileType.Normal))
-                            current_lane = (current_lane + 1) % 4
-                    elif match.group(6):  # Space
-                        duration = _parse_space(match.group(6), bpm)
-                    current_time += duration
-                remaining_str = remaining_str[len(full_event_str):].lstrip(' ,;')
+                else:  # Chord or single note
+                    notes = event['notes']
+                    for note in notes:
+                        if note.lower() not in ['mute', 'empty']: track_has_notes = True
+                        current_track_notes.append({'time': current_time, 'note': note})
+                    if is_potentially_playable:
+                        tile_type = TileType.LongNote if event['beat_value'] > base_beats else TileType.Normal
+                        temp_playable_tiles.append(
+                            make_tile(current_lane, current_time, event['duration'], notes, tile_type,
+                                      TileType.Normal))
+                        temp_pitches.append(pitch_value(notes[0]) if notes else PITCHES['c1'])
+                        temp_widths.append(1)
+                        current_lane = (current_lane + 1) % 4
 
             if is_potentially_playable and track_has_notes:
                 playable_tiles = temp_playable_tiles
+                pitches, widths = temp_pitches, temp_widths
                 playable_track_found = True
-            elif current_track_notes:
-                accompaniment_tracks.append(sorted(current_track_notes, key=lambda x: x['time']))
+            else:
+                if tile_pool is not None:
+                    tile_pool.release_all(temp_playable_tiles)
+                if current_track_notes:
+                    accompaniment_tracks.append(sorted(current_track_notes, key=lambda x: x['time']))
 
         parsed_data[part_id] = {
             'metadata': {'id': part_id, 'bpm': bpm, 'baseBeats': base_beats},
             'playable_tiles': playable_tiles,
+            'pitches': pitches,
+            'widths': widths,
             'accompaniment_tracks': accompaniment_tracks
         }
-    return parsed_data
\ No newline at end of file
+    return parsed_data
+
+
+def first_lane(seed):
+    """The lane of a song's first tile for a seed. It is the only thing the seed decides."""
+    return random.Random(seed).randint(0, 3)
+
+
+def layout_lanes(parsed_song, start_lane):
+    """
+    Lanes for the playable tiles of every part of a parsed song, in part id order and tile
+    order, from the parts' pitch and lane width arrays alone. The first tile of the first part
+    goes in `start_lane` (see first_lane); after that each tile steps a lane up or down
+    following the melody and never repeats the previous tile's lane. Dual tiles get the left
+    lane of their pair. Returns an array('b').
+    """
+    lanes = array('b')
+    last_lane, last_pitch, first = -1, 60, True
+    for part_id in sorted(parsed_song):
+        part = parsed_song[part_id]
+        for i, (pitch, width) in enumerate(zip(part['pitches'], part['widths'])):
+            lane = last_lane
+            if first and i == 0:
+                lane = start_lane
+            elif last_lane != -1:
+                if pitch > last_pitch:
+                    lane = min(last_lane + 1, 3)
+                elif pitch < last_pitch:
+                    lane = max(last_lane - 1, 0)
+                if lane == last_lane:
+                    lane = (last_lane + 1) % 4
+            if lane + width > 4:
+                lane = 4 - width
+            lanes.append(lane)
+            last_lane, last_pitch = lane, pitch
+        first = False
+    return lanes
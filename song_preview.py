@@ -0,0 +1,172 @@
+# song_preview.py
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+import config
+from audio_mixdown import SampleBank, mix_notes, mixer_format, write_wav
+from song_parser import parse_note_tracks
+from song_pack import song_source
+
+
+def audition_notes(song_data, max_seconds=config.PREVIEW_MAX_SECONDS):
+    """
+    Returns the notes of every track inside the song's audition range as (time, note) pairs,
+    with times relative to the start of the range, plus the range length in seconds.
+    Audition bounds are [part index, event index in the part's first track].
+    """
+    parts = parse_note_tracks(song_data)
+    part_offsets, offset = [], 0.0
+    for part in parts:
+        part_offsets.append(offset)
+        offset += part['duration']
+
+    def to_song_time(bound):
+        part_index, event_index = bound
+        if part_index >= len(parts):
+            return offset
+        event_times = parts[part_index]['event_times']
+        if event_index < len(event_times):
+            return part_offsets[part_index] + event_times[event_index]
+        return part_offsets[part_index] + parts[part_index]['duration']
+
+    audition = song_data.get('audition') or {'start': [0, 0], 'end': [1, 0]}
+    start, end = to_song_time(audition['start']), to_song_time(audition['end'])
+    if end <= start:
+        end = offset
+    end = min(end, start + max_seconds)
+
+    notes = []
+    for part, part_offset in zip(parts, part_offsets):
+        if part_offset > end or part_offset + part['duration'] < start:
+            continue
+        for track in part['tracks']:
+            for note_time, note_name in track:
+                song_time = part_offset + note_time
+                if start <= song_time < end:
+                    notes.append((song_time - start, note_name))
+    notes.sort(key=lambda n: n[0])
+    return notes, end - start
+
+
+class PreviewEngine:
+    """
+    Renders each song's audition range into a single WAV clip on a background worker and
+    keeps the clips in an on-disk cache with least-recently-used eviction. The worker also
+    loads the finished clip into a Sound, so once it is ready playing it does no file or
+    decoding work on the main thread and previews start within a frame.
+    """
+
+    TAIL_SECONDS = 1.0  # Let the last notes ring out
+    SOUND_CACHE_SIZE = 4  # Decoded clips kept in memory
+
+    def __init__(self, source=None, cache_dir=config.PREVIEW_CACHE_DIR,
+                 max_cache_bytes=config.PREVIEW_CACHE_MAX_MB * 1024 * 1024, sample_bank=None):
+        self.source = source if source else song_source()
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.sample_bank = sample_bank if sample_bank else SampleBank()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='preview')
+        self._pending = {}
+        self._failed = set()
+        self._sounds = OrderedDict()
+
+    def clip_path(self, filename):
+        """Cache path for a song's clip; changes whenever the song or the mixer format does."""
+        sample_rate, channels = mixer_format()
+        key = f"{filename}:{self.source.signature(filename)}:{sample_rate}:{channels}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '.wav')
+
+    def request(self, filename):
+        """Queues loading a clip (rendering it first if needed) unless it is loaded, queued or failed."""
+        self._collect_finished()
+        if filename in self._sounds or filename in self._failed:
+            return None
+        future = self._pending.get(filename)
+        if future is None:
+            future = self._pending[filename] = self._executor.submit(self._load_clip, filename)
+        return future
+
+    def get_sound(self, filename):
+        """Returns the clip as a Sound if it is ready, otherwise None (and queues the load)."""
+        self.request(filename)
+        sound = self._sounds.get(filename)
+        if sound is not None:
+            self._sounds.move_to_end(filename)
+        return sound
+
+    def _collect_finished(self):
+        # Finished loads move into the in-memory LRU so pending clips never pile up
+        for filename in [name for name, future in self._pending.items() if future.done()]:
+            future = self._pending.pop(filename)
+            if future.exception() is not None:
+                print(f"Could not render preview for {filename}: {future.exception()}")
+                self._failed.add(filename)
+                continue
+            self._sounds[filename] = future.result()
+            self._sounds.move_to_end(filename)
+            if len(self._sounds) > self.SOUND_CACHE_SIZE:
+                self._sounds.popitem(last=False)
+
+    def _load_clip(self, filename):
+        """Worker task: the clip as a Sound, rendered first unless it is in the disk cache."""
+        path = self.clip_path(filename)
+        if os.path.exists(path):
+            os.utime(path)  # Mark as recently used for eviction
+        else:
+            self.render_clip(filename)
+        return pygame.mixer.Sound(path)
+
+    def render_clip(self, filename):
+        """Mixes a song's audition range to its cache path. Runs on the worker or from the CLI."""
+        with self.source.open(filename) as song_data:
+            notes, length = audition_notes(song_data)
+        sample_rate, channels = mixer_format()
+        frames = mix_notes(notes, self.sample_bank, sample_rate, channels, length + self.TAIL_SECONDS)
+        path = self.clip_path(filename)
+        temp_path = path + '.tmp'
+        write_wav(temp_path, frames, sample_rate)
+        os.replace(temp_path, path)
+        self.evict()
+        return path
+
+    def evict(self):
+        """Deletes the least recently used clips until the cache fits its size budget."""
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.wav'):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_cache_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    # Pre-render preview clips ahead of time: python song_preview.py [song.json ...]
+    import sys
+    import time
+
+    pygame.mixer.init()
+    engine = PreviewEngine()
+    filenames = sys.argv[1:] or sorted(engine.source.names())
+    start = time.perf_counter()
+    for i, filename in enumerate(filenames, 1):
+        if not os.path.exists(engine.clip_path(filename)):
+            engine.render_clip(filename)
+        print(f"[{i}/{len(filenames)}] {filename}")
+    print(f"Rendered {len(filenames)} previews in {time.perf_counter() - start:.1f}s")
+    engine.shutdown()
@@ -0,0 +1,123 @@
+# song_renderer.py
+"""
+Headless song renderer: mixes a chart's notes to a WAV file, faster than real time.
+
+    python song_renderer.py "assets/songs/Bad Apple.json" -o bad_apple.wav
+    python song_renderer.py "assets/songs/Bad Apple.json" --parts 1 --tracks 0
+    python song_renderer.py --all -o renders/ --jobs 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+import config
+from audio_mixdown import SampleBank, mix_notes, write_wav
+from song_parser import parse_note_tracks
+from song_stream import open_song
+
+_sample_bank = None
+
+
+def init_audio(sample_rate=44100, channels=2):
+    """Initializes the mixer (only used to decode samples) and this process' sample bank."""
+    global _sample_bank
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=sample_rate, size=-16, channels=channels)
+    if _sample_bank is None:
+        _sample_bank = SampleBank()
+    return _sample_bank
+
+
+def collect_notes(song_data, parts=None, tracks=None):
+    """
+    Returns every (time, note) of the selected parts (by id) and tracks (by index) on one
+    song timeline, where each part starts when the previous selected part ends.
+    """
+    notes, offset = [], 0.0
+    for part in parse_note_tracks(song_data):
+        if parts is not None and part['id'] not in parts:
+            continue
+        for track_index, track in enumerate(part['tracks']):
+            if tracks is None or track_index in tracks:
+                notes.extend((offset + note_time, note_name) for note_time, note_name in track)
+        offset += part['duration']
+    notes.sort(key=lambda n: n[0])
+    return notes, offset
+
+
+def render_song(song_path, output_path, parts=None, tracks=None, sample_rate=44100, channels=2):
+    """Renders one song to a WAV file. Returns a summary dict."""
+    sample_bank = init_audio(sample_rate, channels)
+    start = time.perf_counter()
+    with open_song(song_path) as song_data:
+        notes, _ = collect_notes(song_data, parts, tracks)
+    frames = mix_notes(notes, sample_bank, sample_rate, channels)
+    write_wav(output_path, frames, sample_rate)
+    elapsed = time.perf_counter() - start
+    audio_seconds = len(frames) / sample_rate
+    return {
+        'song': os.path.basename(song_path),
+        'output': output_path,
+        'notes': len(notes),
+        'audio_seconds': audio_seconds,
+        'render_seconds': elapsed,
+        'realtime_factor': audio_seconds / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def render_library(song_paths, output_dir, jobs=None, parts=None, tracks=None, sample_rate=44100, channels=2):
+    """Renders many songs on a process pool, yielding each summary as it completes."""
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_audio, initargs=(sample_rate, channels)) as pool:
+        futures = {}
+        for song_path in song_paths:
+            output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(song_path))[0] + '.wav')
+            futures[pool.submit(render_song, song_path, output_path, parts, tracks, sample_rate, channels)] = song_path
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {'song': os.path.basename(futures[future]), 'error': str(e)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render song charts to WAV files.")
+    parser.add_argument('songs', nargs='*', help="Song JSON files to render")
+    parser.add_argument('--all', action='store_true', help=f"Render every song in {config.SONGS_DIR}")
+    parser.add_argument('-o', '--output', help="Output WAV file (single song) or directory")
+    parser.add_argument('--parts', type=int, nargs='+', help="Part ids to include (default: all)")
+    parser.add_argument('--tracks', type=int, nargs='+', help="Track indices to include (default: all)")
+    parser.add_argument('--jobs', type=int, help="Worker processes for batch renders")
+    parser.add_argument('--rate', type=int, default=44100, help="Sample rate")
+    args = parser.parse_args()
+
+    song_paths = list(args.songs)
+    if args.all:
+        song_paths += [os.path.join(config.SONGS_DIR, f) for f in sorted(os.listdir(config.SONGS_DIR))
+                       if f.endswith('.json')]
+    if not song_paths:
+        parser.error("no songs given (pass files or --all)")
+
+    parts = set(args.parts) if args.parts else None
+    tracks = set(args.tracks) if args.tracks else None
+
+    output_is_dir = args.output and (os.path.isdir(args.output) or args.output.endswith(('/', os.sep)))
+    if len(song_paths) == 1 and not output_is_dir:
+        output = args.output or os.path.splitext(os.path.basename(song_paths[0]))[0] + '.wav'
+        results = [render_song(song_paths[0], output, parts, tracks, args.rate)]
+    else:
+        results = render_library(song_paths, args.output or 'renders', args.jobs, parts, tracks, args.rate)
+
+    for result in results:
+        if 'error' in result:
+            print(f"{result['song']}: ERROR {result['error']}")
+        else:
+            print(f"{result['song']}: {result['notes']} notes, {result['audio_seconds']:.1f}s of audio "
+                  f"in {result['render_seconds']:.2f}s ({result['realtime_factor']:.0f}x real time)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+# song_search.py
+import bisect
+import heapq
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Sequence
+from itertools import chain
+
+# Structured filters that can be mixed with free text, e.g. "sonata bpm:100-140 class:moderate"
+FILTER_PATTERN = re.compile(r"^(bpm|class|diff)\s*([:<>])\s*(.+)$")
+
+
+def normalize(text):
+    """Lowercases and strips accents so 'Für Elise' matches 'fur elise'."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def position_mask(positions, size):
+    """A set of positions as an int bitmask, so filters combine with a single & or |."""
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class RankSpace:
+    """
+    Bitmasks over one sort order of the library: bit r stands for the song at position r
+    of the order, so the set bits of a result mask read from the low end are its matches
+    in that order, and from the high end in reverse.
+    """
+
+    def __init__(self, order, postings, classes, bpm_ids, bpm_block, common_size):
+        self.order = order
+        self.size = size = len(order)
+        self.rank = rank = [0] * size
+        for position, song_id in enumerate(order):
+            rank[song_id] = position
+        self.gram_masks = {gram: self.mask(ids) for gram, ids in postings.items() if len(ids) >= common_size}
+        self.class_masks = {class_name: self.mask(ids) for class_name, ids in classes.items()}
+        self.bpm_ids = bpm_ids
+        self.bpm_block = bpm_block
+        self.bpm_prefix = [0]
+        for block_start in range(0, size, bpm_block):
+            block = bpm_ids[block_start:block_start + bpm_block]
+            self.bpm_prefix.append(self.bpm_prefix[-1] | self.mask(block))
+
+    def mask(self, ids):
+        rank = self.rank
+        return position_mask([rank[song_id] for song_id in ids], self.size)
+
+    def gram_mask(self, gram, postings):
+        # Masks are only kept for n-grams common enough that building one per query would show
+        mask = self.gram_masks.get(gram)
+        if mask is None:
+            mask = self.mask(postings.get(gram, ()))
+        return mask
+
+    def bpm_below(self, position):
+        """The mask of the first `position` songs in BPM order."""
+        block, offset = divmod(position, self.bpm_block)
+        return self.bpm_prefix[block] | self.mask(self.bpm_ids[position - offset:position])
+
+
+class SearchResults(Sequence):
+    """
+    The ids matching a search, exact matches in the requested order followed by fuzzy ones.
+
+    The exact matches stay a rank-space bitmask: its length is a popcount, and reading the
+    first rows finds the first set bits of its binary string, which skips non-matching
+    songs at C speed. Ids are only collected as far as the list is actually read.
+    """
+
+    def __init__(self, mask, space, reverse=False, fuzzy=(), values=None):
+        self.fuzzy = list(fuzzy)
+        self.exact_count = mask.bit_count()
+        self._order = space.order
+        self._reverse = reverse
+        bits = format(mask, f'0{space.size}b')  # Highest rank first
+        self._bits = bits if reverse else bits[::-1]
+        self._values = values
+        self._found = []
+        self._next = 0
+
+    def __len__(self):
+        return self.exact_count + len(self.fuzzy)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('search result index out of range')
+        if index < self.exact_count:
+            self._fill(index + 1)
+            song_id = self._found[index]
+        else:
+            song_id = self.fuzzy[index - self.exact_count]
+        return song_id if self._values is None else self._values[song_id]
+
+    def _fill(self, count):
+        found, order, bits = self._found, self._order, self._bits
+        last = len(order) - 1
+        position = self._next
+        while len(found) < count:
+            position = bits.find('1', position)
+            found.append(order[last - position if self._reverse else position])
+            position += 1
+        self._next = position
+
+
+class SongSearchIndex:
+    """
+    An n-gram index over song names, built once when the library is loaded.
+
+    Songs are referred to by their position in the list the index was built from. Result
+    sets are int bitmasks in the rank space of one of the sort orders given at build time
+    (see RankSpace): posting lists of common n-grams, difficulty classes and cumulative
+    BPM blocks are precomputed as masks for each order, so combining text and filters is
+    a few big-int operations however many songs match, and the combined mask is already
+    in display order. Substring queries intersect the posting lists of the query's
+    trigrams (or use the 1-/2-gram postings for very short queries) and only verify the
+    remaining candidates. When a query just extends the previous one and the previous
+    result is the smaller candidate set, it is refined instead. If a query has few exact
+    hits, the songs sharing the most trigrams with it are appended as fuzzy matches,
+    ranked by similarity.
+    """
+
+    MIN_FUZZY_SIMILARITY = 0.4  # Share of the query's trigrams a fuzzy match must contain
+    MIN_FUZZY_SHARED = 2  # A single common trigram is never enough
+    FUZZY_WHEN_FEWER_THAN = 5
+    MAX_FUZZY_RESULTS = 20
+    BPM_BLOCK = 256  # Songs per precomputed cumulative BPM mask
+
+    def __init__(self, songs, orders=None):
+        """`orders` maps a sort name to a list of song ids; by default songs keep their list order."""
+        self.names = [normalize(song['display_name']) for song in songs]
+        self.size = size = len(self.names)
+        self.all_mask = (1 << size) - 1
+        self.postings = {}
+        for song_id, name in enumerate(self.names):
+            for gram in self._ngrams(name):
+                self.postings.setdefault(gram, set()).add(song_id)
+        self.trigram_counts = [len(self._trigrams(name)) for name in self.names]
+
+        classes = {}
+        for song_id, song in enumerate(songs):
+            classes.setdefault(normalize(song.get('difficulty_class', '')), []).append(song_id)
+
+        bpm_pairs = sorted((float(song.get('bpm', 0)), song_id) for song_id, song in enumerate(songs))
+        self._bpm_values = [bpm for bpm, _ in bpm_pairs]
+        bpm_ids = [song_id for _, song_id in bpm_pairs]
+
+        if orders is None:
+            orders = {None: list(range(size))}
+        common_size = max(1, size // 64)
+        self.spaces = {name: RankSpace(order, self.postings, classes, bpm_ids, self.BPM_BLOCK, common_size)
+                       for name, order in orders.items()}
+
+        self._last_text = None
+        self._last_exact = None
+
+    @staticmethod
+    def _ngrams(name):
+        grams = set()
+        for n in (1, 2, 3):
+            for i in range(len(name) - n + 1):
+                grams.add(name[i:i + n])
+        return grams
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def search(self, query, order=None, reverse=False, values=None):
+        """
+        Returns the matching song ids as SearchResults. Exact matches come first, in the
+        named `order` (one of those given at build time), reversed if asked; fuzzy matches
+        follow, best first. With `values` (e.g. the song list) the results hold
+        values[song_id] instead of the ids.
+        """
+        space = self.spaces[order]
+        text, allowed = self._parse_query(query, space)
+
+        exact = self._match_text(text, space) & allowed
+        fuzzy = ()
+        if text and exact.bit_count() < self.FUZZY_WHEN_FEWER_THAN:
+            fuzzy = self._fuzzy(text, exact, allowed, space)
+        return SearchResults(exact, space, reverse, fuzzy, values)
+
+    def _parse_query(self, query, space):
+        """Splits a query into its free text and the mask of songs its filters allow."""
+        words, allowed = [], self.all_mask
+        for token in normalize(query).split():
+            match = FILTER_PATTERN.match(token)
+            if match:
+                mask = self._filter_mask(space, *match.groups())
+                if mask is not None:
+                    allowed &= mask
+                    continue
+            words.append(token)
+        return ' '.join(words), allowed
+
+    def _filter_mask(self, space, field, op, value):
+        if field in ('class', 'diff'):
+            mask = 0
+            for class_name, class_mask in space.class_masks.items():
+                if value in class_name:
+                    mask |= class_mask
+            return mask
+        try:
+            if op == ':' and '-' in value:
+                low, high = (float(v) for v in value.split('-', 1))
+            elif op == ':':
+                low = high = float(value)
+            elif op == '>':
+                low, high = float(value), float('inf')
+            else:
+                low, high = float('-inf'), float(value)
+        except ValueError:
+            return None
+        start = bisect.bisect_left(self._bpm_values, low)
+        end = bisect.bisect_right(self._bpm_values, high)
+        return space.bpm_below(end) & ~space.bpm_below(start)
+
+    def _match_text(self, text, space):
+        """Returns the mask of songs whose name contains text; every song for an empty query."""
+        if not text:
+            self._last_text, self._last_exact = None, None
+            return self.all_mask
+
+        if len(text) <= 3:
+            # Short queries are n-grams themselves, so their posting list is the answer
+            self._last_text, self._last_exact = text, self.postings.get(text, set())
+            return space.gram_mask(text, self.postings)
+
+        grams = sorted((self.postings.get(g, set()) for g in self._trigrams(text)), key=len)
+        if self._last_text is not None and text.startswith(self._last_text) and \
+                len(self._last_exact) <= len(grams[0]):
+            # Typing another character can only narrow the previous result
+            candidates = self._last_exact
+        else:
+            candidates = grams[0].intersection(*grams[1:])
+
+        names = self.names
+        exact = {song_id for song_id in candidates if text in names[song_id]}
+        self._last_text, self._last_exact = text, exact
+        return space.mask(exact)
+
+    def _fuzzy(self, text, exact, allowed, space):
+        query_grams = self._trigrams(text)
+        if len(query_grams) < self.MIN_FUZZY_SHARED:
+            return []
+        counts = Counter(chain.from_iterable(self.postings.get(gram, ()) for gram in query_grams))
+        query_count = len(query_grams)
+        trigram_counts = self.trigram_counts
+        rank = space.rank
+        candidates = (allowed & ~exact).to_bytes((self.size + 7) // 8, 'little')
+        min_shared = max(self.MIN_FUZZY_SHARED, self.MIN_FUZZY_SIMILARITY * query_count)
+        scored = []
+        for song_id, shared in counts.items():
+            position = rank[song_id]
+            if shared >= min_shared and candidates[position >> 3] >> (position & 7) & 1:
+                # Dice coefficient, so shorter names with the same overlap rank first
+                similarity = 2 * shared / (query_count + trigram_counts[song_id])
+                scored.append((similarity, -song_id))
+        best = heapq.nlargest(self.MAX_FUZZY_RESULTS, scored)
+        return [-negated_id for _, negated_id in best]
+
+if __name__ == '__main__':
+    import os
+    import time
+    import config
+
+    songs = [{'display_name': f[:-5].replace('_', ' ')} for f in os.listdir(config.SONGS_DIR) if f.endswith('.json')]
+    songs *= 10  # Check we stay fast at 10x the bundled library
+    start = time.perf_counter()
+    order = sorted(range(len(songs)), key=lambda i: songs[i]['display_name'])
+    index = SongSearchIndex(songs, {'display_name': order})
+    print(f"Indexed {len(songs)} songs in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for query in ["s", "sy", "sym", "symp", "symphony", "fur elise", "symfony", "thex", "nocturne bpm>150"]:
+        start = time.perf_counter()
+        results = index.search(query, 'display_name')
+        preview = [songs[i]['display_name'] for i in results[:3]]  # The first rows a screen would show
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{query!r}: {len(results)} results in {elapsed:.3f} ms {preview}")
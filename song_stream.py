@@ -0,0 +1,252 @@
+# song_stream.py
+"""
+Incremental reading of song JSON files. The file is memory-mapped (or read as bytes where
+mmap is unavailable) and only its structure is decoded: numbers, keys and small values
+become Python objects, while each `scores` string stays a span of the raw buffer until it
+is used. Score spans can be tokenized in place by song_parser.iter_score_events, so a
+chart is never materialized as one big document or one big Python string.
+
+    with open_song(path) as song_data:
+        for part in song_data['musics']:
+            for buffer, start, end in part['scores'].sources():
+                ...
+"""
+import json
+import mmap
+import os
+import re
+from collections.abc import Sequence
+
+# One JSON token after optional whitespace. Strings use the unrolled form so the common
+# case (no escapes) is a single fast character-class run.
+_TOKEN = re.compile(
+    rb'\s*(?:'
+    rb'("[^"\\]*(?:\\.[^"\\]*)*")|'
+    rb'([{}\[\]:,])|'
+    rb'(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)|'
+    rb'(true|false|null))'
+)
+_LITERALS = {b'true': True, b'false': False, b'null': None}
+
+
+class SongFormatError(ValueError):
+    pass
+
+
+class ScoreList(Sequence):
+    """
+    The `scores` of one part, kept as (start, end) spans of the song buffer. Indexing
+    decodes a single score string; sources() gives raw spans for tokenizing in place.
+    """
+
+    def __init__(self, buffer, spans):
+        self.buffer = buffer
+        self.spans = spans  # (start, end, has_escapes) of each string's contents
+
+    def __len__(self):
+        return len(self.spans)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        start, end, has_escapes = self.spans[index]
+        if has_escapes:
+            return json.loads(self.buffer[start - 1:end + 1])
+        return self.buffer[start:end].decode('utf-8')
+
+    def source(self, index):
+        """Returns (buffer, start, end) of one score. Escaped strings are decoded first."""
+        start, end, has_escapes = self.spans[index]
+        if has_escapes:
+            text = self[index]
+            return text, 0, len(text)
+        return self.buffer, start, end
+
+    def sources(self):
+        return (self.source(i) for i in range(len(self)))
+
+
+class SongReader:
+    """
+    Parses the structure of a song held in `buffer` between `start` and `end` (e.g. a
+    memory-mapped file, or one chart inside a song pack). Use as a context manager; the
+    returned song data (and its ScoreLists) are only valid until it is closed.
+    """
+
+    def __init__(self, buffer, start=0, end=None, name='<song>', on_close=None):
+        self.buffer = buffer
+        self.start = start
+        self.end = len(buffer) if end is None else end
+        self.name = name
+        self._on_close = on_close
+
+    @classmethod
+    def from_file(cls, file_path):
+        file = open(file_path, 'rb')
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty files and file systems without mmap support
+            buffer = file.read()
+
+        def close():
+            if isinstance(buffer, mmap.mmap):
+                try:
+                    buffer.close()
+                except BufferError:
+                    # A caller still holds a view of the map; it is released with the object
+                    pass
+            file.close()
+        return cls(buffer, name=file_path, on_close=close)
+
+    def __enter__(self):
+        return self.read()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._on_close:
+            self._on_close()
+            self._on_close = None
+
+    def read(self):
+        """Returns the song as dicts and lists, with every `scores` list as a ScoreList."""
+        value, pos = self._value(self.start, None)
+        if _TOKEN.match(self.buffer, pos, self.end) is not None:
+            raise SongFormatError(f"{self.name}: trailing data at byte {pos}")
+        return value
+
+    def _token(self, pos):
+        match = _TOKEN.match(self.buffer, pos, self.end)
+        if match is None:
+            raise SongFormatError(f"{self.name}: invalid JSON at byte {pos}")
+        return match
+
+    def _value(self, pos, key):
+        match = self._token(pos)
+        string, punct, number, literal = match.groups()
+        if string is not None:
+            return json.loads(string), match.end()
+        if number is not None:
+            return (float(number) if b'.' in number or b'e' in number.lower() else int(number)), match.end()
+        if literal is not None:
+            return _LITERALS[literal], match.end()
+        if punct == b'{':
+            return self._object(match.end())
+        if punct == b'[':
+            if key == 'scores':
+                return self._score_list(match.end())
+            return self._array(match.end())
+        raise SongFormatError(f"{self.name}: unexpected {punct!r} at byte {match.start(2)}")
+
+    def _object(self, pos):
+        result = {}
+        match = self._token(pos)
+        if match.group(2) == b'}':
+            return result, match.end()
+        while True:
+            if match.group(1) is None:
+                raise SongFormatError(f"{self.name}: expected a key at byte {pos}")
+            key = json.loads(match.group(1))
+            colon = self._token(match.end())
+            if colon.group(2) != b':':
+                raise SongFormatError(f"{self.name}: expected ':' at byte {colon.start()}")
+            result[key], pos = self._value(colon.end(), key)
+            match = self._token(pos)
+            if match.group(2) == b'}':
+                return result, match.end()
+            if match.group(2) != b',':
+                raise SongFormatError(f"{self.name}: expected ',' or '}}' at byte {pos}")
+            match = self._token(match.end())
+
+    def _array(self, pos):
+        result = []
+        match = self._token(pos)
+        if match.group(2) == b']':
+            return result, match.end()
+        while True:
+            value, pos = self._value(pos, None)
+            result.append(value)
+            match = self._token(pos)
+            if match.group(2) == b']':
+                return result, match.end()
+            if match.group(2) != b',':
+                raise SongFormatError(f"{self.name}: expected ',' or ']' at byte {pos}")
+            pos = match.end()
+
+    def _score_list(self, pos):
+        spans = []
+        match = self._token(pos)
+        if match.group(2) == b']':
+            return ScoreList(self.buffer, spans), match.end()
+        while True:
+            if match.group(1) is None:
+                raise SongFormatError(f"{self.name}: expected a score string at byte {pos}")
+            start, end = match.start(1) + 1, match.end(1) - 1
+            spans.append((start, end, self.buffer.find(b'\\', start, end) != -1))
+            match = self._token(match.end())
+            if match.group(2) == b']':
+                return ScoreList(self.buffer, spans), match.end()
+            if match.group(2) != b',':
+                raise SongFormatError(f"{self.name}: expected ',' or ']' at byte {match.start()}")
+            match = self._token(match.end())
+
+
+def open_song(file_path):
+    """Opens a song file for incremental reading: `with open_song(path) as song_data: ...`"""
+    return SongReader.from_file(file_path)
+
+
+if __name__ == '__main__':
+    # Peak memory and time of loading and parsing the largest charts: whole-document
+    # json.load versus the memory-mapped reader.
+    import sys
+    import time
+    import tracemalloc
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    import config
+    import song_parser
+
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    paths = sorted((os.path.join(config.SONGS_DIR, f) for f in os.listdir(config.SONGS_DIR) if f.endswith('.json')),
+                   key=os.path.getsize, reverse=True)[:count]
+
+    def measure(label, load):
+        peaks, elapsed = [], 0.0
+        for path in paths:
+            tracemalloc.start()
+            start = time.perf_counter()
+            load(path)
+            elapsed += time.perf_counter() - start
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        print(f"{label:<28} peak {max(peaks) / 1024:8.0f} KB max, {sum(peaks) / len(peaks) / 1024:8.0f} KB avg, "
+              f"{elapsed / len(paths) * 1000:6.1f} ms per song")
+
+    def json_load(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def stream_load(path):
+        with open_song(path) as song_data:
+            return sum(len(part['scores']) for part in song_data['musics'])
+
+    def json_tracks(path):
+        return song_parser.parse_note_tracks(json_load(path))
+
+    def stream_tracks(path):
+        with open_song(path) as song_data:
+            return song_parser.parse_note_tracks(song_data)
+
+    print(f"{len(paths)} largest charts, {os.path.getsize(paths[-1]) // 1024}-{os.path.getsize(paths[0]) // 1024} KB")
+    measure("json.load", json_load)
+    measure("open_song", stream_load)
+    measure("json.load + note tracks", json_tracks)
+    measure("open_song + note tracks", stream_tracks)
+    measure("json.load + tiles", lambda path: song_parser.parse_song_data(json_load(path)))
+    measure("parse_song (tiles)", song_parser.parse_song)
@@ -0,0 +1,265 @@
+# song_validator.py
+"""
+Library validator: parses every song on a process pool and reports what the parser and the
+difficulty rating otherwise skip silently: unparsed fragments, note names with no sample in
+assets/snd, empty parts and timing anomalies. Per-file parse timings flag pathological charts.
+
+    python song_validator.py                          # the whole library
+    python song_validator.py "assets/songs/Bad Apple.json" -v
+    python song_validator.py --json report.json --jobs 8
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+import config
+import song_metadata
+import song_parser
+from song_stream import open_song
+
+ERROR, WARNING = 'error', 'warning'
+REST_NOTES = ('mute', 'empty')
+# Special tile kinds that add to the difficulty rating; others are silently left out of it
+RATED_TILE_KINDS = tuple(sorted(song_metadata.SPECIAL_TILE_RATINGS))
+
+_sound_names = None
+
+
+def init_worker(sounds_dir=config.SOUNDS_DIR):
+    """Loads the sample names and a 1x1 display (tiles load their images on creation)."""
+    global _sound_names
+    if not pygame.display.get_init():
+        pygame.display.init()
+        pygame.display.set_mode((1, 1))
+    if _sound_names is None:
+        _sound_names = {os.path.splitext(f)[0] for f in os.listdir(sounds_dir) if f.endswith('.mp3')}
+    return _sound_names
+
+
+class IssueLog:
+    """Issues of one song. Repeats of the same issue are counted instead of listed again."""
+
+    def __init__(self):
+        self._issues = {}
+
+    def add(self, severity, check, message, part=None, track=None, time=None, detail=None):
+        key = (check, part, track, detail if detail is not None else message)
+        issue = self._issues.get(key)
+        if issue is None:
+            self._issues[key] = {'severity': severity, 'check': check, 'part': part, 'track': track,
+                                 'time': round(time, 3) if time is not None else None,
+                                 'message': message, 'count': 1}
+        else:
+            issue['count'] += 1
+
+    def issues(self):
+        return list(self._issues.values())
+
+
+def check_song(song_data, sound_names, log):
+    """Runs every check over loaded song data, adding what it finds to `log`."""
+    base_bpm = float(song_data.get('baseBpm', 120))
+    musics = song_data.get('musics', [])
+    if not musics:
+        log.add(ERROR, 'empty_part', "song has no parts")
+    for part in musics:
+        part_id = part.get('id')
+        bpm = float(part.get('bpm', base_bpm))
+        base_beats = float(part.get('baseBeats', 0.25))
+        if bpm <= 0:
+            log.add(ERROR, 'timing', f"bpm is {bpm:g}; every event has zero length", part_id)
+        if base_beats <= 0:
+            log.add(WARNING, 'timing', f"baseBeats is {base_beats:g}; every tile becomes a long note", part_id)
+
+        scores = part.get('scores', [])
+        if not scores:
+            log.add(WARNING, 'empty_part', "part has no scores", part_id)
+            continue
+        track_ends, part_notes = [], 0
+        for track_index in range(len(scores)):
+            end_time = 0.0
+            for event in song_parser.iter_track_events(scores, track_index, bpm):
+                kind, event_time = event['kind'], event['time']
+                if kind == 'unparsed':
+                    log.add(ERROR, 'unparsed', f"skipped {event['text'][:60]!r}", part_id, track_index, event_time)
+                    continue
+                if kind == 'special':
+                    for fragment in event['unparsed']:
+                        log.add(ERROR, 'unparsed', f"skipped {fragment[:60]!r} inside a special tile",
+                                part_id, track_index, event_time)
+                    if event['tile_kind'] not in RATED_TILE_KINDS:
+                        log.add(WARNING, 'tile_kind', f"special tile kind {event['tile_kind']} is not rated",
+                                part_id, track_index, event_time, detail=event['tile_kind'])
+                for note in event.get('notes', ()):
+                    if note.lower() in REST_NOTES:
+                        continue
+                    part_notes += 1
+                    if note not in sound_names:
+                        log.add(ERROR, 'unknown_note', f"no sample for note {note!r}", part_id, track_index,
+                                event_time, detail=note)
+                if kind != 'space' and event['duration'] <= 0 and bpm > 0 and not event.get('unparsed'):
+                    log.add(WARNING, 'timing', "event with zero length", part_id, track_index, event_time)
+                end_time = event_time + event['duration']
+            track_ends.append(end_time)
+
+        if part_notes == 0:
+            log.add(WARNING, 'empty_part', "part has no notes, only rests", part_id)
+        if bpm > 0:
+            longest = max(track_ends)
+            for track_index, end_time in enumerate(track_ends):
+                beats_short = (longest - end_time) * bpm / 60.0
+                if beats_short >= 1:
+                    log.add(WARNING, 'timing', f"track ends {beats_short:g} beats before the longest track",
+                            part_id, track_index)
+
+
+def validate_song(song_path, sound_names=None):
+    """Validates one song file. Returns a result dict with its issues and parse timings in ms."""
+    sound_names = sound_names if sound_names is not None else init_worker()
+    log = IssueLog()
+    timings = {}
+    result = {'song': os.path.basename(song_path), 'bytes': os.path.getsize(song_path), 'timings': timings}
+    start = time.perf_counter()
+    try:
+        with open_song(song_path) as song_data:
+            timings['read'] = (time.perf_counter() - start) * 1000
+
+            mark = time.perf_counter()
+            check_song(song_data, sound_names, log)
+            timings['tokenize'] = (time.perf_counter() - mark) * 1000
+
+            mark = time.perf_counter()
+            song_parser.parse_song_data(song_data)
+            timings['tiles'] = (time.perf_counter() - mark) * 1000
+
+            mark = time.perf_counter()
+            song_metadata.calculate_difficulty(song_data)
+            timings['difficulty'] = (time.perf_counter() - mark) * 1000
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        log.add(ERROR, 'invalid', f"{type(e).__name__}: {e}")
+    timings['total'] = (time.perf_counter() - start) * 1000
+    result['issues'] = log.issues()
+    return result
+
+
+def validate_library(song_paths, jobs=None, sounds_dir=config.SOUNDS_DIR):
+    """Validates many songs on a process pool, yielding each result as it completes."""
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(sounds_dir,)) as pool:
+        futures = {pool.submit(validate_song, song_path): song_path for song_path in song_paths}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                song_path = futures[future]
+                yield {'song': os.path.basename(song_path), 'bytes': os.path.getsize(song_path), 'timings': {},
+                       'issues': [{'severity': ERROR, 'check': 'crash', 'part': None, 'track': None, 'time': None,
+                                   'message': f"{type(e).__name__}: {e}", 'count': 1}]}
+
+
+def flag_slow(results, factor):
+    """
+    Marks songs whose parse time per KB is `factor` times the library median (and at least
+    10 ms in total), i.e. inputs the parser handles pathologically. Returns them slowest first.
+    """
+    rates = {id(r): r['timings']['total'] / max(r['bytes'] / 1024, 1) for r in results if 'total' in r['timings']}
+    if not rates:
+        return []
+    median = statistics.median(rates.values())
+    slow = []
+    for result in results:
+        rate = rates.get(id(result))
+        if rate is not None and rate > median * factor and result['timings']['total'] >= 10:
+            result['slow'] = True
+            slow.append(result)
+    return sorted(slow, key=lambda r: r['timings']['total'], reverse=True)
+
+
+def build_report(results, slow, elapsed):
+    """The machine-readable report: totals per check, timing statistics and every song's results."""
+    checks = {}
+    for result in results:
+        for issue in result['issues']:
+            counts = checks.setdefault(issue['check'], {'songs': set(), 'issues': 0})
+            counts['songs'].add(result['song'])
+            counts['issues'] += issue['count']
+    totals = [r['timings']['total'] for r in results if 'total' in r['timings']]
+    return {
+        'songs': len(results),
+        'songs_with_errors': sum(any(i['severity'] == ERROR for i in r['issues']) for r in results),
+        'songs_with_warnings': sum(any(i['severity'] == WARNING for i in r['issues']) for r in results),
+        'checks': {check: {'songs': len(c['songs']), 'issues': c['issues']} for check, c in sorted(checks.items())},
+        'timings_ms': {
+            'median': statistics.median(totals) if totals else 0.0,
+            'p95': sorted(totals)[int(len(totals) * 0.95)] if totals else 0.0,
+            'max': max(totals, default=0.0),
+        },
+        'slow': [r['song'] for r in slow],
+        'elapsed_seconds': elapsed,
+        'results': sorted(results, key=lambda r: r['song']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate song charts and report parse problems.")
+    parser.add_argument('songs', nargs='*', help=f"Song JSON files to check (default: every song in {config.SONGS_DIR})")
+    parser.add_argument('--jobs', type=int, help="Worker processes")
+    parser.add_argument('--json', metavar='PATH', help="Write the full report as JSON ('-' for stdout)")
+    parser.add_argument('--slow-factor', type=float, default=5.0,
+                        help="Flag songs parsing this many times slower per KB than the median")
+    parser.add_argument('-v', '--verbose', action='store_true', help="List every issue, not just a summary")
+    args = parser.parse_args()
+
+    song_paths = args.songs or [os.path.join(config.SONGS_DIR, f) for f in sorted(os.listdir(config.SONGS_DIR))
+                                if f.endswith('.json')]
+    start = time.perf_counter()
+    if len(song_paths) == 1:
+        results = [validate_song(song_paths[0])]
+    else:
+        results = []
+        for i, result in enumerate(validate_library(song_paths, args.jobs), 1):
+            results.append(result)
+            if args.json != '-':
+                print(f"\r[{i}/{len(song_paths)}]", end='', flush=True)
+        if args.json != '-':
+            print()
+    elapsed = time.perf_counter() - start
+    slow = flag_slow(results, args.slow_factor)
+    report = build_report(results, slow, elapsed)
+
+    if args.json:
+        if args.json == '-':
+            print(json.dumps(report, indent=1))
+            return 1 if report['songs_with_errors'] else 0
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+
+    if args.verbose:
+        for result in report['results']:
+            for issue in result['issues']:
+                where = ''.join(f" {label} {issue[key]}" for key, label in (('part', 'part'), ('track', 'track'))
+                                if issue[key] is not None)
+                at = f" at {issue['time']:.2f}s" if issue['time'] is not None else ''
+                repeat = f" (x{issue['count']})" if issue['count'] > 1 else ''
+                print(f"{result['song']}:{where}{at}: {issue['severity']}: {issue['message']}{repeat}")
+    print(f"{report['songs']} songs checked in {elapsed:.1f}s: {report['songs_with_errors']} with errors, "
+          f"{report['songs_with_warnings']} with warnings")
+    for check, counts in report['checks'].items():
+        print(f"  {check:<14} {counts['issues']:>7} issues in {counts['songs']} songs")
+    timings = report['timings_ms']
+    print(f"Parse time per song: median {timings['median']:.1f} ms, p95 {timings['p95']:.1f} ms, "
+          f"max {timings['max']:.1f} ms")
+    for result in slow[:10]:
+        print(f"  slow: {result['song']} ({result['bytes'] // 1024} KB in {result['timings']['total']:.0f} ms)")
+    if args.json:
+        print(f"Report written to {args.json}")
+    return 1 if report['songs_with_errors'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
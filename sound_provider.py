@@ -0,0 +1,103 @@
+# sound_provider.py
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+import config
+
+
+class SoundProvider:
+    """
+    Note sounds decoded on demand instead of all at startup. preload() queues the notes a
+    chart uses on a worker thread so they are ready before gameplay; anything requested
+    that is not loaded yet is decoded on the spot. Decoded sounds are kept in an LRU of
+    `max_sounds` shared across songs, but the notes of the last preload are never evicted.
+
+    Behaves like a read-only dict of note name -> pygame Sound, so it can stand in for the
+    eagerly loaded sound dicts.
+    """
+
+    def __init__(self, sounds_dir=config.SOUNDS_DIR, max_sounds=config.SOUND_CACHE_SIZE):
+        self.sounds_dir = sounds_dir
+        self.max_sounds = max_sounds
+        self.available = set()
+        if os.path.isdir(sounds_dir):
+            self.available = {os.path.splitext(f)[0] for f in os.listdir(sounds_dir) if f.endswith('.mp3')}
+        self._sounds = OrderedDict()
+        self._loading = {}  # note name -> Future of a decode queued on the worker
+        self._pinned = frozenset()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sound-loader')
+        self.stats = {'decoded': 0, 'hits': 0, 'misses': 0, 'evicted': 0, 'failed': 0}
+
+    def __contains__(self, note_name):
+        return note_name in self.available
+
+    def __getitem__(self, note_name):
+        sound = self.get(note_name)
+        if sound is None:
+            raise KeyError(note_name)
+        return sound
+
+    def __len__(self):
+        """Number of sounds currently decoded."""
+        return len(self._sounds)
+
+    def get(self, note_name, default=None):
+        """Returns the Sound for a note, decoding it now if it is not loaded yet."""
+        with self._lock:
+            sound = self._sounds.get(note_name)
+            if sound is not None:
+                self._sounds.move_to_end(note_name)
+                self.stats['hits'] += 1
+                return sound
+            if note_name not in self.available:
+                return default
+            future = self._loading.get(note_name)
+        if future is not None:
+            sound = future.result()
+        else:
+            self.stats['misses'] += 1
+            sound = self._decode(note_name)
+        return sound if sound is not None else default
+
+    def preload(self, note_names, on_loaded=None):
+        """
+        Queues the given notes for decoding and pins them until the next preload. Returns a
+        Future that completes once they are decoded and `on_loaded` (if any) has run on the
+        worker.
+        """
+        wanted = {note_name for note_name in note_names if note_name in self.available}
+        with self._lock:
+            self._pinned = frozenset(wanted)
+            for note_name in sorted(wanted):
+                if note_name not in self._sounds and note_name not in self._loading:
+                    self._loading[note_name] = self._executor.submit(self._decode, note_name)
+        # The worker runs jobs in order, so every decode above is done before this one
+        return self._executor.submit(on_loaded if on_loaded else (lambda: None))
+
+    def _decode(self, note_name):
+        sound = None
+        try:
+            sound = pygame.mixer.Sound(os.path.join(self.sounds_dir, f"{note_name}.mp3"))
+        except pygame.error as e:
+            print(f"Could not load sound {note_name}: {e}")
+        with self._lock:
+            self._loading.pop(note_name, None)
+            if sound is None:
+                self.stats['failed'] += 1
+                self.available.discard(note_name)
+                return None
+            self._sounds[note_name] = sound
+            self.stats['decoded'] += 1
+            excess = len(self._sounds) - self.max_sounds
+            if excess > 0:
+                for old_note in [n for n in self._sounds if n not in self._pinned][:excess]:
+                    del self._sounds[old_note]
+                    self.stats['evicted'] += 1
+        return sound
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,171 @@
+# stress_chart.py
+"""
+Generated charts for load testing the parser, the game loop and drawing on cases no bundled
+song reaches: streams of 32nd notes at 600+ BPM, long runs of dual tiles, SpecialHold tiles
+with hundreds of sub-notes, wide chords. A chart is written as ordinary song JSON (a
+`musics` list of parts, each with a `scores` list), so it goes through exactly the code
+paths real songs do. PRESETS holds the worst cases perf_suite.py benchmarks.
+
+    python stress_chart.py cache/stress/stream.json --bpm 900 --note P --seconds 120
+    python stress_chart.py cache/stress/mix.json --mix note=6,long=2,dual=2,hold=1 --chord 3
+    python stress_chart.py cache/stress/holds.json --preset holds --simulate
+"""
+import argparse
+import json
+import os
+import random
+
+import config
+import song_parser
+
+# White keys from c to c3, all with samples in assets/snd
+MELODY_NOTES = [f"{name}{octave}" for octave in ('', '1', '2') for name in 'cdefgab'] + ['c3']
+
+# Kinds of tiles in a mix: plain tiles, long notes (4x as long), dual tiles and SpecialHold tiles
+TILE_KINDS = ('note', 'long', 'dual', 'hold')
+
+PRESETS = {
+    'stream': dict(bpm=600, note='P', seconds=60, mix={'note': 1}),
+    'duals': dict(bpm=600, note='N', seconds=120, mix={'dual': 1}),
+    'holds': dict(bpm=300, note='M', seconds=120, mix={'note': 1, 'hold': 1}, hold_notes=400),
+    'chords': dict(bpm=400, note='N', seconds=120, mix={'note': 1}, chord=5, accompaniment=3),
+    'mixed': dict(bpm=480, note='N', seconds=300, mix={'note': 6, 'long': 2, 'dual': 2, 'hold': 1},
+                  chord=2, hold_notes=100, rest=0.1, accompaniment=2),
+}
+
+
+def _notes(pitch, chord):
+    """`chord` white keys a third apart from MELODY_NOTES[pitch], as the notation joins them."""
+    return '.'.join(MELODY_NOTES[pitch + 2 * i] for i in range(chord))
+
+
+def _tile(kind, pitch, note, chord, hold_notes, hold_note):
+    """Score text of one tile and its length in beats."""
+    notes, beats = _notes(pitch, chord), config.BEAT_MAP[note]
+    if kind == 'long':
+        longer = chr(max(ord('H'), ord(note) - 2))
+        return (f"({notes})[{longer}]" if chord > 1 else f"{notes}[{longer}]"), config.BEAT_MAP[longer]
+    if kind == 'dual':
+        # Two notes of half the length each (one note of 'P', the shortest)
+        half = chr(ord(note) + 1)
+        return (f"5<{notes}[{half}],{notes}[{half}]>" if half in config.BEAT_MAP else f"5<{notes}[{note}]>"), beats
+    if kind == 'hold':
+        return f"6<{','.join([f'{notes}[{hold_note}]'] * hold_notes)}>", config.BEAT_MAP[hold_note] * hold_notes
+    return (f"({notes})[{note}]" if chord > 1 else f"{notes}[{note}]"), beats
+
+
+def generate_song(bpm=600, note='N', seconds=60.0, parts=3, mix=None, chord=1, hold_notes=200, hold_note='P',
+                  rest=0.0, accompaniment=0, seed=0):
+    """
+    Song data with one playable track per part at `bpm`, lasting `seconds` in all. Tiles are
+    `note` long (a BEAT_MAP letter; baseBeats is set to it) and drawn from `mix`, weights per
+    TILE_KINDS (plain tiles only by default); a hold tile has `hold_notes` sub-notes of
+    `hold_note` (its height is that many times the letter's share of `note`). Every tile
+    sounds `chord` notes. `rest` is the share of tile slots left silent and `accompaniment`
+    the number of unplayed tracks of `note` bass notes added to each part.
+    """
+    rng = random.Random(seed)
+    mix = mix or {'note': 1}
+    kinds = [kind for kind in TILE_KINDS if mix.get(kind)]
+    weights = [mix[kind] for kind in kinds]
+    beat_value, space = config.BEAT_MAP[note], chr(ord(note) + 9)  # SPACE_MAP letter of the same length
+    part_beats = seconds / parts * bpm / 60.0
+    top = len(MELODY_NOTES) - 1 - 2 * (chord - 1)
+    pitch = top // 2
+    musics = []
+    for part_id in range(1, parts + 1):
+        events, beats = [], 0.0
+        while beats < part_beats:
+            if rng.random() < rest:
+                events.append(space)
+                beats += beat_value
+                continue
+            pitch = min(top, max(0, pitch + rng.choice((-2, -1, 1, 2))))
+            text, length = _tile(rng.choices(kinds, weights)[0], pitch, note, chord, hold_notes, hold_note)
+            events.append(text)
+            beats += length
+        scores = [','.join(events)]
+        for _ in range(accompaniment):
+            bass = (MELODY_NOTES[rng.randrange(7)] for _ in range(int(beats / beat_value)))
+            scores.append(','.join(f"{name}[{note}]" for name in bass))
+        musics.append({'id': part_id, 'bpm': bpm, 'baseBeats': beat_value, 'scores': scores})
+    return {'baseBpm': bpm, 'musics': musics, 'audition': {'start': [0, 0], 'end': [0, 10]}}
+
+
+def write_song(song_data, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(song_data, f)
+
+
+def write_presets(directory=config.STRESS_DIR, names=None, seed=0):
+    """Writes `<preset>.json` for the named presets (all by default); returns the file names."""
+    files = []
+    for name in names or PRESETS:
+        files.append(f"{name}.json")
+        write_song(generate_song(**dict(PRESETS[name], seed=seed)), os.path.join(directory, files[-1]))
+    return files
+
+
+def count_tiles(song_data):
+    """Playable tiles of generated song data (the first track of each part)."""
+    return sum(1 for part in song_data['musics']
+               for event in song_parser.iter_score_events(part['scores'][0], part['bpm'])
+               if event['kind'] not in ('space', 'unparsed'))
+
+
+def parse_mix(text):
+    """'note=6,dual=1' -> {'note': 6.0, 'dual': 1.0}"""
+    mix = {}
+    for item in text.split(','):
+        kind, _, weight = item.partition('=')
+        if kind not in TILE_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown tile kind {kind!r} (of: {', '.join(TILE_KINDS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a procedurally generated stress-test chart.")
+    parser.add_argument('output', help="Song JSON file to write")
+    parser.add_argument('--preset', choices=sorted(PRESETS), help="Start from a preset; other options override it")
+    parser.add_argument('--bpm', type=float, help="Tempo of every part (default 600)")
+    parser.add_argument('--note', choices=sorted(config.BEAT_MAP), help="Length of each tile (BEAT_MAP letter, default N)")
+    parser.add_argument('--seconds', type=float, help="Length of the chart (default 60)")
+    parser.add_argument('--parts', type=int, help="Parts (stars, default 3)")
+    parser.add_argument('--mix', type=parse_mix, help=f"Weights of tile kinds, e.g. note=6,dual=1 (of: {', '.join(TILE_KINDS)})")
+    parser.add_argument('--chord', type=int, choices=range(1, 9), help="Notes per tile (default 1)")
+    parser.add_argument('--hold-notes', type=int, help="Sub-notes per SpecialHold tile (default 200)")
+    parser.add_argument('--hold-note', choices=sorted(config.BEAT_MAP), help="Length of each sub-note (default P)")
+    parser.add_argument('--rest', type=float, help="Share of silent tile slots (0-1)")
+    parser.add_argument('--accompaniment', type=int, help="Unplayed tracks per part")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the melody and the mix")
+    parser.add_argument('--simulate', action='store_true', help="Autoplay the chart headless and time the update loop")
+    args = parser.parse_args()
+
+    options = dict(PRESETS[args.preset]) if args.preset else {}
+    options.update({name: value for name, value in vars(args).items()
+                    if value is not None and name not in ('output', 'preset', 'simulate')})
+    song_data = generate_song(**options)
+    write_song(song_data, args.output)
+    tiles, seconds = count_tiles(song_data), options.get('seconds', 60.0)
+    print(f"Wrote {tiles} tiles ({tiles / seconds:.0f} per second) to {args.output}")
+
+    if args.simulate:
+        import perf_suite
+        import pygame
+        import song_pack
+        pygame.init()
+        pygame.display.set_mode((config.SCREEN_WIDTH, config.SCREEN_HEIGHT))
+        config.RECORD_REPLAYS = False
+        bench = perf_suite.Bench()
+        try:
+            directory, name = os.path.split(os.path.abspath(args.output))
+            elapsed, frames = perf_suite.simulate_song(bench.game, name, songs=song_pack.LooseSongs(directory))
+        finally:
+            bench.close()
+        print(f"Autoplayed {frames} frames in {elapsed:.2f} s ({elapsed / max(frames, 1) * 1000:.3f} ms per frame)")
+
+
+if __name__ == '__main__':
+    main()
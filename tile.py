@@ -1,11 +1,15 @@
 # tile.py
 import pygame
+from bisect import bisect_left, bisect_right
 from enum import Enum, auto
+from itertools import accumulate
 import random
 import math
 import config
 import utils
 
+HOLD_EPSILON = 1e-9
+
 
 class TileType(Enum):
     Normal = auto()
@@ -23,12 +27,21 @@ class TileState(Enum):
 
 
 class Particle:
+    __slots__ = ('original_image', 'scale', 'image', 'x', 'y', 'vx', 'vy', 'lifetime', 'alpha')
+    _scaled_images = {}  # (image, scale) -> scaled image, shared by every particle
+
     def __init__(self, x, y, image, scale=0.4):
+        self.setup(x, y, image, scale)
+
+    def setup(self, x, y, image, scale=0.4):
+        """(Re)starts the particle at x, y; pooled particles are set up again through this."""
         self.original_image = image
         self.scale = scale
-        self.image = pygame.transform.smoothscale(self.original_image,
-                                                  (int(self.original_image.get_width() * self.scale),
-                                                   int(self.original_image.get_height() * self.scale)))
+        self.image = Particle._scaled_images.get((image, scale))
+        if self.image is None:
+            self.image = pygame.transform.smoothscale(image, (int(image.get_width() * scale),
+                                                              int(image.get_height() * scale)))
+            Particle._scaled_images[(image, scale)] = self.image
         self.x = x
         self.y = y
         self.vx = random.uniform(-2, 2)
@@ -43,15 +56,46 @@ class Particle:
         if self.lifetime > 0:
             self.alpha = max(0, self.alpha - (255 / self.lifetime))
 
+    def expired(self):
+        return self.lifetime <= 0
+
     def draw(self, surface):
         if self.lifetime > 0:
-            temp_img = self.image.copy()
-            temp_img.set_alpha(self.alpha)
-            surface.blit(temp_img, temp_img.get_rect(center=(self.x, self.y)))
+            # The image is shared, so its alpha is set right before each blit
+            self.image.set_alpha(self.alpha)
+            surface.blit(self.image, self.image.get_rect(center=(self.x, self.y)))
 
 
 class Tile:
+    __slots__ = ('lane', 'time', 'duration', 'notes', 'type', 'sub_type', 'sub_notes', 'index', 'state', 'rect',
+                 'sub_note_ends', 'sub_notes_total', 'hit_quality_color', 'fade_alpha', 'fade_start_time',
+                 'hold_progress', 'is_being_held', 'initial_hit_scored', 'next_sub_note', 'crazy_circle_scale',
+                 'crazy_circle_anim_start_time', 'flash_start_time', 'flash_alpha')
+
+    CRAZY_ANIM_DURATION = 0.15
+    FLASH_DURATION = 0.3  # Total duration of flash animation in seconds
+    FLASH_COUNT = 2  # Number of flashes
+    FADE_DURATION = 0.28  # A hit tile fades out over this long (17 frames at 60 FPS)
+
+    # Shared images, loaded with the first tile
+    circle_light_img = None
+    crazy_circle_img = None
+    dot_light_img = None
+    dot_hit_img = None  # dot_light_img lit up, for played sub-notes
+
     def __init__(self, lane, time, duration, notes, tile_type, sub_type, sub_notes=None):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.setup(lane, time, duration, notes, tile_type, sub_type, sub_notes)
+
+        if Tile.dot_light_img is None:
+            Tile.circle_light_img = utils.load_image(config.CIRCLE_LIGHT_IMG)
+            Tile.crazy_circle_img = utils.load_image(config.CRAZY_CIRCLE_IMG)
+            Tile.dot_light_img = utils.load_image(config.DOT_LIGHT_IMG)
+            Tile.dot_hit_img = Tile.dot_light_img.copy()
+            Tile.dot_hit_img.fill((150, 255, 255, 150), special_flags=pygame.BLEND_RGBA_ADD)
+
+    def setup(self, lane, time, duration, notes, tile_type, sub_type, sub_notes=None):
+        """Makes this a new, unplayed tile; pooled tiles are set up again through this."""
         self.lane = lane
         self.time = time
         self.duration = duration
@@ -59,38 +103,32 @@ class Tile:
         self.type = tile_type
         self.sub_type = sub_type
         self.sub_notes = sub_notes if sub_notes else []
-
+        # Offset from the tile's start to the end of each sub-note, and their total
+        self.sub_note_ends = list(accumulate(sn['duration'] for sn in self.sub_notes))
+        self.sub_notes_total = self.sub_note_ends[-1] if self.sub_note_ends else 0
+        self.index = 0  # Position in the song's tiles, set by GameScreen.load_song
+        self.reset()
+
+    def reset(self):
+        """Puts the tile back in its unplayed state (used when a practice loop restarts)."""
         self.state = TileState.ACTIVE
-        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.rect.update(0, 0, 0, 0)
         self.hit_quality_color = None
         self.fade_alpha = 255
+        self.fade_start_time = None  # When the tile was hit (or its hold ended)
 
         self.hold_progress = 0.0
         self.is_being_held = False
         self.initial_hit_scored = False
-        self.sub_notes_hit = [False] * len(self.sub_notes)
+        self.next_sub_note = 0  # Sub-notes before it have been played; they are played in order
 
         self.crazy_circle_scale = 0.0
-        self.crazy_circle_anim_start_time = -1
-        self.CRAZY_ANIM_DURATION = 0.15
+        self.crazy_circle_anim_start_time = None
 
         # Flash properties for missed tiles
-        self.flash_start_time = -1
-        self.FLASH_DURATION = 0.3  # Total duration of flash animation in seconds
-        self.FLASH_COUNT = 2  # Number of flashes
+        self.flash_start_time = None
         self.flash_alpha = 0  # Current alpha for flash overlay
 
-        self.circle_light_img = None
-        self.crazy_circle_img = None
-        self.dot_light_img = None
-        self.assets_loaded = False
-
-        if not hasattr(Tile, 'assets_loaded'):
-            Tile.circle_light_img = utils.load_image(config.CIRCLE_LIGHT_IMG)
-            Tile.crazy_circle_img = utils.load_image(config.CRAZY_CIRCLE_IMG)
-            Tile.dot_light_img = utils.load_image(config.DOT_LIGHT_IMG)
-            Tile.assets_loaded = True
-
     def update(self, current_time, tps):
         # CHANGED: Added TileState.MISSED to this list so missed tiles continue to scroll.
         if self.state in [TileState.ACTIVE, TileState.HELD, TileState.PASSED, TileState.MISSED]:
@@ -105,30 +143,46 @@ class Tile:
             lanes = [self.lane] if isinstance(self.lane, int) else self.lane
             self.rect = pygame.Rect(lanes[0] * config.TILE_WIDTH, pos_y - height + (config.TILE_WIDTH / 2),
                                     config.TILE_WIDTH * (2 if self.sub_type == TileType.Dual else 1), height)
+        self.update_flash(current_time)
+        self.animate(current_time)
+
+    def animate(self, current_time):
+        """
+        Sets the hit fade, miss flash, hold fill and crazy-circle scale for current_time. Only
+        the looks: state changes come from update_flash and update_hold.
+        """
+        if self.fade_start_time is not None:
+            fade = 1 - (current_time - self.fade_start_time) / self.FADE_DURATION
+            self.fade_alpha = int(255 * min(1.0, max(0.0, fade)))
+
+        if self.state == TileState.MISSED and self.flash_start_time is not None:
+            flash_progress = (current_time - self.flash_start_time) / self.FLASH_DURATION
+            if 0 <= flash_progress < 1:
+                # Calculate flash alpha using a sine wave for pulsing effect
+                flash_frequency = self.FLASH_COUNT * 2 * math.pi  # Complete cycles for flashes
+                self.flash_alpha = 128 * (1 + math.sin(flash_frequency * flash_progress))  # 0-255 range
+            else:
+                self.flash_alpha = 0
 
-        elif self.state == TileState.HIT:
-            self.fade_alpha = max(0, self.fade_alpha - 15)
-
-        # Update flash for missed state
-        if self.state == TileState.MISSED:
-            if self.flash_start_time > 0:
-                flash_elapsed = current_time - self.flash_start_time
-                if flash_elapsed >= self.FLASH_DURATION:
-                    # CHANGED: Revert to PASSED instead of ACTIVE. A missed tile is gone.
-                    self.state = TileState.PASSED
-                    self.flash_start_time = -1
-                    self.flash_alpha = 0
-                else:
-                    # Calculate flash alpha using a sine wave for pulsing effect
-                    flash_progress = flash_elapsed / self.FLASH_DURATION
-                    flash_frequency = self.FLASH_COUNT * 2 * math.pi  # Complete cycles for flashes
-                    self.flash_alpha = 128 * (1 + math.sin(flash_frequency * flash_progress))  # 0-255 range
+        if self.state == TileState.HELD and self.duration > 0:
+            self.hold_progress = min(1.0, max(0.0, (current_time - self.time) / self.duration))
 
-        if self.crazy_circle_anim_start_time > 0:
+        if self.crazy_circle_anim_start_time is not None:
             anim_elapsed = current_time - self.crazy_circle_anim_start_time
-            self.crazy_circle_scale = min(1.0, anim_elapsed / self.CRAZY_ANIM_DURATION)
-            if self.crazy_circle_scale >= 1.0:
-                self.crazy_circle_anim_start_time = -1
+            self.crazy_circle_scale = min(1.0, max(0.0, anim_elapsed / self.CRAZY_ANIM_DURATION))
+
+    def fade_end_time(self):
+        """Song time at which a hit tile has faded out completely (None if it was not hit)."""
+        return None if self.fade_start_time is None else self.fade_start_time + self.FADE_DURATION
+
+    def update_flash(self, current_time):
+        """Retires a missed tile once its flash is over."""
+        if self.state == TileState.MISSED and self.flash_start_time is not None:
+            if current_time >= self.flash_start_time + self.FLASH_DURATION:
+                # CHANGED: Revert to PASSED instead of ACTIVE. A missed tile is gone.
+                self.state = TileState.PASSED
+                self.flash_start_time = None
+                self.flash_alpha = 0
 
     def draw(self, surface):
         if self.state == TileState.HIT and self.fade_alpha == 0:
@@ -200,19 +254,19 @@ class Tile:
         surface.blit(fill_surface, (0, 0), special_flags=pygame.BLEND_RGBA_ADD)
 
     def draw_sub_note_dots(self, surface, draw_rect):
-        total_duration = sum(sn['duration'] for sn in self.sub_notes)
-        if total_duration > 0:
-            current_duration_sum = 0
-            for i, note_info in enumerate(self.sub_notes):
-                current_duration_sum += note_info['duration']
-                progress = current_duration_sum / total_duration
+        total_duration = self.sub_notes_total
+        if total_duration > 0 and draw_rect.height > 0:
+            # Only the dots that reach onto the surface (a pixel of slack either way)
+            reach = Tile.dot_light_img.get_height() / 2 + 1
+            per_pixel = total_duration / draw_rect.height
+            ends = self.sub_note_ends
+            first = bisect_left(ends, (draw_rect.bottom - surface.get_height() - reach) * per_pixel)
+            last = bisect_right(ends, (draw_rect.bottom + reach) * per_pixel)
+            for i in range(first, last):
+                progress = ends[i] / total_duration
                 dot_y = draw_rect.bottom - (draw_rect.height * progress)
-                dot_rect = Tile.dot_light_img.get_rect(center=(draw_rect.centerx, dot_y))
-
-                dot_img = Tile.dot_light_img.copy()
-                if self.sub_notes_hit[i]:
-                    dot_img.fill((150, 255, 255, 150), special_flags=pygame.BLEND_RGBA_ADD)
-                surface.blit(dot_img, dot_rect)
+                dot_img = Tile.dot_hit_img if i < self.next_sub_note else Tile.dot_light_img
+                surface.blit(dot_img, dot_img.get_rect(center=(draw_rect.centerx, dot_y)))
 
     def draw_long_note_gradient(self, surface, size):
         width, height = size
@@ -225,8 +279,9 @@ class Tile:
             gradient.set_at((0, y), color)
         surface.blit(pygame.transform.scale(gradient, (int(width), int(height))), (0, 0))
 
-    def check_hit(self, hit_time):
-        time_diff = abs(hit_time - self.time)
+    def check_hit(self, hit_time, window_scale=1.0):
+        """Judges a tap. `window_scale` stretches the timing windows (song time at a practice rate)."""
+        time_diff = abs(hit_time - self.time) / window_scale
         if time_diff <= config.PERFECT_TIMING: return "perfect", config.PERFECT_COLOR
         if time_diff <= config.GREAT_TIMING: return "great", config.GREAT_COLOR
         if time_diff <= config.GOOD_TIMING: return "good", config.GOOD_COLOR
@@ -236,7 +291,7 @@ class Tile:
         self.hit_quality_color = color
 
         if quality in ['perfect', 'great', 'good']:
-            self.flash_start_time = -1
+            self.flash_start_time = None
             self.flash_alpha = 0
 
             if self.type == TileType.LongNote:
@@ -246,6 +301,7 @@ class Tile:
                 self.crazy_circle_anim_start_time = hit_time
             else:
                 self.state = TileState.HIT
+                self.fade_start_time = hit_time
         else:
             self.miss(hit_time)
 
@@ -258,35 +314,45 @@ class Tile:
     def pass_by(self):
         self.state = TileState.PASSED
 
+    def next_hold_time(self):
+        """Song time of the hold's next sub-note, or of its end if none is left before it."""
+        end_time = self.time + self.duration
+        if self.sub_type == TileType.SpecialHold and self.sub_notes_total > 0 \
+                and self.next_sub_note < len(self.sub_note_ends):
+            return min(self.time + self.sub_note_ends[self.next_sub_note], end_time)
+        return end_time
+
     def update_hold(self, current_time):
         if self.state != TileState.HELD: return 0, []
 
-        elapsed_time = current_time - self.time
+        # Times at a sub-note or the end come from time + offset and may round just short of it
+        elapsed_time = current_time - self.time + HOLD_EPSILON
         self.hold_progress = min(1.0, elapsed_time / self.duration)
 
         newly_hit_info = []
-        if self.sub_type == TileType.SpecialHold:
-            time_into_hold = 0
-            total_duration = sum(sn['duration'] for sn in self.sub_notes)
-            if total_duration > 0:
-                for i, note_info in enumerate(self.sub_notes):
-                    time_into_hold += note_info['duration']
-                    if not self.sub_notes_hit[i] and elapsed_time >= time_into_hold:
-                        self.sub_notes_hit[i] = True
-                        progress = time_into_hold / total_duration
-                        hit_y = self.rect.bottom - (self.rect.height * progress)
-                        newly_hit_info.append({'notes': note_info['notes'], 'y': hit_y})
+        if self.sub_type == TileType.SpecialHold and self.sub_notes_total > 0:
+            total_duration, ends = self.sub_notes_total, self.sub_note_ends
+            # Sub-notes end in order, so the ones reached are the run from the cursor
+            while self.next_sub_note < len(ends) and elapsed_time >= ends[self.next_sub_note]:
+                time_into_hold = ends[self.next_sub_note]
+                progress = time_into_hold / total_duration
+                hit_y = self.rect.bottom - (self.rect.height * progress)
+                newly_hit_info.append({'notes': self.sub_notes[self.next_sub_note]['notes'], 'y': hit_y,
+                                       'time': self.time + time_into_hold})
+                self.next_sub_note += 1
 
         if self.hold_progress >= 1.0:
             self.state = TileState.HIT
             self.hit_quality_color = config.PERFECT_COLOR
+            self.fade_start_time = current_time
             return 1, newly_hit_info
         return 0, newly_hit_info
 
-    def release_hold(self):
+    def release_hold(self, release_time):
         if self.state == TileState.HELD:
             self.state = TileState.HIT
             self.is_being_held = False
+            self.fade_start_time = release_time
 
 
 if __name__ == '__main__':
@@ -346,7 +412,7 @@ if __name__ == '__main__':
                     for key, lane in config.KEYBINDS.items()
                 )
                 if not is_held:
-                    tile.release_hold()
+                    tile.release_hold(game_time)
                 else:
                     _, new_hits = tile.update_hold(game_time)
                     for hit in new_hits:
@@ -0,0 +1,62 @@
+# tile_field.py
+"""
+A song's tiles as columns (time, duration, lane x, width) in all_tiles order, for the
+per-frame tile kinematics. Scroll positions and heights for a run of tiles come from array
+operations on the time and duration columns; culling and the miss deadline are index lookups
+on the sorted time column. GameScreen only touches the tiles that reach onto the screen.
+"""
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+import config
+from tile import TileType
+
+
+class TileField:
+    """Column view of tiles sorted by time. Tile i of the song is row i."""
+
+    def __init__(self, tiles):
+        count = len(tiles)
+        self.times = np.fromiter((t.time for t in tiles), np.float64, count)
+        self.durations = np.fromiter((t.duration for t in tiles), np.float64, count)
+        self._time_list = self.times.tolist()  # bisect on a list beats a numpy call for one lookup
+        # Plain lists: the per-tile loop reads single values, which is faster from a list
+        self.x = [(t.lane if isinstance(t.lane, int) else t.lane[0]) * config.TILE_WIDTH for t in tiles]
+        self.widths = [config.TILE_WIDTH * (2 if t.sub_type == TileType.Dual else 1) for t in tiles]
+        self._speed = None
+        self._top_offsets = self.times
+        self.heights = []
+
+    @staticmethod
+    def scroll_speed(tps):
+        """Pixels per second of song time."""
+        return tps * config.TILE_WIDTH * 1.5
+
+    def count_until(self, song_time):
+        """Number of tiles with time <= song_time."""
+        return bisect_right(self._time_list, song_time)
+
+    def count_before(self, song_time):
+        """Number of tiles with time < song_time."""
+        return bisect_left(self._time_list, song_time)
+
+    def first_above_screen(self, current_time, tps):
+        """Index of the first tile whose bottom has not reached the top of the screen yet."""
+        return self.count_before(current_time + config.STRIKE_LINE_Y / self.scroll_speed(tps))
+
+    def _scale(self, tps):
+        """Heights, and tops at song time 0, for a scroll speed; a song keeps one tps throughout."""
+        self._speed = self.scroll_speed(tps)
+        heights = np.maximum(self.durations * self._speed, config.TILE_WIDTH / 2)
+        self._top_offsets = config.STRIKE_LINE_Y - self.times * self._speed - heights
+        self.heights = heights.astype(np.int32).tolist()
+
+    def layout(self, start, end, current_time, tps):
+        """
+        Tops in pixels of tiles [start, end) at current_time, truncated as a Rect truncates
+        them, as a list indexed from `start`. Heights don't move: they are in self.heights.
+        """
+        if self.scroll_speed(tps) != self._speed:
+            self._scale(tps)
+        return (self._top_offsets[start:end] + current_time * self._speed).astype(np.int32).tolist()
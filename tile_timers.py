@@ -0,0 +1,37 @@
+# tile_timers.py
+"""
+Song-time timers for tile state changes. GameScreen schedules a timer when a change becomes
+inevitable (a miss flash will end, a held tile reaches its next sub-note or its end) and
+fires it when song time gets there, so a frame only touches the tiles that change in it.
+"""
+import heapq
+
+# Timer kinds
+FLASH_END, HOLD_STEP = range(1, 3)
+
+
+class TileTimers:
+    """Min-heap of (song time, seq, kind, tile); seq keeps timers due at the same time in order."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, due_time, kind, tile):
+        heapq.heappush(self._heap, (due_time, self._seq, kind, tile))
+        self._seq += 1
+
+    def next_due(self):
+        """Song time of the earliest timer, or infinity if none is set."""
+        return self._heap[0][0] if self._heap else float('inf')
+
+    def pop(self):
+        """Removes the earliest timer and returns its (song time, kind, tile)."""
+        due_time, _, kind, tile = heapq.heappop(self._heap)
+        return due_time, kind, tile
+
+    def clear(self):
+        self._heap = []
@@ -0,0 +1,188 @@
+# voice_manager.py
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pygame
+import config
+from audio_mixdown import mix_notes
+
+
+def chord_key(notes):
+    """Normalizes a note or list of notes into a hashable chord shape."""
+    if isinstance(notes, str):
+        return (notes,)
+    return tuple(sorted(set(notes)))
+
+
+def recurring_chords(note_groups, min_count=2):
+    """Returns the chord shapes (of two or more notes) occurring at least min_count times, most frequent first."""
+    counts = Counter(chord_key(group) for group in note_groups)
+    return [key for key, count in counts.most_common() if len(key) > 1 and count >= min_count]
+
+
+def victim_key(priority, start, length, peak, now, policy):
+    """
+    Sort key for choosing which voice to steal: lowest priority first, then the oldest voice
+    or the one that is currently quietest (peak level faded linearly over its length).
+    """
+    if policy == 'quietest':
+        remaining = max(0.0, 1.0 - (now - start) / length) if length > 0 else 0.0
+        return priority, peak * remaining
+    return priority, start
+
+
+class ChordEntry:
+    __slots__ = ('samples', 'sound', 'length', 'peak')
+
+    def __init__(self, samples, sound, sample_rate):
+        self.samples = samples
+        self.sound = sound
+        self.length = len(samples) / sample_rate
+        self.peak = int(np.abs(samples).max()) if len(samples) else 0
+
+
+class ChordCache:
+    """
+    Premixed buffers for chord shapes, keyed by their sorted note names, so a chord needs a
+    single voice instead of one per note. Single notes get an entry too (without mixing, and
+    never evicted) so voice stealing knows every sound's length and level. Least recently
+    used chords are evicted beyond max_entries.
+
+    With `make_sounds` each entry carries a pygame Sound for the mixer and the premixed
+    array is dropped; without it only the array is kept (for the software mixer).
+    """
+
+    def __init__(self, sample_bank, sample_rate, channels, max_entries=config.CHORD_CACHE_SIZE, make_sounds=True):
+        self.sample_bank = sample_bank
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.max_entries = max_entries
+        self.make_sounds = make_sounds
+        self._singles = {}
+        self._entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'premixed': 0}
+
+    def get(self, notes):
+        """Returns the ChordEntry for a note or chord, or None if none of its notes exist."""
+        key = chord_key(notes)
+        if len(key) == 1 and key in self._singles:
+            return self._singles[key]
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+        self.stats['misses'] += 1
+        return self._build(key)
+
+    def prepare(self, note_groups, min_count=2):
+        """
+        Builds entries ahead of time (e.g. while a song loads) for every single note in
+        `note_groups` and for the chord shapes occurring at least min_count times.
+        """
+        singles = {(note,) for group in note_groups for note in chord_key(group)}
+        # Let go of other songs' notes so their sounds can be evicted
+        self._singles = {key: entry for key, entry in self._singles.items() if key in singles}
+        for key in list(singles - self._singles.keys()) + recurring_chords(note_groups, min_count)[:self.max_entries]:
+            if key not in self._entries:
+                self._build(key)
+
+    def _build(self, key):
+        playable = tuple(note for note in key if self.sample_bank.get(note) is not None)
+        if not playable:
+            if len(key) == 1:
+                self._singles[key] = None
+            return None
+        if len(playable) == 1:
+            entry = ChordEntry(self.sample_bank.get(playable[0]), self.sample_bank.sounds.get(playable[0]),
+                               self.sample_rate)
+            if len(key) == 1:
+                self._finish(entry)
+                self._singles[key] = entry
+                return entry
+        else:
+            samples = mix_notes([(0.0, note) for note in playable], self.sample_bank, self.sample_rate,
+                                self.channels)
+            entry = ChordEntry(samples, None, self.sample_rate)
+            self.stats['premixed'] += 1
+        self._finish(entry)
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def _finish(self, entry):
+        if self.make_sounds:
+            if entry.sound is None:
+                entry.sound = pygame.sndarray.make_sound(self._to_mixer_format(entry.samples))
+            entry.samples = None
+
+    def __len__(self):
+        """Number of chords held (single notes are not counted)."""
+        return len(self._entries)
+
+    @staticmethod
+    def _to_mixer_format(samples):
+        _, size, channels = pygame.mixer.get_init()
+        if samples.shape[1] < channels:
+            samples = np.repeat(samples, channels, axis=1)
+        frames = samples[:, 0] if channels == 1 else samples[:, :channels]
+        if size == 32:
+            return np.ascontiguousarray(frames.astype(np.float32) / 32768.0)
+        return np.ascontiguousarray(frames)
+
+
+class VoiceAllocator:
+    """
+    Enforces a polyphony budget on pygame.mixer channels. Finished voices are reclaimed
+    lazily; when the budget is used up the voice chosen by `policy` ('oldest' or
+    'quietest') among those of equal or lower priority is stopped and its channel reused.
+    Also keeps channel-pressure statistics.
+    """
+
+    def __init__(self, max_voices=config.MAX_VOICES, policy=config.VOICE_STEAL_POLICY, clock=None):
+        self.max_voices = min(max_voices, pygame.mixer.get_num_channels())
+        self.policy = policy
+        self.clock = clock if clock else (lambda: pygame.time.get_ticks() / 1000.0)
+        self._voices = []  # [channel, start, priority, length, peak]
+        self.stats = {'allocated': 0, 'stolen': 0, 'dropped': 0, 'peak_voices': 0}
+        self._pressure_total = 0
+        self._pressure_samples = 0
+
+    def _reclaim(self, now):
+        self._voices = [v for v in self._voices if v[0].get_busy() and now - v[1] < v[3]]
+
+    def play(self, entry, priority=0):
+        now = self.clock()
+        self._reclaim(now)
+        channel = None
+        if len(self._voices) < self.max_voices:
+            channel = pygame.mixer.find_channel()
+        if channel is None:
+            candidates = [v for v in self._voices if v[2] <= priority]
+            if not candidates:
+                self.stats['dropped'] += 1
+                return False
+            victim = min(candidates, key=lambda v: victim_key(v[2], v[1], v[3], v[4], now, self.policy))
+            self._voices.remove(victim)
+            channel = victim[0]
+            channel.stop()
+            self.stats['stolen'] += 1
+        channel.play(entry.sound)
+        self._voices.append([channel, now, priority, entry.length, entry.peak])
+        self.stats['allocated'] += 1
+        self.stats['peak_voices'] = max(self.stats['peak_voices'], len(self._voices))
+        self._pressure_total += len(self._voices)
+        self._pressure_samples += 1
+        return True
+
+    def stop_all(self):
+        for voice in self._voices:
+            voice[0].stop()
+        self._voices = []
+
+    def pressure(self):
+        """Channel-pressure report: current, average and peak voice use against the budget."""
+        average = self._pressure_total / self._pressure_samples if self._pressure_samples else 0.0
+        return dict(self.stats, active=len(self._voices), average_voices=average, budget=self.max_voices,
+                    average_load=average / self.max_voices if self.max_voices else 0.0)